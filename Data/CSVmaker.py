@@ -1,40 +1,66 @@
-import csv
+import argparse
 import uuid
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-UNITS_FILE = "units.csv"
-WEAPONS_FILE = "weapons.csv"
-TAGS_FILE = "tags.csv"
-KEYWORDS_FILE = "keywords.csv"
-
-def load_csv(path):
+import catalog_db
+from catalog import Autosaver, Catalog, SearchIndex, row_edits
+from catalog_check import Validator
+from regenerate_units_tex import write_units_tex
+
+# How often the save state label is refreshed
+SAVE_STATE_POLL_MS = 200
+# Searchable lists filter once typing pauses this long
+SEARCH_DEBOUNCE_MS = 80
+
+parser = argparse.ArgumentParser(description="Unit & weapon catalog editor")
+parser.add_argument("--db", help="edit a catalog_db store (e.g. catalog.sqlite3) instead of the CSVs")
+args = parser.parse_args()
+
+def load_catalog():
+    """Indexed catalog of the four CSVs (or the --db store), with default tags and keywords if there are none"""
+    if args.db:
+        conn = catalog_db.connect(args.db)
+        catalog = catalog_db.load_catalog(conn)
+        conn.close()
+    else:
+        catalog = Catalog.load()
+    if not catalog.tags:
+        for tag in ["Infantry", "Vehicle", "Flying"]:
+            catalog.add("tags", {"uuid": "tag-"+str(uuid.uuid4())[:8], "name": tag})
+    if not catalog.keywords:
+        for kw in ["Melee", "Ranged", "Blast"]:
+            catalog.add("keywords", {"uuid": "kw-"+str(uuid.uuid4())[:8], "name": kw})
+    return catalog
+
+
+catalog = load_catalog()
+units = catalog.units
+weapons = catalog.weapons
+tags = catalog.tags
+keywords = catalog.keywords
+
+def save_to_db():
+    # Runs on the autosaver thread, so it opens its own connection
+    conn = catalog_db.connect(args.db)
     try:
-        with open(path, newline="", encoding="utf-8") as f:
-            return list(csv.DictReader(f))
-    except FileNotFoundError:
-        if path == TAGS_FILE:
-            return [{"uuid": "tag-"+str(uuid.uuid4())[:8], "name": tag} for tag in ["Infantry", "Vehicle", "Flying"]]
-        elif path == KEYWORDS_FILE:
-            return [{"uuid": "kw-"+str(uuid.uuid4())[:8], "name": kw} for kw in ["Melee", "Ranged", "Blast"]]
-        return []
-
+        catalog_db.save_catalog(conn, catalog)
+    finally:
+        conn.close()
 
-def save_csv(path, rows, fieldnames):
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+def start_autosaver():
+    return Autosaver(catalog, save=save_to_db if args.db else None)
 
+# Edits only mark records dirty; the autosaver writes the changed files in the background.
+# Default tags and keywords (when those files were missing) are the first thing it saves.
+autosaver = start_autosaver()
+if catalog.unsaved():
+    autosaver.touch()
 
-units = load_csv(UNITS_FILE)
-weapons = load_csv(WEAPONS_FILE)
-tags = load_csv(TAGS_FILE)
-keywords = load_csv(KEYWORDS_FILE)
-
-# Save the tag and keyword files if they didn't exist
-save_csv(TAGS_FILE, tags, ["uuid", "name"])
-save_csv(KEYWORDS_FILE, keywords, ["uuid", "name"])
+# Checked in full once here, then only around each saved record
+validator = Validator(catalog)
+for problem in validator.all():
+    print("Catalog problem:", problem)
 
 root = tk.Tk()
 root.title("Unit & Weapon Editor")
@@ -47,15 +73,14 @@ tag_name_to_uuid = {}
 keyword_name_to_uuid = {}
 
 def generate_uuid(name, mode="units"):
+    """Slug of name ("50mm Linked AC" -> "50mm-linked-ac"), numbered (-2, -3, ...) if mode's table already uses it"""
     base = name.lower().replace(" ", "-")
-    if mode == "weapons":
-        # For weapons, append first keyword if available
-        keywords_field = entries.get("keywords", None) if 'entries' in globals() else None
-        if keywords_field and keywords_field.get():
-            first_keyword = keywords_field.get().split(",")[0].strip()
-            return f"{base}-{first_keyword}"
-        return base
-    return base  # For units, tags, and keywords, just use the base name
+    candidate, n = base, 2
+    # Also skip uuids that dangling references point at, or the new record would silently satisfy them
+    while catalog.uuid_in_use(mode, candidate):
+        candidate = f"{base}-{n}"
+        n += 1
+    return candidate
 
 # GUI Layout
 frame_left = ttk.Frame(root)
@@ -66,53 +91,8 @@ frame_right.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
 
 # Mode Switch Button
 def export_to_tex():
-    # Create units.tex content
-    tex_content = ""
-    for unit in units:
-        # Get unit's weapons
-        unit_weapons = []
-        if unit.get("weapons"):
-            weapon_ids = unit["weapons"].split(",")
-            unit_weapons = [w for w in weapons if w["uuid"] in weapon_ids]
-        
-        # Create weapon rows for the table
-        weapon_rows = ""
-        for w in unit_weapons:
-            keywords_str = w.get("keywords", "").replace(",", ", ")
-            weapon_rows += f"{w['name']} & {w.get('R', '-')} & {w.get('N', '-')} & {w.get('L', '-')} & {w.get('M', '-')} & {w.get('H', '-')} & {w.get('F', '-')} & {keywords_str} \\\\ \hline\n"
-        
-        # Get unit's tags
-        tags_str = ""
-        if unit.get("tags"):
-            tag_ids = unit["tags"].split(",")
-            tag_names = [t["name"] for t in tags if t["uuid"] in tag_ids]
-            tags_str = ", ".join(tag_names)
-        
-        # Create unit card with weapon table
-        tex_content += "\\unitcard{" + unit["name"] + "}{" + \
-                      unit.get("subtitle", "") + "}{" + \
-                      unit.get("M", "-") + "}{" + \
-                      unit.get("A", "-") + "}{" + \
-                      unit.get("C", "-") + "}{" + \
-                      unit.get("H", "-") + "}{" + \
-                      unit.get("MP", "-") + "}{" + \
-                      unit.get("Mat", "-") + "}{" + \
-                      tags_str + "}\n"
-
-        # Prepare abilities injection: default to 'None' if empty; convert newlines to LaTeX linebreaks
-        abilities_raw = unit.get("abilities", "") or ""
-        abilities_text = abilities_raw.strip()
-        if not abilities_text:
-            abilities_text = "None"
-        else:
-            abilities_text = abilities_text.replace("\n", " \\\\ ")
-
-        tex_content += "\\weapontable{" + weapon_rows + "}{" + abilities_text + "}\n\n"
-
-    # Write to units.tex
-    with open("units.tex", "w", encoding="utf-8") as f:
-        f.write(tex_content)
-    
+    # Same output as regenerate_units_tex.py
+    write_units_tex(catalog, "units.tex")
     messagebox.showinfo("Export Complete", "Units have been exported to units.tex")
 
 def toggle_mode():
@@ -131,6 +111,32 @@ mode_button.pack(pady=5)
 export_button = ttk.Button(frame_left, text="Export to PDF", command=export_to_tex)
 export_button.pack(pady=5)
 
+save_state = tk.StringVar(value="All changes saved")
+ttk.Label(frame_left, textvariable=save_state).pack(pady=5)
+
+def show_save_state():
+    state = autosaver.state
+    unsaved = catalog.unsaved()
+    if state.startswith("failed"):
+        save_state.set(f"Save {state}")
+    elif state == "saving":
+        save_state.set("Saving…")
+    elif unsaved:
+        save_state.set(f"{unsaved} unsaved change{'s' if unsaved != 1 else ''}")
+    else:
+        save_state.set("All changes saved")
+    root.after(SAVE_STATE_POLL_MS, show_save_state)
+
+def on_close():
+    global autosaver
+    # Writes anything still dirty before quitting
+    autosaver.stop()
+    if catalog.unsaved() and not messagebox.askyesno("Unsaved changes", f"Save {autosaver.state}. Quit and lose the unsaved changes?"):
+        autosaver = start_autosaver()
+        autosaver.touch()
+        return
+    root.destroy()
+
 listbox = tk.Listbox(frame_left, height=25)
 listbox.pack(fill=tk.Y, expand=True)
 listbox.bind("<<ListboxSelect>>", lambda e: load_selected())
@@ -164,7 +170,8 @@ def create_searchable_list(parent, items, name_to_uuid, selection_dict, title, h
     # Listbox with scrollbar
     list_frame = ttk.Frame(frame)
     list_frame.pack(fill=tk.BOTH, expand=True)
-    listbox = tk.Listbox(list_frame, selectmode=tk.MULTIPLE, height=height)
+    # exportselection off, so clicking one list doesn't clear the selection shown in the others
+    listbox = tk.Listbox(list_frame, selectmode=tk.MULTIPLE, height=height, exportselection=False)
     scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=listbox.yview)
     listbox.configure(yscrollcommand=scrollbar.set)
     
@@ -177,13 +184,15 @@ def create_searchable_list(parent, items, name_to_uuid, selection_dict, title, h
     listbox.uuid_to_name = {}
     listbox.items = items  # Store items reference
     listbox.selection_var = selection_var  # Store the selection display variable
+    index = SearchIndex(items)
+    listbox.shown = index.everything  # item positions, one per row
     
     # Populate list and clear previous mappings
     name_to_uuid.clear()
-    for item in items:
+    listbox.insert(tk.END, *(item["name"] for item in index.records))
+    for item in index.records:
         name = item["name"]
         uuid = item["uuid"]
-        listbox.insert(tk.END, name)
         name_to_uuid[name] = uuid
         selection_dict[uuid] = False
         listbox.selection_state[uuid] = False
@@ -197,11 +206,10 @@ def create_searchable_list(parent, items, name_to_uuid, selection_dict, title, h
     def on_click_toggle(event):
         """Toggle selection for the clicked item only.
 
-        Uses the event x/y to determine which index was clicked, toggles
-        that item's stored selection state, updates the visual selection
-        for currently visible items to reflect stored state, and updates
-        the external selection_dict mapping. This avoids altering other
-        listbox instances or non-visible item states.
+        Uses the event y to determine which row was clicked, toggles that
+        item's stored selection state, sets that row's visual selection to
+        match, and updates the external selection_dict mapping. This avoids
+        altering other listbox instances or non-visible item states.
         """
         # Prevent recursion from programmatic selection changes
         if hasattr(listbox, '_updating'):
@@ -214,19 +222,11 @@ def create_searchable_list(parent, items, name_to_uuid, selection_dict, title, h
             return
 
         # If nothing visible, bail
-        if click_index is None:
-            return
-
-
-        try:
-            clicked_name = listbox.get(click_index)
-        except Exception:
+        if click_index is None or not 0 <= click_index < len(listbox.shown):
             return
 
         # Resolve uuid and toggle stored selection state for this item
-        clicked_uuid = name_to_uuid.get(clicked_name)
-        if not clicked_uuid:
-            return
+        clicked_uuid = index.records[listbox.shown[click_index]]["uuid"]
 
         current = listbox.selection_state.get(clicked_uuid, False)
         listbox.selection_state[clicked_uuid] = not current
@@ -234,14 +234,12 @@ def create_searchable_list(parent, items, name_to_uuid, selection_dict, title, h
         # Update external selection mapping for this uuid
         selection_dict[clicked_uuid] = listbox.selection_state[clicked_uuid]
 
-        # Refresh visual selection for all visible items from stored state
+        # The click already toggled the row; make sure it matches the stored state
         listbox._updating = True
-        listbox.selection_clear(0, tk.END)
-        for i in range(listbox.size()):
-            name = listbox.get(i)
-            uid = name_to_uuid.get(name)
-            if uid and listbox.selection_state.get(uid, False):
-                listbox.selection_set(i)
+        if listbox.selection_state[clicked_uuid]:
+            listbox.selection_set(click_index)
+        else:
+            listbox.selection_clear(click_index)
         delattr(listbox, '_updating')
 
         # Update the selection display
@@ -254,47 +252,39 @@ def create_searchable_list(parent, items, name_to_uuid, selection_dict, title, h
         except Exception:
             pass
 
-        # Also refresh any sibling searchable lists in the same row (e.g. weapons/tags)
-        try:
-            # frame -> parent left/right container -> row_frame
-            row_frame = frame.master.master
-            for sibling in row_frame.winfo_children():
-                # each sibling is a left_frame/right_frame; its first child is the searchable frame
-                for child in sibling.winfo_children():
-                    if hasattr(child, 'update_list') and child is not frame:
-                        # call update_list to re-sync visual selection from stored state
-                        try:
-                            child.update_list()
-                        except Exception:
-                            pass
-        except Exception:
-            pass
-                
+    pending_search = [None]  # after() id of the scheduled filter
+
     def update_list(*args):
-        search_term = search_var.get().lower()
+        """Filters to the search term, only touching rows that appear or disappear"""
+        pending_search[0] = None
+        if not listbox.winfo_exists():  # form rebuilt while the filter was scheduled
+            return
+        wanted = index.search(search_var.get())
+        deletes, inserts = row_edits(listbox.shown, wanted)
         
         # Set flag to prevent selection event handling
         listbox._updating = True
         
-        listbox.delete(0, tk.END)
-        for item in items:
-            name = item["name"]
-            uuid = item["uuid"]
-            if search_term in name.lower():
-                listbox.insert(tk.END, name)
-                if listbox.selection_state.get(uuid, False):
-                    idx = listbox.size() - 1
-                    listbox.selection_set(idx)
-        
-        # Update selection display
-        update_selection_display()
+        for first, last in deletes:
+            listbox.delete(first, last)
+        for row, position in inserts:
+            item = index.records[position]
+            listbox.insert(row, item["name"])
+            if listbox.selection_state.get(item["uuid"], False):
+                listbox.selection_set(row)
+        listbox.shown = wanted
         
         # Remove flag
         delattr(listbox, '_updating')
+
+    def on_search(*args):
+        if pending_search[0] is not None:
+            listbox.after_cancel(pending_search[0])
+        pending_search[0] = listbox.after(SEARCH_DEBOUNCE_MS, update_list)
     
     # Bind events: use click toggle to avoid cross-listbox side-effects
     listbox.bind('<ButtonRelease-1>', on_click_toggle)
-    search_var.trace("w", update_list)
+    search_var.trace("w", on_search)
     
     # Store functions on the frame for external access
     frame.listbox = listbox
@@ -510,57 +500,6 @@ def load_selected():
             # Remove update flag
             delattr(keywords_listbox, '_updating')
 
-def export_to_tex():
-    # Create units.tex content
-    tex_content = ""
-    for unit in units:
-        # Get unit's weapons
-        unit_weapons = []
-        if unit.get("weapons"):
-            weapon_ids = unit["weapons"].split(",")
-            unit_weapons = [w for w in weapons if w["uuid"] in weapon_ids]
-        
-        # Create weapon rows for the table
-            weapon_rows = ""
-            for w in unit_weapons:
-                # Convert keyword uuids to names
-                kw_field = w.get("keywords", "")
-                if kw_field:
-                    kw_ids = [k for k in kw_field.split(",") if k]
-                    kw_names = [kobj["name"] for kobj in keywords if kobj["uuid"] in kw_ids]
-                    keywords_str = ", ".join(kw_names)
-                else:
-                    keywords_str = ""
-
-                # Append row and ensure a \hline after each weapon
-                weapon_rows += f"{w['name']} & {w.get('R', '-')} & {w.get('N', '-')} & {w.get('L', '-')} & {w.get('M', '-')} & {w.get('H', '-')} & {w.get('F', '-')} & {keywords_str} \\\\\\hline \n"
-        
-        # Get unit's tags
-        tags_str = ""
-        if unit.get("tags"):
-            tag_ids = unit["tags"].split(",")
-            tag_names = [t["name"] for t in tags if t["uuid"] in tag_ids]
-            tags_str = ", ".join(tag_names)
-        
-        # Create unit card with weapon table
-        tex_content += "\\unitcard{" + unit["name"] + "}{" + \
-                      unit.get("subtitle", "") + "}{" + \
-                      unit.get("M", "-") + "}{" + \
-                      unit.get("A", "-") + "}{" + \
-                      unit.get("C", "-") + "}{" + \
-                      unit.get("H", "-") + "}{" + \
-                      unit.get("MP", "-") + "}{" + \
-                      unit.get("Mat", "-") + "}{" + \
-                      tags_str + "}\n"
-        
-        tex_content += "\\weapontable{" + weapon_rows + "}\n\n"
-
-    # Write to units.tex
-    with open("units.tex", "w", encoding="utf-8") as f:
-        f.write(tex_content)
-    
-    messagebox.showinfo("Export Complete", "Units have been exported to units.tex")
-
 def save_item():
     # Get all form field values, stripped of whitespace
     data = {}
@@ -586,16 +525,12 @@ def save_item():
         data["tags"] = ",".join(selected_tags)
         
         # Update existing unit or create new one
-        existing = next((u for u in units if u["name"] == data["name"]), None)
+        existing = units.named(data["name"])
         if existing:
-            existing.update(data)
+            record = catalog.update("units", existing, data)
         else:
-            new_row = {"uuid": generate_uuid(data["name"]), **data}
-            units.append(new_row)
-        # Ensure abilities is the last editable field in the CSV before weapons/tags
-        # Build header: uuid, then all entry keys with abilities moved to the end, then weapons/tags
-        entry_keys = [k for k in entries.keys() if k != 'abilities'] + (['abilities'] if 'abilities' in entries else [])
-        save_csv(UNITS_FILE, units, ["uuid"] + entry_keys + ["weapons", "tags"])
+            record = catalog.add("units", {"uuid": generate_uuid(data["name"]), **data})
+        problems = validator.revalidate("units", record)
         
     # Handle Weapons mode
     else:
@@ -611,17 +546,22 @@ def save_item():
         data["keywords"] = ",".join(selected_keywords)
         
         # Update existing weapon or create new one
-        existing = next((w for w in weapons if w["name"] == data["name"]), None)
+        existing = weapons.named(data["name"])
         if existing:
-            existing.update(data)
+            record = catalog.update("weapons", existing, data)
         else:
-            new_row = {"uuid": generate_uuid(data["name"], "weapons"), **data}
-            weapons.append(new_row)
-        save_csv(WEAPONS_FILE, weapons, ["uuid"] + list(entries.keys()) + ["keywords"])
+            record = catalog.add("weapons", {"uuid": generate_uuid(data["name"], "weapons"), **data})
+        problems = validator.revalidate("weapons", record)
 
+    # Written by the autosaver once editing pauses; the save state label shows progress
+    autosaver.touch()
     refresh_list()
-    messagebox.showinfo("Saved", f"{mode.get().capitalize()} saved successfully.")
+    if problems:
+        # Saved anyway; these only get worse if left until export
+        messagebox.showwarning("Catalog problems", "\n".join(str(p) for p in problems))
 
 build_form()
 refresh_list()
+show_save_state()
+root.protocol("WM_DELETE_WINDOW", on_close)
 root.mainloop()
@@ -0,0 +1,474 @@
+"""
+catalog.py
+
+Indexed, in-memory view of the unit catalog CSVs (units, weapons, tags, keywords).
+
+Features:
+- Compact __slots__ records; rows keep their CSV columns, so saving writes the
+  same files back
+- uuid and name indexes per table, for O(1) lookups
+- Reverse indexes: weapon -> units, tag -> units, keyword -> weapons
+- References resolved through the indexes, in the order the record lists them;
+  dangling uuids are skipped
+- Dirty tracking per table, atomic saves (temp file + rename) of only the
+  changed files, and a debounced background Autosaver
+- SearchIndex: n-gram substring search over names, narrowing incrementally
+  as the query grows, and row_edits for updating a filtered list in place
+
+Records also answer record["name"] / record.get("weapons", "") like the
+csv.DictReader rows the tools used before, reference columns giving the
+comma-separated uuids.
+
+Example:
+    catalog = Catalog.load()
+    for weapon in catalog.resolve(catalog.units.named("M24 Grizzly"), "weapons"):
+        print(weapon.name, catalog.names(weapon, "keywords"))
+"""
+
+import csv
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+UNITS_FILE = "units.csv"
+WEAPONS_FILE = "weapons.csv"
+TAGS_FILE = "tags.csv"
+KEYWORDS_FILE = "keywords.csv"
+TABLE_FILES = {"units": UNITS_FILE, "weapons": WEAPONS_FILE, "tags": TAGS_FILE, "keywords": KEYWORDS_FILE}
+
+# Permissions of a CSV written by save_csv where none existed
+NEW_CSV_MODE = 0o644
+
+# Autosaver waits this long after the last edit before writing
+AUTOSAVE_DELAY_SECONDS = 1.0
+
+# SearchIndex indexes every name substring up to this length
+SEARCH_GRAM = 3
+
+
+def split_refs(value: Optional[str]) -> tuple:
+    """'a,b,,c' -> ('a', 'b', 'c')"""
+    return tuple(part.strip() for part in (value or "").split(",") if part.strip())
+
+
+class Record:
+    """One catalog row. COLUMNS are the CSV columns; REFERENCES maps reference columns to the table they point into."""
+
+    __slots__ = ("uuid", "name", "extra")
+    COLUMNS = ("uuid", "name")
+    REFERENCES: Dict[str, str] = {}
+
+    def __init__(self, row: Dict[str, str]):
+        for column in self.COLUMNS:
+            value = row.get(column)
+            setattr(self, column, split_refs(value) if column in self.REFERENCES else (value or ""))
+        # Columns this tool doesn't know about, kept so saving doesn't drop them
+        self.extra = {k: v for k, v in row.items() if k not in self.COLUMNS and k is not None} or None
+
+    def get(self, key: str, default=None):
+        if key in self.REFERENCES:
+            return ",".join(getattr(self, key))
+        if key in self.COLUMNS:
+            return getattr(self, key)
+        return (self.extra or {}).get(key, default)
+
+    def __getitem__(self, key: str):
+        value = self.get(key, KeyError)
+        if value is KeyError:
+            raise KeyError(key)
+        return value
+
+    def to_row(self) -> Dict[str, str]:
+        row = {column: self.get(column) for column in self.COLUMNS}
+        if self.extra:
+            row.update(self.extra)
+        return row
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.uuid!r}, {self.name!r})"
+
+
+class Unit(Record):
+    __slots__ = ("subtitle", "M", "A", "C", "H", "MP", "Mat", "abilities", "weapons", "tags")
+    COLUMNS = Record.COLUMNS + __slots__
+    REFERENCES = {"weapons": "weapons", "tags": "tags"}
+
+
+class Weapon(Record):
+    __slots__ = ("R", "N", "L", "M", "H", "F", "keywords")
+    COLUMNS = Record.COLUMNS + __slots__
+    REFERENCES = {"keywords": "keywords"}
+
+
+class Tag(Record):
+    __slots__ = ()
+
+
+class Keyword(Record):
+    __slots__ = ()
+
+
+class Table:
+    """The records of one CSV in file order, indexed by uuid and by name (first one wins on duplicates)."""
+
+    __slots__ = ("name", "record_type", "records", "by_uuid", "by_name", "fieldnames")
+
+    def __init__(self, name: str, record_type: type, rows: List[Dict[str, str]], fieldnames: Optional[List[str]] = None):
+        self.name = name
+        self.record_type = record_type
+        self.records: List[Record] = []
+        self.by_uuid: Dict[str, Record] = {}
+        self.by_name: Dict[str, Record] = {}
+        self.fieldnames = list(fieldnames or record_type.COLUMNS)
+        for row in rows:
+            self.append(record_type(row))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[Record]:
+        return iter(self.records)
+
+    def __getitem__(self, index: int) -> Record:
+        return self.records[index]
+
+    def get(self, uuid: str) -> Optional[Record]:
+        return self.by_uuid.get(uuid)
+
+    def named(self, name: str) -> Optional[Record]:
+        return self.by_name.get(name)
+
+    def append(self, record: Record) -> Record:
+        self.records.append(record)
+        self.index(record)
+        return record
+
+    def index(self, record: Record) -> None:
+        self.by_uuid.setdefault(record.uuid, record)
+        self.by_name.setdefault(record.name, record)
+
+    def unindex(self, record: Record) -> None:
+        """Drops record from the indexes, handing its keys to a duplicate if there is one"""
+        for index, key, attr in ((self.by_uuid, record.uuid, "uuid"), (self.by_name, record.name, "name")):
+            if index.get(key) is record:
+                del index[key]
+                other = next((r for r in self.records if r is not record and getattr(r, attr) == key), None)
+                if other is not None:
+                    index[key] = other
+
+    def rows(self) -> List[Dict[str, str]]:
+        return [record.to_row() for record in self.records]
+
+
+class Catalog:
+    """
+    The four catalog tables plus reverse reference indexes:
+    referrers[(table, column)][uuid] is the {uuid: record} of records whose
+    column lists uuid, e.g. referrers[("units", "weapons")]["9mm-smg"].
+    """
+
+    def __init__(self, units: Table, weapons: Table, tags: Table, keywords: Table):
+        # Edits and save snapshots hold the lock, so an Autosaver thread never sees a half-applied edit
+        self.lock = threading.RLock()
+        self.dirty: Dict[str, set] = {}  # table -> uuids edited since the last save
+        self.units = units
+        self.weapons = weapons
+        self.tags = tags
+        self.keywords = keywords
+        self.tables = {"units": units, "weapons": weapons, "tags": tags, "keywords": keywords}
+        self.referrers: Dict[tuple, Dict[str, Dict[str, Record]]] = {}
+        for table in (units, weapons):
+            for column in table.record_type.REFERENCES:
+                self.referrers[(table.name, column)] = {}
+            for record in table:
+                self._link(table, record)
+
+    @classmethod
+    def load(cls, directory: str = ".") -> "Catalog":
+        tables = []
+        for name, record_type in (("units", Unit), ("weapons", Weapon), ("tags", Tag), ("keywords", Keyword)):
+            rows, fieldnames = load_rows(os.path.join(directory, TABLE_FILES[name]))
+            tables.append(Table(name, record_type, rows, fieldnames))
+        return cls(*tables)
+
+    def _link(self, table: Table, record: Record, sign: int = 1) -> None:
+        for column in record.REFERENCES:
+            referrers = self.referrers[(table.name, column)]
+            for ref in getattr(record, column):
+                if sign > 0:
+                    referrers.setdefault(ref, {})[record.uuid] = record
+                else:
+                    users = referrers.get(ref)
+                    if users and users.get(record.uuid) is record:
+                        del users[record.uuid]
+                        if not users:
+                            del referrers[ref]
+
+    # Lookups
+
+    def resolve(self, record: Record, column: str) -> List[Record]:
+        """The records a reference column points at, in the listed order; dangling uuids are skipped."""
+        target = self.tables[record.REFERENCES[column]]
+        seen = set()
+        resolved = []
+        for ref in getattr(record, column):
+            found = target.get(ref)
+            if found is not None and ref not in seen:
+                seen.add(ref)
+                resolved.append(found)
+        return resolved
+
+    def names(self, record: Record, column: str) -> List[str]:
+        return [r.name for r in self.resolve(record, column)]
+
+    def referring(self, table: str, column: str, uuid: str) -> List[Record]:
+        return list(self.referrers[(table, column)].get(uuid, {}).values())
+
+    def units_with_weapon(self, weapon_uuid: str) -> List[Record]:
+        return self.referring("units", "weapons", weapon_uuid)
+
+    def units_with_tag(self, tag_uuid: str) -> List[Record]:
+        return self.referring("units", "tags", tag_uuid)
+
+    def weapons_with_keyword(self, keyword_uuid: str) -> List[Record]:
+        return self.referring("weapons", "keywords", keyword_uuid)
+
+    def uuid_in_use(self, table: str, uuid: str) -> bool:
+        """Whether a record of table has uuid, or a reference already points at it (even dangling)"""
+        if self.tables[table].get(uuid) is not None:
+            return True
+        return any(uuid in referrers for (source, column), referrers in self.referrers.items()
+                   if self.tables[source].record_type.REFERENCES[column] == table)
+
+    # Edits (keep every index in step)
+
+    def add(self, table: str, values: Dict[str, str]) -> Record:
+        t = self.tables[table]
+        with self.lock:
+            record = t.append(t.record_type(values))
+            self._link(t, record)
+            self.dirty.setdefault(table, set()).add(record.uuid)
+        return record
+
+    def update(self, table: str, record: Record, values: Dict[str, str]) -> Record:
+        """Applies values (CSV strings, as for a new row) to record and reindexes it"""
+        t = self.tables[table]
+        changed = {column: value for column, value in values.items() if record.get(column) != (value or "")}
+        if not changed:
+            return record
+        # Reindexing only on a key change keeps which duplicate holds a key stable
+        rekey = "uuid" in changed or "name" in changed
+        with self.lock:
+            self._link(t, record, -1)
+            if rekey:
+                t.unindex(record)
+            for column, value in changed.items():
+                if column in record.REFERENCES:
+                    setattr(record, column, split_refs(value))
+                elif column in record.COLUMNS:
+                    setattr(record, column, value or "")
+                else:
+                    if record.extra is None:
+                        record.extra = {}
+                    record.extra[column] = value
+            if rekey:
+                t.index(record)
+            self._link(t, record)
+            self.dirty.setdefault(table, set()).add(record.uuid)
+        return record
+
+    # Saving
+
+    def unsaved(self) -> int:
+        """Number of records edited since the last save"""
+        with self.lock:
+            return sum(len(uuids) for uuids in self.dirty.values())
+
+    def save(self, directory: str = ".", tables: Optional[List[str]] = None) -> List[str]:
+        """Writes the dirty tables (or the named ones) to their CSVs, each atomically. Returns the tables written."""
+        def write_csvs(snapshots):
+            for name, fieldnames, rows in snapshots:
+                save_csv(os.path.join(directory, TABLE_FILES[name]), rows, fieldnames)
+        return self.write(write_csvs, tables)
+
+    def write(self, writer: Callable[[List[tuple]], None], tables: Optional[List[str]] = None) -> List[str]:
+        """
+        Hands writer the [(table, fieldnames, rows)] of the dirty tables (or the
+        named ones) and marks them saved. Rows are snapshotted under the lock and
+        written outside it, so edits carry on meanwhile. Returns the tables written.
+        """
+        with self.lock:
+            names = list(tables) if tables is not None else [name for name in self.tables if self.dirty.get(name)]
+            snapshots = [(name, self.tables[name].fieldnames, self.tables[name].rows()) for name in names]
+            saved = {name: self.dirty.pop(name, set()) for name in names}
+        try:
+            if snapshots:
+                writer(snapshots)
+        except Exception:
+            # Still unsaved: keep them dirty for the next attempt
+            with self.lock:
+                for name, uuids in saved.items():
+                    self.dirty.setdefault(name, set()).update(uuids)
+            raise
+        return names
+
+
+class Autosaver:
+    """
+    Saves a catalog's dirty tables on a background thread, delay seconds
+    after the last touch(). state is "saved", "pending", "saving" or
+    "failed: <error>", for display; a failed save is retried on the next touch().
+    save replaces the CSV save, e.g. to write to catalog_db instead.
+    """
+
+    def __init__(self, catalog: Catalog, directory: str = ".", delay: float = AUTOSAVE_DELAY_SECONDS,
+                 save: Optional[Callable[[], Any]] = None):
+        self.catalog = catalog
+        self.directory = directory
+        self.delay = delay
+        self.save = save or (lambda: catalog.save(directory))
+        self.cond = threading.Condition()
+        self.due: Optional[float] = None
+        self.stopping = False
+        self.state = "saved"
+        self.thread = threading.Thread(target=self.run, name="catalog-autosave", daemon=True)
+        self.thread.start()
+
+    def touch(self, now: bool = False) -> None:
+        """Schedules a save (postponing one already scheduled, unless now)"""
+        with self.cond:
+            self.due = time.monotonic() + (0 if now else self.delay)
+            self.state = "pending"
+            self.cond.notify()
+
+    def run(self) -> None:
+        while True:
+            with self.cond:
+                while not self.stopping and (self.due is None or time.monotonic() < self.due):
+                    self.cond.wait(None if self.due is None else self.due - time.monotonic())
+                if self.stopping:
+                    return
+                self.due = None
+                self.state = "saving"
+            self._save()
+
+    def _save(self) -> None:
+        try:
+            self.save()
+        except Exception as e:
+            with self.cond:
+                self.state = f"failed: {e}"
+        else:
+            with self.cond:
+                if self.due is None:
+                    self.state = "saved"
+
+    def stop(self) -> None:
+        """Stops the thread and saves whatever is still dirty, before returning"""
+        with self.cond:
+            self.stopping = True
+            self.cond.notify()
+        self.thread.join()
+        self._save()
+
+
+class SearchIndex:
+    """
+    Case-insensitive substring search over record names, as a picker filters them.
+
+    Names are lowered once and indexed by every substring of up to SEARCH_GRAM
+    characters, so a short query is one lookup. A longer one checks only the
+    names holding its rarest gram, and a query that extends the previous one
+    only re-checks the previous matches. Results are ascending positions into records.
+    """
+
+    def __init__(self, records):
+        self.records = list(records)
+        self.lowered = [record.name.lower() for record in self.records]
+        self.everything = list(range(len(self.records)))
+        self.grams: Dict[str, List[int]] = {}
+        for position, name in enumerate(self.lowered):
+            grams = {name[start:start + size]
+                     for size in range(1, SEARCH_GRAM + 1)
+                     for start in range(len(name) - size + 1)}
+            for gram in grams:
+                self.grams.setdefault(gram, []).append(position)
+        self.last_query = ""
+        self.last_result = self.everything
+
+    def search(self, query: str) -> List[int]:
+        """Positions of the records whose name contains query (don't modify the list)"""
+        query = query.lower()
+        if not query:
+            result = self.everything
+        elif self.last_query and self.last_query in query:
+            result = [p for p in self.last_result if query in self.lowered[p]]
+        elif len(query) <= SEARCH_GRAM:
+            result = self.grams.get(query, [])
+        else:
+            rarest = min((self.grams.get(query[start:start + SEARCH_GRAM], [])
+                          for start in range(len(query) - SEARCH_GRAM + 1)), key=len)
+            result = [p for p in rarest if query in self.lowered[p]]
+        self.last_query, self.last_result = query, result
+        return result
+
+
+def row_edits(shown: List[int], wanted: List[int]):
+    """
+    Edits turning a list showing positions `shown` into one showing `wanted`
+    (both ascending). Returns (deletes, inserts): (first, last) row ranges to
+    delete, bottom first, then (row, position) to insert, top first.
+    Rows showing a wanted position are left alone.
+    """
+    keep = set(wanted)
+    deletes = []
+    for row in range(len(shown) - 1, -1, -1):
+        if shown[row] in keep:
+            continue
+        if deletes and deletes[-1][0] == row + 1:
+            deletes[-1] = (row, deletes[-1][1])
+        else:
+            deletes.append((row, row))
+    present = set(shown)
+    inserts = [(row, position) for row, position in enumerate(wanted) if position not in present]
+    return deletes, inserts
+
+
+def save_csv(path: str, rows: List[Dict[str, str]], fieldnames: List[str]) -> None:
+    """
+    Writes rows to a temp file next to path, syncs it and renames it over
+    path, so a crash leaves either the old file or the new one, never half of one.
+    The file keeps its permissions (0644 for a new one) and LF line endings.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = NEW_CSV_MODE
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            # mkstemp creates the file 0600, which os.replace would carry over to path
+            os.chmod(tmp_path, mode)
+            writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(rows)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_rows(path: str):
+    """(rows, header) of a CSV file; ([], None) if it doesn't exist"""
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            return list(reader), reader.fieldnames
+    except FileNotFoundError:
+        return [], None
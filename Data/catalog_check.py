@@ -0,0 +1,186 @@
+"""
+catalog_check.py
+
+Referential-integrity and value checks for the unit catalog.
+
+Features:
+- Dangling references: unit weapons/tags and weapon keywords that name a
+  uuid missing from their table
+- Duplicate uuids and names within a table (the first row keeps the key,
+  later ones are reported)
+- Malformed values: penetration rolls must be "<n>+", "<n>-" or NA, range
+  and unit stats whole numbers, armor one of N/L/M/H
+- Validator checks the whole catalog in one pass over the catalog's hash
+  indexes, then revalidate() re-checks only an edited record and the records
+  on its edges: those sharing its old or new uuid/name, and those referring
+  to either uuid (via Catalog.referrers)
+
+CSVmaker revalidates on every save; regenerate_units_tex warns before writing.
+
+Example:
+    python catalog_check.py                 # check the CSVs
+    python catalog_check.py --db catalog.sqlite3
+"""
+
+import argparse
+import re
+import sys
+from typing import Dict, List, NamedTuple, Optional
+
+import catalog_db
+from catalog import Catalog, Record
+
+# Penetration per armor class, as on the weapon card
+ARMOR_CLASSES = ("N", "L", "M", "H")
+NOT_APPLICABLE = "NA"
+ROLL_RE = re.compile(r"^\d+[+-]$")
+NUMBER_RE = re.compile(r"^\d+$")
+
+UNIT_NUMBER_COLUMNS = ("M", "C", "H", "MP", "Mat")
+
+
+class Problem(NamedTuple):
+    table: str
+    uuid: str
+    name: str
+    message: str
+
+    def __str__(self):
+        return f"{self.table} {self.uuid!r} ({self.name}): {self.message}"
+
+
+def value_problems(table: str, record: Record) -> List[str]:
+    """Malformed values of one record"""
+    problems = []
+    if table == "weapons":
+        if not NUMBER_RE.match(record.R):
+            problems.append(f"R {record.R!r} is not a range")
+        for column in ARMOR_CLASSES:
+            value = getattr(record, column)
+            if value != NOT_APPLICABLE and not ROLL_RE.match(value):
+                problems.append(f"{column} {value!r} is not a roll (like 8-, 4+ or NA)")
+        if record.F != NOT_APPLICABLE and not NUMBER_RE.match(record.F):
+            problems.append(f"F {record.F!r} is not a number or NA")
+    elif table == "units":
+        if record.A not in ARMOR_CLASSES:
+            problems.append(f"A {record.A!r} is not an armor class ({'/'.join(ARMOR_CLASSES)})")
+        for column in UNIT_NUMBER_COLUMNS:
+            value = getattr(record, column)
+            if not NUMBER_RE.match(value):
+                problems.append(f"{column} {value!r} is not a number")
+    return problems
+
+
+class Validator:
+    """
+    The problems of every record in a catalog, kept current by revalidate().
+    Records are keyed by identity, so renames and uuid changes are tracked.
+    """
+
+    def __init__(self, catalog: Catalog):
+        self.catalog = catalog
+        self.problems: Dict[Record, List[Problem]] = {}
+        self.checked: Dict[Record, tuple] = {}  # record -> (uuid, name) when last checked
+        # (table, "uuid" or "name") -> key -> records holding it, in file order
+        self.holders: Dict[tuple, Dict[str, List[Record]]] = {
+            (table, attr): {} for table in catalog.tables for attr in ("uuid", "name")}
+        # target table -> [(table, column)] of the reference columns pointing into it
+        self.referenced_by: Dict[str, List[tuple]] = {table: [] for table in catalog.tables}
+        for table, column in catalog.referrers:
+            self.referenced_by[catalog.tables[table].record_type.REFERENCES[column]].append((table, column))
+        with catalog.lock:
+            for table, records in catalog.tables.items():
+                for record in records:
+                    self._hold(table, record)
+                    self._check(table, record)
+
+    def _hold(self, table: str, record: Record) -> None:
+        for attr in ("uuid", "name"):
+            self.holders[(table, attr)].setdefault(getattr(record, attr), []).append(record)
+
+    def _release(self, table: str, record: Record, keys: tuple) -> None:
+        for attr, key in zip(("uuid", "name"), keys):
+            holders = self.holders[(table, attr)]
+            records = [r for r in holders.get(key, ()) if r is not record]
+            if records:
+                holders[key] = records
+            else:
+                holders.pop(key, None)
+
+    def _check(self, table: str, record: Record) -> None:
+        t = self.catalog.tables[table]
+        messages = []
+        if not record.uuid:
+            messages.append("missing uuid")
+        elif t.get(record.uuid) is not record:
+            messages.append(f"duplicate uuid (already used by {t.get(record.uuid).name!r})")
+        if not record.name:
+            messages.append("missing name")
+        elif t.named(record.name) is not record:
+            messages.append(f"duplicate name (already used by {t.named(record.name).uuid!r})")
+        for column, target in record.REFERENCES.items():
+            targets = self.catalog.tables[target]
+            for ref in getattr(record, column):
+                if targets.get(ref) is None:
+                    messages.append(f"{column}: unknown {target} uuid {ref!r}")
+        messages.extend(value_problems(table, record))
+        self.checked[record] = (record.uuid, record.name)
+        if messages:
+            self.problems[record] = [Problem(table, record.uuid, record.name, m) for m in messages]
+        else:
+            self.problems.pop(record, None)
+
+    def revalidate(self, table: str, record: Record) -> List[Problem]:
+        """
+        Re-checks record after an edit (or its addition), plus the records on
+        its edges. Returns the current problems of every record re-checked.
+        """
+        with self.catalog.lock:
+            old = self.checked.get(record)
+            new = (record.uuid, record.name)
+            affected = {record: table}
+            if old != new:
+                if old is not None:
+                    self._release(table, record, old)
+                self._hold(table, record)
+                for i, attr in enumerate(("uuid", "name")):
+                    for key in {new[i]} | ({old[i]} if old else set()):
+                        for r in self.holders[(table, attr)].get(key, ()):
+                            affected.setdefault(r, table)
+                if old is None or old[0] != new[0]:
+                    for source, column in self.referenced_by[table]:
+                        for key in {new[0]} | ({old[0]} if old else set()):
+                            for r in self.catalog.referring(source, column, key):
+                                # referrers keeps one record per uuid; its duplicates may refer too
+                                for holder in self.holders[(source, "uuid")].get(r.uuid, ()):
+                                    affected.setdefault(holder, source)
+            for r, t in affected.items():
+                self._check(t, r)
+            return [p for r in affected for p in self.problems.get(r, ())]
+
+    def all(self) -> List[Problem]:
+        """Every problem, in table and file order"""
+        return [p for records in self.catalog.tables.values() for r in records for p in self.problems.get(r, ())]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the unit catalog for broken references and malformed values")
+    parser.add_argument("--db", help="check a catalog_db store instead of the CSVs")
+    parser.add_argument("--csv", default=".", help="directory holding the CSVs")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        conn = catalog_db.connect(args.db)
+        catalog = catalog_db.load_catalog(conn)
+        conn.close()
+    else:
+        catalog = Catalog.load(args.csv)
+    problems = Validator(catalog).all()
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} problem{'s' if len(problems) != 1 else ''}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
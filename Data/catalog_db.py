@@ -0,0 +1,290 @@
+"""
+catalog_db.py
+
+Optional SQLite store for the unit catalog, kept alongside the CSVs.
+
+Features:
+- One table per CSV, rows in file order, plus junction tables for the
+  reference columns (UnitWeapons, UnitTags, WeaponKeywords) indexed from
+  both ends, so "which units carry a Long weapon" is an indexed join
+- Lossless round trip with the CSV layout: row and column order, duplicate
+  and dangling uuids, and columns the tools don't know about all survive
+- load_catalog() returns the same Catalog the CSV tools use; CSVmaker and
+  regenerate_units_tex take --db to work on the store instead of the CSVs
+- save_catalog() writes a Catalog's dirty tables back in one transaction
+  (CSVmaker's autosaver uses it)
+
+playtest_db.attach_catalog() attaches the store to a playtest history
+database, so analytics can join participants to units and their weapons.
+
+Example:
+    python catalog_db.py import                 # CSVs -> catalog.sqlite3
+    python catalog_db.py export --csv exported  # catalog.sqlite3 -> CSVs
+    python catalog_db.py units-with-keyword long
+"""
+
+import argparse
+import json
+import sqlite3
+from collections import defaultdict
+from typing import List, Optional, Tuple
+
+from catalog import Catalog, Keyword, Table, Tag, Unit, Weapon
+
+CATALOG_DB_PATH = "catalog.sqlite3"
+
+# Catalog table -> (SQL table, record type), in Catalog() argument order
+TABLES = {
+    "units": ("Units", Unit),
+    "weapons": ("Weapons", Weapon),
+    "tags": ("Tags", Tag),
+    "keywords": ("Keywords", Keyword),
+}
+
+# (catalog table, reference column) -> (junction table, owner column, referenced uuid column)
+JUNCTIONS = {
+    ("units", "weapons"): ("UnitWeapons", "unit", "weapon_uuid"),
+    ("units", "tags"): ("UnitTags", "unit", "tag_uuid"),
+    ("weapons", "keywords"): ("WeaponKeywords", "weapon", "keyword_uuid"),
+}
+
+# position is the row's index in its CSV. uuids are indexed, not unique, and
+# junctions hold referenced uuids as text: the CSVs allow duplicates and dangling refs.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS Units (
+    position INTEGER PRIMARY KEY,
+    uuid TEXT NOT NULL,
+    name TEXT NOT NULL,
+    subtitle TEXT NOT NULL,
+    M TEXT NOT NULL,
+    A TEXT NOT NULL,
+    C TEXT NOT NULL,
+    H TEXT NOT NULL,
+    MP TEXT NOT NULL,
+    Mat TEXT NOT NULL,
+    abilities TEXT NOT NULL,
+    extra TEXT                      -- JSON of the columns not listed here
+);
+CREATE INDEX IF NOT EXISTS idx_units_uuid ON Units(uuid);
+CREATE INDEX IF NOT EXISTS idx_units_name ON Units(name);
+
+CREATE TABLE IF NOT EXISTS Weapons (
+    position INTEGER PRIMARY KEY,
+    uuid TEXT NOT NULL,
+    name TEXT NOT NULL,
+    R TEXT NOT NULL,
+    N TEXT NOT NULL,
+    L TEXT NOT NULL,
+    M TEXT NOT NULL,
+    H TEXT NOT NULL,
+    F TEXT NOT NULL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_weapons_uuid ON Weapons(uuid);
+CREATE INDEX IF NOT EXISTS idx_weapons_name ON Weapons(name);
+
+CREATE TABLE IF NOT EXISTS Tags (
+    position INTEGER PRIMARY KEY,
+    uuid TEXT NOT NULL,
+    name TEXT NOT NULL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tags_uuid ON Tags(uuid);
+
+CREATE TABLE IF NOT EXISTS Keywords (
+    position INTEGER PRIMARY KEY,
+    uuid TEXT NOT NULL,
+    name TEXT NOT NULL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_keywords_uuid ON Keywords(uuid);
+
+-- slot keeps the order the CSV column lists the uuids in
+CREATE TABLE IF NOT EXISTS UnitWeapons (
+    unit INTEGER NOT NULL REFERENCES Units(position) ON DELETE CASCADE,
+    slot INTEGER NOT NULL,
+    weapon_uuid TEXT NOT NULL,
+    PRIMARY KEY (unit, slot)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_unit_weapons_weapon ON UnitWeapons(weapon_uuid, unit);
+
+CREATE TABLE IF NOT EXISTS UnitTags (
+    unit INTEGER NOT NULL REFERENCES Units(position) ON DELETE CASCADE,
+    slot INTEGER NOT NULL,
+    tag_uuid TEXT NOT NULL,
+    PRIMARY KEY (unit, slot)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_unit_tags_tag ON UnitTags(tag_uuid, unit);
+
+CREATE TABLE IF NOT EXISTS WeaponKeywords (
+    weapon INTEGER NOT NULL REFERENCES Weapons(position) ON DELETE CASCADE,
+    slot INTEGER NOT NULL,
+    keyword_uuid TEXT NOT NULL,
+    PRIMARY KEY (weapon, slot)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_weapon_keywords_keyword ON WeaponKeywords(keyword_uuid, weapon);
+
+-- Each CSV's header, in order (extra columns included)
+CREATE TABLE IF NOT EXISTS CatalogColumns (
+    table_name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (table_name, position)
+) WITHOUT ROWID;
+"""
+
+
+def connect(path: str = CATALOG_DB_PATH) -> sqlite3.Connection:
+    """Opens (creating if needed) a catalog store, with foreign keys on"""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON;")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _value_columns(record_type: type) -> List[str]:
+    """The columns stored in the record's own table (references live in junctions)"""
+    return [column for column in record_type.COLUMNS if column not in record_type.REFERENCES]
+
+
+def _write_tables(conn: sqlite3.Connection, snapshots: List[tuple]) -> None:
+    """Replaces the named tables with [(table, fieldnames, rows)], in one transaction"""
+    with conn:
+        for name, fieldnames, rows in snapshots:
+            sql_table, record_type = TABLES[name]
+            columns = _value_columns(record_type)
+            conn.execute(f"DELETE FROM {sql_table}")  # junction rows go with it
+            conn.execute("DELETE FROM CatalogColumns WHERE table_name = ?", (name,))
+            conn.executemany("INSERT INTO CatalogColumns (table_name, position, name) VALUES (?, ?, ?)",
+                             [(name, i, column) for i, column in enumerate(fieldnames)])
+            insert = (f"INSERT INTO {sql_table} (position, {', '.join(columns)}, extra) "
+                      f"VALUES ({', '.join('?' * (len(columns) + 2))})")
+            for position, row in enumerate(rows):
+                record = record_type(row)
+                conn.execute(insert, [position] + [getattr(record, column) for column in columns]
+                             + [json.dumps(record.extra) if record.extra else None])
+                for column in record.REFERENCES:
+                    junction, owner, ref = JUNCTIONS[(name, column)]
+                    conn.executemany(f"INSERT INTO {junction} ({owner}, slot, {ref}) VALUES (?, ?, ?)",
+                                     [(position, slot, uuid) for slot, uuid in enumerate(getattr(record, column))])
+
+
+def import_catalog(conn: sqlite3.Connection, catalog: Catalog) -> None:
+    """Replaces the store's contents with catalog (all four tables)"""
+    with catalog.lock:
+        snapshots = [(name, table.fieldnames, table.rows()) for name, table in catalog.tables.items()]
+    _write_tables(conn, snapshots)
+
+
+def import_csv(conn: sqlite3.Connection, directory: str = ".") -> Catalog:
+    """Loads the CSVs in directory into the store; returns the catalog read"""
+    catalog = Catalog.load(directory)
+    import_catalog(conn, catalog)
+    return catalog
+
+
+def load_catalog(conn: sqlite3.Connection) -> Catalog:
+    """The store's contents as a Catalog, exactly as Catalog.load would read the exported CSVs"""
+    tables = []
+    for name, (sql_table, record_type) in TABLES.items():
+        fieldnames = [column for (column,) in conn.execute(
+            "SELECT name FROM CatalogColumns WHERE table_name = ? ORDER BY position", (name,))]
+        refs = {}
+        for column in record_type.REFERENCES:
+            junction, owner, ref = JUNCTIONS[(name, column)]
+            refs[column] = defaultdict(list)
+            for position, uuid in conn.execute(f"SELECT {owner}, {ref} FROM {junction} ORDER BY {owner}, slot"):
+                refs[column][position].append(uuid)
+        columns = _value_columns(record_type)
+        rows = []
+        for position, *values, extra in conn.execute(
+                f"SELECT position, {', '.join(columns)}, extra FROM {sql_table} ORDER BY position"):
+            row = dict(zip(columns, values))
+            for column, by_position in refs.items():
+                row[column] = ",".join(by_position.get(position, ()))
+            if extra:
+                row.update(json.loads(extra))
+            rows.append(row)
+        tables.append(Table(name, record_type, rows, fieldnames or None))
+    return Catalog(*tables)
+
+
+def save_catalog(conn: sqlite3.Connection, catalog: Catalog) -> List[str]:
+    """Writes catalog's dirty tables to the store (see Catalog.write). Returns the tables written."""
+    return catalog.write(lambda snapshots: _write_tables(conn, snapshots))
+
+
+def export_csv(conn: sqlite3.Connection, directory: str = ".") -> List[str]:
+    """Writes all four CSVs from the store into directory, each atomically"""
+    return load_catalog(conn).save(directory, tables=list(TABLES))
+
+
+# Indexed lookups: (uuid, name) of the matching records, in file order
+
+def _lookup(conn: sqlite3.Connection, sql: str, params: tuple) -> List[Tuple[str, str]]:
+    return [(uuid, name) for _, uuid, name in conn.execute(sql, params)]
+
+
+def units_with_weapon(conn: sqlite3.Connection, weapon_uuid: str) -> List[Tuple[str, str]]:
+    return _lookup(conn, """
+    SELECT DISTINCT u.position, u.uuid, u.name FROM UnitWeapons uw
+    JOIN Units u ON u.position = uw.unit
+    WHERE uw.weapon_uuid = ? ORDER BY u.position
+    """, (weapon_uuid,))
+
+
+def units_with_tag(conn: sqlite3.Connection, tag_uuid: str) -> List[Tuple[str, str]]:
+    return _lookup(conn, """
+    SELECT DISTINCT u.position, u.uuid, u.name FROM UnitTags ut
+    JOIN Units u ON u.position = ut.unit
+    WHERE ut.tag_uuid = ? ORDER BY u.position
+    """, (tag_uuid,))
+
+
+def weapons_with_keyword(conn: sqlite3.Connection, keyword_uuid: str) -> List[Tuple[str, str]]:
+    return _lookup(conn, """
+    SELECT DISTINCT w.position, w.uuid, w.name FROM WeaponKeywords wk
+    JOIN Weapons w ON w.position = wk.weapon
+    WHERE wk.keyword_uuid = ? ORDER BY w.position
+    """, (keyword_uuid,))
+
+
+def units_with_weapon_keyword(conn: sqlite3.Connection, keyword_uuid: str) -> List[Tuple[str, str]]:
+    """Units carrying at least one weapon with the keyword, e.g. "long" """
+    return _lookup(conn, """
+    SELECT DISTINCT u.position, u.uuid, u.name FROM WeaponKeywords wk
+    JOIN Weapons w ON w.position = wk.weapon
+    JOIN UnitWeapons uw ON uw.weapon_uuid = w.uuid
+    JOIN Units u ON u.position = uw.unit
+    WHERE wk.keyword_uuid = ? ORDER BY u.position
+    """, (keyword_uuid,))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="SQLite store for the unit catalog CSVs")
+    parser.add_argument("--db", default=CATALOG_DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    importer = sub.add_parser("import", help="replace the store's contents with the CSVs")
+    importer.add_argument("--csv", default=".", help="directory holding the CSVs")
+    exporter = sub.add_parser("export", help="write the CSVs from the store")
+    exporter.add_argument("--csv", default=".", help="directory to write the CSVs to")
+    query = sub.add_parser("units-with-keyword", help="units carrying a weapon with a keyword (uuid)")
+    query.add_argument("keyword")
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    try:
+        if args.command == "import":
+            catalog = import_csv(conn, args.csv)
+            print("Imported " + ", ".join(f"{len(table)} {name}" for name, table in catalog.tables.items()))
+        elif args.command == "export":
+            print("Wrote " + ", ".join(export_csv(conn, args.csv)))
+        else:
+            for uuid, name in units_with_weapon_keyword(conn, args.keyword):
+                print(f"{uuid}\t{name}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
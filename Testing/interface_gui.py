@@ -1,74 +1,162 @@
 # interface_gui.py
-import sqlite3
 import tkinter as tk
 from tkinter import messagebox, ttk
 import datetime
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+import playtest_db
+import playtest_journal
+import playtest_replay
 
 DB_FILE = "playtest_history.sqlite3"
 
-def init_if_needed():
-    """Initialize database if it doesn't exist"""
-    import playtest_db
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='Sessions'")
-    if not cur.fetchone():
-        playtest_db.init_db(conn)
-    conn.close()
+# Actions fetched per keyset page, and pages kept in memory by the actions view
+ACTIONS_PAGE_SIZE = 100
+ACTIONS_CACHED_PAGES = 8
+
+# Session stats columns: (heading, action types counted), and how many tags are listed
+STATS_COLUMNS = [
+    ("Moves", playtest_replay.MOVE_TYPES),
+    ("Shots", playtest_replay.ATTACK_TYPES),
+    ("Captures", ("Capture", "Control")),
+    ("Transport", ("Embark", "Disembark")),
+]
+STATS_TOP_TAGS = 8
+
+# Poll interval for worker results, and how long work runs before the busy indicator shows
+WORKER_POLL_MS = 30
+BUSY_DELAY_MS = 150
+
+# Rapid entry: how often the journal is checked for a due flush, and the wait after a failed flush
+JOURNAL_CHECK_MS = 250
+JOURNAL_RETRY_SECONDS = 10
+
+class DbWorker:
+    """
+    Runs database work off the Tk thread.
+
+    A single thread owns its own pooled connection and runs submitted
+    functions in order; the Tk thread picks the results up with root.after
+    and calls on_done / on_error there. Submitting with the key of a pending
+    request supersedes it: the older one is skipped if it hasn't started, and
+    its callbacks never run either way.
+    """
+
+    def __init__(self, root, db_file, on_busy=None):
+        self.root = root
+        self.db_file = db_file
+        self.on_busy = on_busy
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.latest = {}        # key -> id of the request allowed to deliver
+        self.pending = 0
+        self.busy_since = None
+        self.busy_shown = False
+        self.ids = itertools.count(1)
+        self.thread = threading.Thread(target=self.run, name="playtest-db-worker", daemon=True)
+        self.thread.start()
+        self.root.after(WORKER_POLL_MS, self.poll)
+
+    def submit(self, fn, *args, on_done=None, on_error=None, key=None):
+        """Queues fn(conn, *args) for the worker thread; returns the request id"""
+        request_id = next(self.ids)
+        if key is not None:
+            self.latest[key] = request_id
+        self.pending += 1
+        if self.busy_since is None:
+            self.busy_since = time.monotonic()
+        self.requests.put((request_id, key, fn, args, on_done, on_error))
+        return request_id
+
+    def cancel(self, key):
+        """Drops the pending request with key, if any"""
+        self.latest.pop(key, None)
+
+    def is_current(self, request_id, key):
+        return key is None or self.latest.get(key) == request_id
+
+    def run(self):
+        conn = playtest_db.get_connection(self.db_file)
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            request_id, key, fn, args, on_done, on_error = request
+            if not self.is_current(request_id, key):
+                self.results.put((request_id, key, None, None))
+                continue
+            try:
+                result = fn(conn, *args)
+            except Exception as e:
+                # The connection is shared by every request, so don't leave a half-written change pending
+                if conn.in_transaction:
+                    conn.rollback()
+                self.results.put((request_id, key, on_error or show_error, e))
+            else:
+                self.results.put((request_id, key, on_done, result))
+        playtest_db.close_connections()
+
+    def poll(self):
+        while True:
+            try:
+                request_id, key, callback, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending -= 1
+            if self.is_current(request_id, key):
+                if key is not None:
+                    del self.latest[key]
+                if callback is not None:
+                    callback(value)
+        if self.pending == 0:
+            self.busy_since = None
+        busy = self.busy_since is not None and (time.monotonic() - self.busy_since) * 1000 >= BUSY_DELAY_MS
+        if busy != self.busy_shown and self.on_busy is not None:
+            self.busy_shown = busy
+            self.on_busy(busy)
+        self.root.after(WORKER_POLL_MS, self.poll)
+
+    def stop(self):
+        self.requests.put(None)
+        self.thread.join(timeout=5)
+
+def show_error(error):
+    messagebox.showerror("Error", str(error))
+
+def show_busy(busy):
+    """Busy indicator: status text and a watch cursor while the worker is behind"""
+    busy_var.set("Working…" if busy else "")
+    root.configure(cursor="watch" if busy else "")
+
+def fetch_sessions(conn):
+    return conn.execute("SELECT id, date, version, notes FROM Sessions ORDER BY date DESC").fetchall()
 
 def load_sessions():
     """Load and display all sessions in the sessions treeview"""
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT s.id, s.date, s.version, s.notes,
-               GROUP_CONCAT(p.name, ' vs ') as players
-        FROM Sessions s
-        LEFT JOIN SessionPlayers sp ON sp.session_id = s.id
-        LEFT JOIN Players p ON p.id = sp.player_id
-        GROUP BY s.id
-        ORDER BY s.date DESC
-    """)
-    sessions = cur.fetchall()
-    conn.close()
-    
-    # Clear existing items
-    for item in sessions_tree.get_children():
-        sessions_tree.delete(item)
-    
-    # Insert sessions
-    for session in sessions:
-        sessions_tree.insert("", "end", values=session)
-
-def get_session_players(session_id):
-    """Get players for a session for the player dropdown"""
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT p.id, p.name 
-        FROM Players p 
-        JOIN SessionPlayers sp ON sp.player_id = p.id 
-        WHERE sp.session_id = ?
-    """, (session_id,))
-    players = cur.fetchall()
-    conn.close()
-    return players  # Updated to match playtest_db.py
+    worker.submit(fetch_sessions, on_done=show_sessions, key="sessions")
 
-def load_sessions():
-    """Load and display all sessions in the sessions treeview"""
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("SELECT id, date, version, notes FROM Sessions ORDER BY date DESC")
-    sessions = cur.fetchall()
-    conn.close()
-    
+def show_sessions(sessions):
     # Clear existing items
-    for item in sessions_tree.get_children():
-        sessions_tree.delete(item)
+    sessions_tree.delete(*sessions_tree.get_children())
     
-    # Insert sessions
+    # Insert sessions; iids are session ids so single rows can be updated in place
     for session in sessions:
-        sessions_tree.insert("", "end", values=session)
+        sessions_tree.insert("", "end", iid=str(session[0]), values=session)
+
+def refresh_lists():
+    """Full reload of the sessions and the shown actions (the Refresh Lists button)"""
+    load_sessions()
+    actions_view.invalidate()
+    stats_panel.load(stats_panel.session_id)
+    worker.cancel("replay")
+    global current_replay
+    current_replay = None
+    show_replay_state(None)
 
 def on_session_select(event):
     """Handle session selection to show its actions"""
@@ -79,93 +167,59 @@ def on_session_select(event):
     # Get session id from selected item
     session_id = sessions_tree.item(selected[0])['values'][0]
     
-    # Use playtest_db to get full action details
-    conn = connect()
-    import playtest_db
-    actions = playtest_db.actions_for_session(conn, session_id)
+    # Only the first page of actions is fetched; the view loads the rest as it scrolls.
+    # Selecting another session before these finish cancels them (same keys).
+    actions_view.show(playtest_db.ActionFilter.session(session_id))
+    stats_panel.load(session_id)
+    worker.submit(playtest_db.get_session_players, session_id, on_done=show_session_players, key="session-players")
     
+    # Replay panel: the full log is only loaded once the slider is used
+    global current_replay, replay_session_id
+    worker.cancel("replay")
+    current_replay = None
+    replay_session_id = session_id
+    show_replay_state(None)
+
+    # Update selected session label and entry
+    selected_session.set(f"Selected Session: {session_id}")
+    entry_session.delete(0, tk.END)
+    entry_session.insert(0, str(session_id))
+
+def show_session_players(players):
     # Update player dropdown with session players
-    players = playtest_db.get_session_players(conn, session_id)
     player_names = [p[1] for p in players]
     player_dropdown['values'] = player_names
     if player_names:
         player_var.set(player_names[0])
-    
-    conn.close()
-    
-    # Clear existing items
-    for item in actions_tree.get_children():
-        actions_tree.delete(item)
-    
-    # Insert actions with full details including participants and tags
-    for action in actions:
-        # Format participants
-        participants_str = action['primary_participant'] or ''
-        if action['secondary_participants']:
-            if participants_str:
-                participants_str += " → "
-            participants_str += ", ".join(action['secondary_participants'])
-        
-        # Format tags
-        tags_str = ", ".join(action['tags'])
-        
-        values = [
-            action['id'],
-            action['player'],
-            action['type'],
-            action['notes'],
-            participants_str,
-            tags_str
-        ]
-        actions_tree.insert("", "end", values=values)
-        
-    # Update selected session label and entry
-    selected_session.set(f"Selected Session: {session_id}")
-    entry_session.delete(0, tk.END)
-    entry_session.insert(0, str(session_id))
 
-# Modify add_session to refresh the list
-def add_session():
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO Sessions (date, version, notes) VALUES (?, ?, ?)",
-                (datetime.date.today().isoformat(), entry_version.get(), entry_notes.get()))
-    conn.commit()
-    conn.close()
-    messagebox.showinfo("Added", "Session added")
-    load_sessions()  # Refresh the sessions list
+def on_actions_total(total):
+    """The actions view's row count changed: size the replay slider to match"""
+    at_end = replay_scale.get() >= float(replay_scale.cget("to"))
+    replay_scale.configure(to=total)
+    if at_end or current_replay is None:
+        replay_scale.set(total)
+    if current_replay is not None:
+        show_replay_state(replay_scale.get())
 
 # Action types available in the dropdown
-ACTION_TYPES = ["Advance", "Embark", "Disembark", "Salvo", "Capture", "Move", "Consolidate", "Control", "Shot"]
-
-def connect():
-    return sqlite3.connect(DB_FILE)
+ACTION_TYPES = playtest_db.ACTION_TYPES
 
 def add_session():
     if not entry_player1.get() or not entry_player2.get():
         messagebox.showerror("Error", "Both players must be specified")
         return
-        
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO Sessions (date, version, notes) VALUES (?, ?, ?)",
-                (datetime.date.today().isoformat(), entry_version.get(), entry_notes.get()))
-    session_id = cur.lastrowid
     
-    # Add players to session
-    for player in [entry_player1.get(), entry_player2.get()]:
-        # First ensure player exists
-        cur.execute("INSERT OR IGNORE INTO Players (name) VALUES (?)", (player,))
-        cur.execute("SELECT id FROM Players WHERE name = ?", (player,))
-        player_id = cur.fetchone()[0]
-        # Then link to session
-        cur.execute("INSERT INTO SessionPlayers (session_id, player_id) VALUES (?, ?)",
-                   (session_id, player_id))
+    date = datetime.date.today().isoformat()
+    version, notes = entry_version.get(), entry_notes.get()
     
-    conn.commit()
-    conn.close()
-    messagebox.showinfo("Added", "Session added")
-    load_sessions()
+    def added(session_id):
+        # Newest date first, so today's session goes at the top
+        if not sessions_tree.exists(str(session_id)):
+            sessions_tree.insert("", 0, iid=str(session_id), values=(session_id, date, version, notes))
+        messagebox.showinfo("Added", "Session added")
+    
+    worker.submit(playtest_db.add_session, version, entry_player1.get(), entry_player2.get(),
+                  date, notes, on_done=added)
 
 def handle_enter(event):
     widget = event.widget
@@ -199,48 +253,489 @@ def add_action(event=None):
         
     # Collect tags
     tags = [t.strip() for t in entry_tags.get().split(',')] if entry_tags.get() else None
-        
-    conn = connect()
+    
     try:
-        # Use the playtest_db function to add the action with all details
-        import playtest_db
-        playtest_db.add_action(
-            conn,
-            int(entry_session.get()),
-            player_var.get(),
-            action_type_var.get(),
-            entry_notes.get(),
-            primary_participant=primary,
-            secondary_participants=secondary,
-            tags=tags
-        )
-        
-        # Only clear notes field, keep the rest
+        session_id = int(entry_session.get())
+    except ValueError:
+        messagebox.showerror("Error", f"Session {entry_session.get()!r} is not a session id")
+        return
+    
+    if rapid_var.get():
+        # The journal can't tell a typo from a real session, so check before acknowledging
+        if not sessions_tree.exists(str(session_id)):
+            messagebox.showerror("Error", f"Session {session_id} not found")
+            return
+        # Rapid entry: journal it (durable on return) and let the flusher commit it later
+        journal.append(session_id, player_var.get() or None, action_type_var.get(), entry_notes.get() or None,
+                       primary, secondary, tags)
+        show_journal_state()
         entry_notes.delete(0, tk.END)
-        
-        # Refresh the actions list if this action belongs to the currently selected session
-        selected = sessions_tree.selection()
-        if selected and str(sessions_tree.item(selected[0])['values'][0]) == entry_session.get():
-            on_session_select(None)
-        
+        primary_participant.focus()
+        return
+    
+    notes = entry_notes.get()
+    
+    def added(action):
+        show_new_action(action)
+        # Only clear notes field, keep the rest; on error the notes stay for a retry,
+        # and anything typed since the submit is left alone
+        if entry_notes.get() == notes:
+            entry_notes.delete(0, tk.END)
         messagebox.showinfo("Added", "Action added")
         # Set focus back to primary participant field
         primary_participant.focus()
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
-    finally:
-        conn.close()
+    
+    # Use the playtest_db function to add the action with all details (the worker
+    # rolls back on error)
+    worker.submit(add_action_row, session_id, player_var.get(), action_type_var.get(), notes,
+                  primary, secondary, tags, on_done=added)
+
+def show_new_action(action):
+    """Add just the new row if this action belongs to the currently shown session"""
+    if replay_session_id == action['session_id']:
+        if current_replay is not None:
+            current_replay.append(action)
+        actions_view.append(action)
+    stats_panel.add(action)
+
+def add_action_row(conn, session_id, player, action_type, notes, primary, secondary, tags):
+    """Worker side of add_action: inserts, then reads the row back for the actions view"""
+    action_id = playtest_db.add_action(conn, session_id, player, action_type, notes,
+                                       primary_participant=primary, secondary_participants=secondary, tags=tags)
+    return playtest_db.get_action(conn, action_id)
+
+def flush_journal_rows(conn):
+    """Worker side of the journal flush: commits it, then reads the new rows back for the actions view"""
+    written, dropped = journal.flush(conn)
+    return [playtest_db.get_action(conn, action_id) for action_id in written.values()], dropped
+
+def journal_tick():
+    """Hands the journal to the worker when a flush is due (every N actions, or once idle)"""
+    global journal_flushing
+    if not journal_flushing and time.monotonic() >= journal_retry_at and journal.should_flush():
+        journal_flushing = True
+        worker.submit(flush_journal_rows, on_done=journal_flushed, on_error=journal_flush_failed)
+    root.after(JOURNAL_CHECK_MS, journal_tick)
+
+def journal_flushed(result):
+    global journal_flushing
+    journal_flushing = False
+    actions, _ = result  # dropped entries are counted in journal.dropped
+    for action in actions:
+        if action is not None:
+            show_new_action(action)
+    show_journal_state()
+
+def journal_flush_failed(error):
+    # Entries stay journaled; retry later rather than raising a dialog every tick
+    global journal_flushing, journal_retry_at
+    journal_flushing = False
+    journal_retry_at = time.monotonic() + JOURNAL_RETRY_SECONDS
+    show_journal_state(error)
+
+def show_journal_state(error=None):
+    parts = [f"{len(journal)} queued"] if len(journal) or error is not None else []
+    if error is not None:
+        parts.append(f"flush failed: {error}")
+    if journal.dropped:
+        # Sessions deleted while their actions were queued; the actions are kept in the dropped file
+        parts.append(f"{journal.dropped} dropped (no such session), see {os.path.basename(journal.dropped_path)}")
+    journal_var.set(", ".join(parts))
+
+def format_action_row(action):
+    """Treeview values for an actions_page action"""
+    primary = next((p['name'] for p in action['participants'] if p['role'] == 'primary'), '')
+    secondary = [p['name'] for p in action['participants'] if p['role'] != 'primary']
+    participants_str = primary
+    if secondary:
+        if participants_str:
+            participants_str += " → "
+        participants_str += ", ".join(secondary)
+    return [action['id'], action['player'], action['type'], participants_str, ", ".join(action['tags']), action['notes']]
+
+class VirtualActionList:
+    """
+    Virtualized view of a filtered action list in a Treeview.
+
+    Only the rows in view are inserted into the tree. They come from
+    ACTIONS_PAGE_SIZE keyset pages (playtest_db.actions_page) fetched when
+    scrolled into view, with the last ACTIONS_CACHED_PAGES kept. The scrollbar is
+    driven by the total count, and a drag jumps straight to the right page via
+    actions_cursor_at, so opening or scrolling a long session stays instant.
+    Pages load on the worker; rows still loading show as placeholders, and
+    pages scrolled past before they arrive are cancelled.
+    Row iids are action ids.
+    """
+
+    def __init__(self, tree, scrollbar, page_size=ACTIONS_PAGE_SIZE, cached_pages=ACTIONS_CACHED_PAGES, on_total=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.page_size = page_size
+        self.cached_pages = cached_pages
+        self.on_total = on_total
+        self.where = None
+        self.total = 0
+        self.top = 0
+        self.selected_id = None
+        self.generation = 0         # bumped whenever cached pages become invalid
+        self.pages = OrderedDict()  # page number -> actions
+        self.cursors = {0: None}    # page number -> actions_page cursor that starts it, or PAST_END
+        self.loading = {}           # page number -> worker key
+        self.row_height = 20
+        self.header_height = 25
+        scrollbar.configure(command=self.on_scrollbar)
+        tree.bind("<Configure>", lambda e: self.render())
+        tree.bind("<<TreeviewSelect>>", self.on_select)
+        tree.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        tree.bind("<Button-5>", lambda e: self.scroll(3))
+        tree.bind("<Prior>", lambda e: self.scroll(-self.visible_rows()))
+        tree.bind("<Next>", lambda e: self.scroll(self.visible_rows()))
+        tree.bind("<Up>", lambda e: self.on_arrow(-1))
+        tree.bind("<Down>", lambda e: self.on_arrow(1))
+
+    def show(self, where):
+        """Display the actions matching where (an ActionFilter; None clears the view)"""
+        self.where = where
+        self.top = 0
+        self.selected_id = None
+        self.total = 0
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget cached pages (after edits) and redraw at the same position once recounted"""
+        self.generation += 1
+        self.pages.clear()
+        self.cursors = {0: None}
+        for key in self.loading.values():
+            worker.cancel(key)
+        self.loading.clear()
+        if self.where is not None:
+            generation = self.generation
+            worker.submit(playtest_db.count_actions, self.where, key="actions-count",
+                          on_done=lambda total: self.counted(generation, total))
+        self.render()
+
+    def counted(self, generation, total):
+        if generation != self.generation:
+            return
+        self.total = total
+        if self.on_total is not None:
+            self.on_total(total)
+        self.render()
+
+    def append(self, action):
+        """
+        A newly logged action (the largest id, so the last row): grows the last
+        cached page in place instead of refetching. Follows the tail if the
+        view was showing the end.
+        """
+        visible = self.visible_rows()
+        at_end = self.top + visible >= self.total
+        number, offset = divmod(self.total, self.page_size)
+        if number in self.loading:
+            # Requested before the insert, so it would arrive without the new row
+            worker.cancel(self.loading.pop(number))
+        if offset and number in self.pages:
+            self.pages[number].append(action)
+        elif not offset and (number == 0 or number - 1 in self.pages):
+            self.cursors[number] = self.last_cursor(number - 1) if number else None
+            self.pages[number] = [action]
+        elif not offset:
+            # The new row starts an uncached page, so a PAST_END cursor for it is stale
+            self.cursors.pop(number, None)
+        if len(self.pages.get(number, ())) == self.page_size:
+            self.cursors[number + 1] = (action['session_id'], action['id'])
+        self.total += 1
+        if at_end:
+            self.top = self.total - visible
+        self.changed()
+
+    def remove(self, action_id):
+        """
+        Drops a deleted action from the cached pages: later cached pages shift
+        up by one row, and anything past the first gap in the cache is
+        forgotten (refetched when scrolled to). Returns the removed action, or
+        None if it wasn't cached.
+        """
+        number = next((n for n, actions in self.pages.items() if any(a['id'] == action_id for a in actions)), None)
+        self.total = max(0, self.total - 1)
+        if number is None:
+            # Evicted since it was shown, so where the later rows start is unknown
+            self.forget_from(0)
+            self.changed()
+            return None
+        removed = next(a for a in self.pages[number] if a['id'] == action_id)
+        self.pages[number] = [a for a in self.pages[number] if a['id'] != action_id]
+        while (number + 1) * self.page_size <= self.total:
+            following = self.pages.get(number + 1)
+            if not following:
+                # The page's last row is now the first row of an uncached page
+                self.forget_from(number)
+                break
+            self.pages[number].append(following.pop(0))
+            number += 1
+            self.cursors[number] = self.last_cursor(number - 1)
+        else:
+            # The last page got shorter; nothing follows it
+            self.forget_from(number + 1)
+            self.cursors.pop(number + 1, None)
+            if not self.pages[number]:
+                del self.pages[number]
+        self.changed()
+        return removed
+
+    def last_cursor(self, number):
+        action = self.pages[number][-1]
+        return (action['session_id'], action['id'])
+
+    def forget_from(self, number):
+        """Drops the cached pages and cursors from page number on"""
+        for n in [n for n in self.pages if n >= number]:
+            del self.pages[n]
+        for n in [n for n in self.cursors if n > number]:
+            del self.cursors[n]
+        for n in [n for n in self.loading if n >= number]:
+            worker.cancel(self.loading.pop(n))
+
+    def changed(self):
+        if self.on_total is not None:
+            self.on_total(self.total)
+        self.render()
+
+    def visible_rows(self):
+        height = self.tree.winfo_height()
+        if height <= 1:
+            height = int(self.tree.cget("height")) * self.row_height + self.header_height
+        return max(1, (height - self.header_height) // self.row_height)
+
+    @staticmethod
+    def fetch_page(conn, where, page_size, number, cursor, cursor_known):
+        """Worker side: one page, seeking to it by offset if its cursor isn't known yet"""
+        if not cursor_known:
+            cursor = playtest_db.actions_cursor_at(conn, number * page_size, where)
+        if cursor is playtest_db.PAST_END:
+            # Rows were deleted since the count; the page is empty, as is every later one
+            return cursor, [], cursor
+        actions, next_cursor = playtest_db.actions_page(conn, where, after=cursor, limit=page_size)
+        return cursor, actions, next_cursor if next_cursor is not None else playtest_db.PAST_END
+
+    def page(self, number):
+        """The cached page, or None after requesting it from the worker"""
+        if number in self.pages:
+            self.pages.move_to_end(number)
+            return self.pages[number]
+        if number not in self.loading:
+            key = ("actions-page", number)
+            generation = self.generation
+            self.loading[number] = key
+            worker.submit(self.fetch_page, self.where, self.page_size, number, self.cursors.get(number),
+                          number in self.cursors, key=key,
+                          on_done=lambda result: self.loaded(generation, number, result))
+        return None
+
+    def loaded(self, generation, number, result):
+        if generation != self.generation:
+            return
+        self.loading.pop(number, None)
+        cursor, actions, next_cursor = result
+        self.cursors[number] = cursor
+        self.cursors[number + 1] = next_cursor
+        self.pages[number] = actions
+        while len(self.pages) > self.cached_pages:
+            self.pages.popitem(last=False)
+        self.render()
+
+    def rows(self, start, count):
+        """Rows start..start+count as actions, with None for rows still loading"""
+        result = []
+        index = start
+        end = min(start + count, self.total)
+        while index < end:
+            number, offset = divmod(index, self.page_size)
+            actions = self.page(number)
+            take = min(end - index, self.page_size - offset)
+            if actions is None:
+                result.extend([None] * take)
+            else:
+                result.extend(actions[offset:offset + take])
+                if len(actions) < offset + take:
+                    break
+            index += take
+        return result
+
+    def render(self):
+        visible = self.visible_rows()
+        self.top = max(0, min(self.top, self.total - visible))
+        actions = self.rows(self.top, visible) if self.where is not None else []
+        # Stop loading pages that were scrolled past before they arrived
+        needed = set(range(self.top // self.page_size, (self.top + visible) // self.page_size + 1))
+        for number in [n for n in self.loading if n not in needed]:
+            worker.cancel(self.loading.pop(number))
+        self.tree.delete(*self.tree.get_children())
+        for index, action in enumerate(actions, self.top):
+            if action is None:
+                self.tree.insert("", "end", iid=f"loading-{index}", values=["", "…"])
+            else:
+                self.tree.insert("", "end", iid=str(action['id']), values=format_action_row(action))
+        if self.selected_id is not None and self.tree.exists(str(self.selected_id)):
+            self.tree.selection_set(str(self.selected_id))
+        self.measure()
+        if self.total:
+            self.scrollbar.set(self.top / self.total, (self.top + len(actions)) / self.total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def measure(self):
+        """Learn the real header and row heights from the first row's bounding box"""
+        children = self.tree.get_children()
+        if not children:
+            return
+        bbox = self.tree.bbox(children[0])
+        if bbox and bbox[3] > 0 and (bbox[1], bbox[3]) != (self.header_height, self.row_height):
+            self.header_height, self.row_height = bbox[1], bbox[3]
+            self.tree.after_idle(self.render)
+
+    def scroll(self, rows):
+        self.top += rows
+        self.render()
+        return "break"
+
+    def on_scrollbar(self, command, *args):
+        if command == "moveto":
+            self.top = int(float(args[0]) * self.total)
+        elif command == "scroll":
+            amount = int(args[0])
+            self.top += amount * (self.visible_rows() if args[1] == "pages" else 1)
+        self.render()
+
+    def on_select(self, event):
+        selection = self.tree.selection()
+        if selection and selection[0].isdigit():
+            self.selected_id = int(selection[0])
+
+    def on_arrow(self, step):
+        """Move the selection, scrolling when it leaves the visible rows"""
+        children = self.tree.get_children()
+        if not children:
+            return "break"
+        current = self.tree.focus() or (self.tree.selection() or (children[0],))[0]
+        index = children.index(current) + step if current in children else 0
+        if index < 0 or index >= len(children):
+            self.scroll(step)
+            children = self.tree.get_children()
+            index = 0 if step < 0 else len(children) - 1
+        if children:
+            self.tree.selection_set(children[index])
+            self.tree.focus(children[index])
+        return "break"
+
+class SessionStatsPanel:
+    """
+    Per-player and per-unit action counts for the selected session.
+
+    Counts are loaded once per session (playtest_db.session_breakdown), then
+    kept current in memory as actions are added or deleted, redrawing only
+    the acting player's and unit's rows.
+    """
+
+    def __init__(self, tree, tags_var):
+        self.tree = tree
+        self.tags_var = tags_var
+        self.session_id = None
+        self.counts = {"players": defaultdict(Counter), "units": defaultdict(Counter)}  # group -> name -> type -> n
+        self.tags = Counter()
+        self.rows = {}  # (group, name) -> tree iid
+        for group, title in (("players", "Players"), ("units", "Units")):
+            tree.insert("", "end", iid=group, text=title, open=True)
+
+    def load(self, session_id):
+        """Show session_id's counts (None clears the panel)"""
+        worker.cancel("session-stats")
+        self.session_id = session_id
+        self.clear()
+        if session_id is not None:
+            worker.submit(playtest_db.session_breakdown, session_id, key="session-stats",
+                          on_done=lambda breakdown: self.loaded(session_id, breakdown))
+
+    def loaded(self, session_id, breakdown):
+        if session_id != self.session_id:
+            return
+        # Replaces anything added meanwhile: the worker ran this query after those inserts
+        self.clear()
+        for group in self.counts:
+            for (name, action_type), n in breakdown[group].items():
+                self.counts[group][name][action_type] = n
+            for name in list(self.counts[group]):
+                self.update_row(group, name)
+        self.tags = breakdown["tags"]
+        self.show_tags()
+
+    def clear(self):
+        for group in self.counts:
+            self.counts[group].clear()
+            self.tree.delete(*self.tree.get_children(group))
+        self.rows.clear()
+        self.tags = Counter()
+        self.show_tags()
+
+    def add(self, action, sign=1):
+        """Counts a logged action (sign=-1 un-counts a deleted one)"""
+        if action['session_id'] != self.session_id:
+            return
+        unit = next((p['name'] for p in action['participants'] if p['role'] == 'primary'), None)
+        for group, name in (("players", action['player']), ("units", unit)):
+            self.counts[group][name][action['type']] += sign
+            self.update_row(group, name)
+        self.tags.update({tag: sign for tag in action['tags']})
+        self.show_tags()
+
+    def remove(self, action):
+        self.add(action, -1)
+
+    def update_row(self, group, name):
+        counts = self.counts[group][name]
+        total = sum(counts.values())
+        iid = self.rows.get((group, name))
+        if total <= 0:
+            del self.counts[group][name]
+            if iid is not None:
+                self.tree.delete(iid)
+                del self.rows[(group, name)]
+            return
+        values = [sum(counts[t] for t in types) for _, types in STATS_COLUMNS] + [total]
+        if iid is None:
+            self.rows[(group, name)] = self.tree.insert(group, "end", text=name or "(none)", values=values)
+        else:
+            self.tree.item(iid, values=values)
+
+    def show_tags(self):
+        top = [(tag, n) for tag, n in self.tags.most_common(STATS_TOP_TAGS) if n > 0]
+        self.tags_var.set("Tags: " + ", ".join(f"{tag} {n}" for tag, n in top) if top else "")
 
 # GUI setup
 root = tk.Tk()
 root.title("Playtest History")
 
-# Initialize database if needed
-init_if_needed()
-
-# Add a refresh button at the top
-refresh_btn = tk.Button(root, text="Refresh Lists", command=lambda: load_sessions())
-refresh_btn.pack(fill="x", padx=5, pady=5)
+# All database work runs on the worker; initialize or upgrade the database first
+worker = DbWorker(root, DB_FILE, on_busy=lambda busy: show_busy(busy))
+worker.submit(playtest_db.init_db)
+
+# Rapid-entry journal; whatever the last run didn't commit is flushed first
+journal = playtest_journal.ActionJournal(playtest_journal.journal_path(DB_FILE))
+journal_flushing = True
+journal_retry_at = 0
+worker.submit(flush_journal_rows, on_done=journal_flushed, on_error=journal_flush_failed)
+
+# Add a refresh button at the top, with the busy indicator beside it
+top_frame = tk.Frame(root)
+top_frame.pack(fill="x", padx=5, pady=5)
+refresh_btn = tk.Button(top_frame, text="Refresh Lists", command=lambda: refresh_lists())
+refresh_btn.pack(side="left", fill="x", expand=True)
+busy_var = tk.StringVar(value="")
+tk.Label(top_frame, textvariable=busy_var, width=12).pack(side="right")
+journal_var = tk.StringVar(value="")
+tk.Label(top_frame, textvariable=journal_var).pack(side="right")
 
 # Create frames for lists
 lists_frame = tk.Frame(root)
@@ -278,19 +773,24 @@ def delete_session():
         return
         
     session_id = sessions_tree.item(selected[0])['values'][0]
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM Sessions WHERE id = ?", (session_id,))
-    conn.commit()
-    conn.close()
-    load_sessions()
+    
+    def deleted(_):
+        # Remove just that row
+        if sessions_tree.exists(str(session_id)):
+            sessions_tree.delete(str(session_id))
+    
+    worker.submit(playtest_db.delete_session, session_id, on_done=deleted)
     
     # Clear session-related fields
+    global current_replay, replay_session_id
     entry_session.delete(0, tk.END)
     selected_session.set("Selected Session: None")
-    # Clear actions tree
-    for item in actions_tree.get_children():
-        actions_tree.delete(item)
+    current_replay = replay_session_id = None
+    show_replay_state(None)
+    # Clear actions view
+    actions_view.show(None)
+    stats_panel.load(None)
+
 
 delete_session_btn = tk.Button(sessions_frame, text="Delete Session", command=delete_session)
 delete_session_btn.pack(pady=5)
@@ -302,7 +802,9 @@ actions_frame.pack(side="right", fill="both", expand=True, padx=5)
 selected_session = tk.StringVar(value="Selected Session: None")
 tk.Label(actions_frame, textvariable=selected_session).pack()
 
-actions_tree = ttk.Treeview(actions_frame, columns=("ID", "Player", "Type", "Participants", "Tags", "Notes"), show="headings")
+actions_tree_frame = tk.Frame(actions_frame)
+actions_tree_frame.pack(fill="both", expand=True)
+actions_tree = ttk.Treeview(actions_tree_frame, columns=("ID", "Player", "Type", "Participants", "Tags", "Notes"), show="headings")
 actions_tree.heading("ID", text="ID")
 actions_tree.heading("Player", text="Player")
 actions_tree.heading("Type", text="Type")
@@ -318,33 +820,109 @@ actions_tree.column("Participants", width=150, minwidth=100)
 actions_tree.column("Tags", width=100, minwidth=80)
 actions_tree.column("Notes", width=150, minwidth=100)
 
-actions_tree.pack(fill="both", expand=True)
+actions_scrollbar = ttk.Scrollbar(actions_tree_frame, orient="vertical")
+actions_scrollbar.pack(side="right", fill="y")
+actions_tree.pack(side="left", fill="both", expand=True)
+actions_view = VirtualActionList(actions_tree, actions_scrollbar, on_total=lambda total: on_actions_total(total))
 
 # Add Delete Action button
 def delete_action():
     selected = actions_tree.selection()
-    if not selected:
+    if not selected or not selected[0].isdigit():
         messagebox.showerror("Error", "Please select an action to delete")
         return
     
     if not messagebox.askyesno("Confirm Delete", "Delete this action?"):
         return
         
-    action_id = actions_tree.item(selected[0])['values'][0]
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM Actions WHERE id = ?", (action_id,))
-    conn.commit()
-    conn.close()
+    action_id = int(selected[0])
     
-    # Refresh actions list
-    selected = sessions_tree.selection()
-    if selected:
-        on_session_select(None)
+    def deleted(_):
+        global current_replay
+        # Remove just that row
+        if current_replay is not None and current_replay.remove(action_id):
+            # The checkpoints after it are gone; rebuild them on the worker
+            current_replay = None
+            show_replay_state(None)
+            request_replay()
+        removed = actions_view.remove(action_id)
+        if removed is not None:
+            stats_panel.remove(removed)
+        else:
+            stats_panel.load(stats_panel.session_id)
+    
+    worker.submit(playtest_db.delete_action, action_id, on_done=deleted)
 
 delete_action_btn = tk.Button(actions_frame, text="Delete Action", command=delete_action)
 delete_action_btn.pack(pady=5)
 
+# Replay of the selected session (board after N actions)
+current_replay = None
+replay_session_id = None
+
+def show_replay_state(value):
+    """Render the board after value actions (None: just prompt for the slider)"""
+    replay_text.configure(state="normal")
+    replay_text.delete("1.0", tk.END)
+    if value is None:
+        if replay_session_id is not None:
+            replay_text.insert(tk.END, "Drag the slider to replay this session")
+    elif current_replay is not None:
+        state = current_replay.state_at(int(float(value)))
+        replay_text.insert(tk.END, f"After {state.applied}/{len(current_replay)} actions\n")
+        replay_text.insert(tk.END, "\n".join(playtest_replay.describe(state)))
+    replay_text.configure(state="disabled")
+
+def load_replay(conn, session_id):
+    """Worker side: the session's replay with its checkpoints built, so scrubbing never folds the log on the Tk thread"""
+    return playtest_replay.Replay.for_session(conn, session_id).build_checkpoints()
+
+def request_replay():
+    session_id = replay_session_id
+    worker.submit(load_replay, session_id, key="replay",
+                  on_done=lambda replay: replay_loaded(session_id, replay))
+
+def on_replay_scrub(event=None):
+    """Slider moved by the user: load the session's log on first use, then show the state"""
+    if replay_session_id is None:
+        return
+    if current_replay is None:
+        request_replay()
+        return
+    show_replay_state(replay_scale.get())
+
+def replay_loaded(session_id, replay):
+    global current_replay
+    if session_id != replay_session_id:
+        return
+    current_replay = replay
+    replay_scale.configure(to=len(replay))
+    show_replay_state(replay_scale.get())
+
+replay_frame = tk.LabelFrame(actions_frame, text="Replay")
+replay_frame.pack(fill="x", padx=5, pady=5)
+replay_scale = tk.Scale(replay_frame, from_=0, to=0, orient="horizontal", showvalue=True)
+replay_scale.pack(fill="x")
+# Bound to user input rather than -command, which also fires when a new session resets it
+for sequence in ("<B1-Motion>", "<ButtonRelease-1>", "<KeyRelease>"):
+    replay_scale.bind(sequence, on_replay_scrub)
+replay_text = tk.Text(replay_frame, height=8, state="disabled")
+replay_text.pack(fill="x")
+
+# Live counts for the selected session
+stats_frame = tk.LabelFrame(actions_frame, text="Session Stats")
+stats_frame.pack(fill="x", padx=5, pady=5)
+stats_tree = ttk.Treeview(stats_frame, columns=[heading for heading, _ in STATS_COLUMNS] + ["Total"], height=6)
+stats_tree.heading("#0", text="Name")
+stats_tree.column("#0", width=150, minwidth=100)
+for heading in [heading for heading, _ in STATS_COLUMNS] + ["Total"]:
+    stats_tree.heading(heading, text=heading)
+    stats_tree.column(heading, width=70, minwidth=50, anchor="e")
+stats_tree.pack(fill="x")
+stats_tags = tk.StringVar(value="")
+tk.Label(stats_frame, textvariable=stats_tags, anchor="w").pack(fill="x")
+stats_panel = SessionStatsPanel(stats_tree, stats_tags)
+
 # Add Session frame
 frame1 = tk.LabelFrame(root, text="Add Session")
 frame1.pack(fill="x", padx=5, pady=5)
@@ -417,7 +995,17 @@ entry_notes.bind("<Return>", handle_enter)
 
 tk.Button(frame2, text="Add Action", command=add_action).grid(row=5, columnspan=2, pady=5)
 
+# Rapid entry: no confirmation dialog, actions are journaled and committed in batches
+rapid_var = tk.BooleanVar(value=False)
+tk.Checkbutton(frame2, text="Rapid entry", variable=rapid_var).grid(row=6, columnspan=2)
+
 # Initial load
 load_sessions()
+show_journal_state()
+root.after(JOURNAL_CHECK_MS, journal_tick)
 
 root.mainloop()
+# Commit what's still journaled before the worker exits (anything left is replayed next start)
+worker.submit(journal.flush)
+worker.stop()
+journal.close()
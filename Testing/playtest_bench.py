@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+playtest_bench.py
+
+Synthetic league data and benchmarks for playtest_db.
+
+Features:
+- Seeded generator producing realistic sessions: real ACTION_TYPES, unit names
+  from Data/units.csv, tiles, skewed tag and action-type distributions
+- Benchmark harness timing ingest, hydration, filters, stats, search and export
+  at several data sizes
+- Machine-readable JSON results, so runs can be diffed for regressions
+
+Example:
+    python playtest_bench.py --sizes 100x50 1000x200 --out bench_results.json
+"""
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import playtest_db
+
+# Relative weights over playtest_db.ACTION_TYPES; the real logs are dominated by
+# movement and shooting. Types added there without a weight here get the default.
+ACTION_TYPE_BIAS = {"Advance": 14, "Move": 22, "Shot": 26, "Salvo": 10, "Embark": 5, "Disembark": 5}
+DEFAULT_ACTION_TYPE_WEIGHT = 6
+ACTION_TYPE_WEIGHTS = {t: ACTION_TYPE_BIAS.get(t, DEFAULT_ACTION_TYPE_WEIGHT) for t in playtest_db.ACTION_TYPES}
+
+# Tag vocabulary with a long tail; most actions carry zero or one tag
+TAG_WEIGHTS = {
+    "hit": 30, "miss": 24, "critical": 6, "assault": 8, "flank": 7, "objective": 6,
+    "suppressed": 5, "destroyed": 4, "overwatch": 3, "uncommon": 2, "rules-question": 1,
+}
+TAG_COUNT_WEIGHTS = [55, 35, 8, 2]  # 0, 1, 2 or 3 tags
+
+VERSIONS = ["v0.8", "v0.9", "v1.0", "v1.1"]
+BOARD_TILES = 60
+UNITS_PER_ARMY = 8
+
+FALLBACK_UNITS = ["Wildcats", "Rookie Squad", "M8 Coyote", "M24 Grizzly", "M29 Vindicator", "M51 Bison"]
+
+
+def load_unit_names(path: str = playtest_db.UNITS_CSV_PATH) -> List[str]:
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            names = [row["name"] for row in csv.DictReader(f) if row.get("name")]
+    except FileNotFoundError:
+        names = []
+    return names or FALLBACK_UNITS
+
+
+def _weighted(rng: random.Random, weights: Dict[str, int]) -> Callable[[], str]:
+    keys = list(weights)
+    cum = []
+    total = 0
+    for k in keys:
+        total += weights[k]
+        cum.append(total)
+    return lambda: rng.choices(keys, cum_weights=cum)[0]
+
+
+def generate_session_actions(rng: random.Random, players: Tuple[str, str], units: List[str], n_actions: int) -> Iterator[Dict[str, Any]]:
+    """Yields add_actions_bulk entries for one game between two players."""
+    pick_type = _weighted(rng, ACTION_TYPE_WEIGHTS)
+    pick_tag = _weighted(rng, TAG_WEIGHTS)
+    armies = {p: rng.sample(units, min(UNITS_PER_ARMY, len(units))) for p in players}
+    for i in range(n_actions):
+        player = players[i % 2]
+        enemy = players[(i + 1) % 2]
+        action_type = pick_type()
+        unit = rng.choice(armies[player])
+        if action_type in ("Shot", "Salvo"):
+            secondary = [rng.choice(armies[enemy])]
+        elif action_type in ("Embark", "Disembark", "Consolidate"):
+            secondary = [rng.choice(armies[player])]
+        else:
+            secondary = [f"Tile {rng.randint(1, BOARD_TILES)}"]
+        n_tags = rng.choices(range(len(TAG_COUNT_WEIGHTS)), weights=TAG_COUNT_WEIGHTS)[0]
+        tags = sorted({pick_tag() for _ in range(n_tags)})
+        notes = f"{unit} {action_type.lower()}s {secondary[0]}" if rng.random() < 0.3 else None
+        yield {
+            "player_name": player,
+            "type": action_type,
+            "notes": notes,
+            "primary_participant": unit,
+            "secondary_participants": secondary,
+            "tags": tags,
+        }
+
+
+def generate_league(conn: sqlite3.Connection, n_sessions: int, actions_per_session: int, seed: int = 0,
+                    n_players: int = 40, units: Optional[List[str]] = None) -> List[int]:
+    """
+    Fills conn with n_sessions seeded games of roughly actions_per_session actions
+    (+/- 25%), spread over VERSIONS and a season of dates. Returns the session ids.
+    """
+    rng = random.Random(seed)
+    units = units or load_unit_names()
+    player_names = [f"Player {i + 1:03d}" for i in range(n_players)]
+    start = datetime.date(2025, 1, 1)
+    session_ids = []
+    for i in range(n_sessions):
+        p1, p2 = rng.sample(player_names, 2)
+        version = VERSIONS[min(len(VERSIONS) - 1, i * len(VERSIONS) // max(n_sessions, 1))]
+        date = (start + datetime.timedelta(days=i * 365 // max(n_sessions, 1))).isoformat()
+        session_id = playtest_db.add_session(conn, version, p1, p2, date, f"League game {i + 1}")
+        n_actions = max(1, int(actions_per_session * rng.uniform(0.75, 1.25)))
+        playtest_db.add_actions_bulk(conn, session_id, generate_session_actions(rng, (p1, p2), units, n_actions))
+        session_ids.append(session_id)
+    return session_ids
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return {"min_s": min(timings), "median_s": statistics.median(timings), "runs": repeat}
+
+
+def run_size(n_sessions: int, actions_per_session: int, seed: int, repeat: int, workdir: str) -> Dict[str, Any]:
+    """Builds a fresh database of the given size and times each operation on it."""
+    db_path = os.path.join(workdir, f"bench_{n_sessions}x{actions_per_session}.sqlite3")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    conn = playtest_db.connect(db_path)
+    playtest_db.init_db(conn)
+
+    results: Dict[str, Any] = {"sessions": n_sessions, "actions_per_session": actions_per_session}
+    t0 = time.perf_counter()
+    session_ids = generate_league(conn, n_sessions, actions_per_session, seed)
+    ingest_s = time.perf_counter() - t0
+    n_actions = playtest_db.count_actions(conn)
+    results["actions"] = n_actions
+    results["db_bytes"] = os.path.getsize(db_path)
+
+    rng = random.Random(seed + 1)
+    sample_sessions = [rng.choice(session_ids) for _ in range(repeat)]
+    units = load_unit_names()
+    unit = units[len(units) // 2]
+    mid_version = VERSIONS[len(VERSIONS) // 2]
+    export_path = os.path.join(workdir, "bench_export.ndjson.gz")
+    F = playtest_db.ActionFilter
+
+    timings = {
+        "ingest": {"total_s": ingest_s, "actions_per_s": n_actions / ingest_s if ingest_s else None},
+        "hydrate_session": _time(lambda: playtest_db.actions_for_session(conn, rng.choice(sample_sessions)), repeat),
+        "filter_tag_version": _time(lambda: playtest_db.actions_page(conn, F.tag("critical") & F.version(mid_version), limit=200), repeat),
+        "filter_participant": _time(lambda: playtest_db.actions_page(conn, F.participant(unit), limit=200), repeat),
+        "filter_session_full": _time(lambda: playtest_db.actions_filter(conn, session_id=rng.choice(sample_sessions)), repeat),
+        "count_by_participant": _time(lambda: playtest_db.count_actions_by_participant(conn, unit, filter_type="Shot"), repeat),
+        "stats_by_type": _time(lambda: playtest_db.count_actions_by_type(conn), repeat),
+        "stats_tag_frequency": _time(lambda: playtest_db.tag_frequency(conn), repeat),
+        "stats_participants": _time(lambda: playtest_db.participant_frequency(conn, version=mid_version), repeat),
+        "search_notes": _time(lambda: playtest_db.search_actions(conn, unit, limit=100), repeat),
+        "stats_rebuild": _time(lambda: playtest_db.rebuild_stats(conn), 1),
+        "export_version_ndjson": _time(lambda: playtest_db.export_actions(conn, export_path, F.version(mid_version), fmt="ndjson"), 1),
+    }
+    results["timings"] = timings
+    conn.close()
+    return results
+
+
+def parse_size(text: str) -> Tuple[int, int]:
+    """'1000x200' -> (1000 sessions, 200 actions per session)."""
+    sessions, _, actions = text.lower().partition("x")
+    return int(sessions), int(actions or 100)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark playtest_db on synthetic league data")
+    parser.add_argument("--sizes", nargs="+", default=["100x50", "1000x100"],
+                        help="SESSIONSxACTIONS per size, e.g. 10000x200 for ~2M actions (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per timed query (default: %(default)s)")
+    parser.add_argument("--workdir", help="where the benchmark databases are built (default: a temp dir)")
+    parser.add_argument("--out", default="bench_results.json", help="JSON results file (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="playtest_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "seed": args.seed,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "schema_version": playtest_db.SCHEMA_VERSION,
+        "results": [],
+    }
+    for size in args.sizes:
+        n_sessions, actions_per_session = parse_size(size)
+        print(f"Benchmarking {n_sessions} sessions x ~{actions_per_session} actions...")
+        result = run_size(n_sessions, actions_per_session, args.seed, args.repeat, workdir)
+        report["results"].append(result)
+        for name, t in result["timings"].items():
+            value = t.get("median_s", t.get("total_s"))
+            print(f"  {name:24s} {value * 1000:10.2f} ms")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print("Wrote", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,17 @@ Features:
 - ActionParticipants (primary and secondary participants)
 - Tags (many-to-many via ActionTags)
 - Querying and basic stats
+- Versioned schema migrations (PRAGMA user_version)
+- Full-text search over participant names and notes (FTS5 trigram index)
+- Trigger-maintained summary tables for per-session stats
+- Tuned WAL connections, pooled per thread, with a read-only mode
+- Streaming CSV / NDJSON export and idempotent CSV import
+- Participants interned as entities linked to unit uuids and hex tiles
+- Opt-in query tracing and slow-query log (see playtest_trace.py)
+- Closed rules versions archived to read-only files, attached on demand
+- Online snapshots with rotating retention, verification and restore
+- Crash-safe write-behind journal for rapid entry (see playtest_journal.py)
+- Unit catalog store attachable for joins on units, weapons and keywords
 
 Run as a script to exercise demo usage at bottom.
 """
@@ -19,32 +30,163 @@ Run as a script to exercise demo usage at bottom.
 import sqlite3
 import datetime
 import csv
-from collections import Counter
-from typing import List, Optional, Iterable, Tuple, Dict, Any
+import gzip
+import hashlib
+import json
+import os
+import pathlib
+import re
+import sys
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import List, Optional, Iterable, Iterator, Tuple, Dict, Any, Union
+
+import playtest_trace
+from playtest_trace import traced
 
 DB_PATH = "playtest_history.sqlite3"
 
+# Action types offered by the GUI and used by the synthetic data generator
+ACTION_TYPES = ["Advance", "Embark", "Disembark", "Salvo", "Capture", "Move", "Consolidate", "Control", "Shot"]
 
-def connect(db_path=DB_PATH):
-    return sqlite3.connect(db_path)
+# Unit catalog used to link participants to unit uuids
+UNITS_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "units.csv")
+
+# SQLite store of the same catalog (Data/catalog_db.py), attached by attach_catalog
+CATALOG_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "catalog.sqlite3")
+
+# Number of actions hydrated per participants/tags round trip when streaming
+HYDRATE_BATCH_SIZE = 500
+
+# Number of actions written per transaction by add_actions_bulk
+BULK_BATCH_SIZE = 1000
+
+# Number of actions buffered per session before import_actions_csv writes them
+IMPORT_BATCH_SIZE = 5000
+
+# ActionImports key prefix for actions written from the rapid-entry journal
+JOURNAL_HASH_PREFIX = "journal:"
+
+
+# Snapshots: directory (next to the database), pages copied per backup step,
+# pause between steps so writers get the lock, and snapshots kept
+BACKUP_DIR = "backups"
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP_SECONDS = 0.005
+BACKUP_KEEP = 10
+
+# Connection tuning applied by connect()
+BUSY_TIMEOUT_SECONDS = 5.0
+CACHE_SIZE_KIB = 16 * 1024
+MMAP_SIZE_BYTES = 256 * 1024 * 1024
+STATEMENT_CACHE_SIZE = 256
+
+
+class PlaytestConnection(sqlite3.Connection):
+    """sqlite3 connection returned by connect(), carrying per-connection caches."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # participant name -> Participants.id, see resolve_participant
+        self.participant_ids: Dict[str, int] = {}
+
+    def rollback(self):
+        # Ids inserted by the rolled-back transaction no longer exist
+        self.participant_ids.clear()
+        super().rollback()
+
+
+class TracedPlaytestConnection(playtest_trace.TracingMixin, PlaytestConnection):
+    """PlaytestConnection whose statements are recorded by a playtest_trace.QueryTracer."""
+
+
+def connect(db_path=DB_PATH, read_only: bool = False,
+            tracer: Optional[playtest_trace.QueryTracer] = None) -> sqlite3.Connection:
+    """
+    Opens a tuned connection: WAL journal, synchronous=NORMAL, busy timeout,
+    mmap and page cache, a larger prepared-statement cache and foreign keys on.
+
+    read_only connections open the file with mode=ro and query_only, so
+    analytics scripts can read alongside a writer (WAL readers never block it).
+
+    With a tracer (or PLAYTEST_TRACE set in the environment) every statement and
+    public API call on the connection is timed; see playtest_trace.py.
+    """
+    tracer = tracer or playtest_trace.tracer_from_env()
+    factory = PlaytestConnection if tracer is None else TracedPlaytestConnection
+    if read_only and db_path != ":memory:":
+        uri = pathlib.Path(db_path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_SECONDS, cached_statements=STATEMENT_CACHE_SIZE,
+                               factory=factory)
+        if tracer is not None:
+            tracer.attach(conn)
+        conn.execute("PRAGMA query_only = ON;")
+    else:
+        # uri=True lets version archives be attached read-only; plain paths are unaffected
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS, cached_statements=STATEMENT_CACHE_SIZE,
+                               factory=factory, uri=True)
+        if tracer is not None:
+            tracer.attach(conn)
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("PRAGMA synchronous = NORMAL;")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE_BYTES};")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB};")
+    conn.execute("PRAGMA foreign_keys = ON;")
+    return conn
+
+
+# Per-thread pool: {(db_path, read_only): connection}, since sqlite3 connections are thread-affine
+_pool = threading.local()
+
+
+def get_connection(db_path=DB_PATH, read_only: bool = False) -> sqlite3.Connection:
+    """
+    Returns the calling thread's shared connection for db_path, opening it on first use.
+    Reusing it keeps the parsed schema and prepared statements warm across operations.
+    Don't close() it; call close_connections() when the thread is done.
+    """
+    connections = getattr(_pool, "connections", None)
+    if connections is None:
+        connections = _pool.connections = {}
+    key = (db_path if db_path == ":memory:" else os.path.abspath(db_path), read_only)
+    conn = connections.get(key)
+    if conn is None:
+        conn = connections[key] = connect(db_path, read_only=read_only)
+    return conn
+
+
+def close_connections():
+    """Closes every pooled connection owned by the calling thread."""
+    connections = getattr(_pool, "connections", {})
+    while connections:
+        _, conn = connections.popitem()
+        conn.close()
 
 
 def clear_db(conn: sqlite3.Connection):
     """Drops all user tables from the database."""
     c = conn.cursor()
     c.execute("PRAGMA foreign_keys = OFF;")
-    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT IN ('sqlite_sequence');")
+    # Virtual tables first: dropping them also removes their shadow tables
+    c.execute("""SELECT name FROM sqlite_master WHERE type='table' AND name NOT IN ('sqlite_sequence')
+                 ORDER BY sql LIKE 'CREATE VIRTUAL TABLE%' DESC;""")
     tables = c.fetchall()
     for table in tables:
         c.execute(f"DROP TABLE IF EXISTS {table[0]};")
+    c.execute("PRAGMA user_version = 0;")
     conn.commit()
+    _participant_cache(conn).clear()
     c.execute("PRAGMA foreign_keys = ON;")
 
-def init_db(conn: sqlite3.Connection):
-    c = conn.cursor()
-    # Enable foreign keys
-    c.execute("PRAGMA foreign_keys = ON;")
+# Schema migrations
+#
+# Each migration upgrades the schema by one step and is recorded in
+# PRAGMA user_version, so existing database files are upgraded in place.
+# Never edit a shipped migration; append a new one instead.
 
+def _migration_base_schema(c: sqlite3.Cursor):
+    """v1: the original tables. IF NOT EXISTS adopts files created before versioning."""
     # Sessions
     c.execute("""
     CREATE TABLE IF NOT EXISTS Sessions (
@@ -109,11 +251,587 @@ def init_db(conn: sqlite3.Connection):
     );
     """)
 
-    conn.commit()
+
+def _migration_indexes(c: sqlite3.Cursor):
+    """v2: secondary indexes for the foreign keys and filters used by the query helpers."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_actions_session ON Actions(session_id);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_actions_type ON Actions(type);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_participants_action ON ActionParticipants(action_id);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_actiontags_tag ON ActionTags(tag_id);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sessionplayers_player ON SessionPlayers(player_id);")
+
+
+def _migration_turn_order_and_roles(c: sqlite3.Cursor):
+    """v3: Actions.turn_order (1-based within a session) and ActionParticipants.role."""
+    c.execute("ALTER TABLE Actions ADD COLUMN turn_order INTEGER;")
+    c.execute("""
+    UPDATE Actions SET turn_order = (
+        SELECT COUNT(*) FROM Actions a2
+        WHERE a2.session_id = Actions.session_id AND a2.id <= Actions.id
+    );
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_actions_session_turn ON Actions(session_id, turn_order);")
+
+    c.execute("ALTER TABLE ActionParticipants ADD COLUMN role TEXT;")
+    c.execute("UPDATE ActionParticipants SET role = CASE WHEN is_primary THEN 'primary' ELSE 'secondary' END;")
+
+
+def _fts5_trigram_available(c: sqlite3.Cursor) -> bool:
+    try:
+        c.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x, tokenize='trigram');")
+        c.execute("DROP TABLE temp._fts5_probe;")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _migration_action_search(c: sqlite3.Cursor):
+    """
+    v4: ActionSearch, one row per action (rowid = action id) holding its
+    participant names (newline separated) and notes, kept in sync by triggers.
+
+    Uses an FTS5 trigram index, which serves both ranked MATCH queries and
+    substring LIKE '%x%' lookups. Builds without FTS5 get a plain table with
+    the same shape and triggers; searches then fall back to scanning it.
+    """
+    if _fts5_trigram_available(c):
+        c.execute("CREATE VIRTUAL TABLE ActionSearch USING fts5(participants, notes, tokenize='trigram');")
+    else:
+        c.execute("CREATE TABLE ActionSearch (rowid INTEGER PRIMARY KEY, participants TEXT, notes TEXT);")
+
+    participants_sql = "COALESCE((SELECT group_concat(name_text, char(10)) FROM ActionParticipants WHERE action_id = {0}), '')"
+    c.execute(f"""
+    INSERT INTO ActionSearch (rowid, participants, notes)
+    SELECT a.id, {participants_sql.format("a.id")}, COALESCE(a.notes, '') FROM Actions a;
+    """)
+
+    c.execute("""
+    CREATE TRIGGER trg_actions_search_insert AFTER INSERT ON Actions BEGIN
+        INSERT INTO ActionSearch (rowid, participants, notes) VALUES (new.id, '', COALESCE(new.notes, ''));
+    END;
+    """)
+    c.execute("""
+    CREATE TRIGGER trg_actions_search_notes AFTER UPDATE OF notes ON Actions BEGIN
+        UPDATE ActionSearch SET notes = COALESCE(new.notes, '') WHERE rowid = new.id;
+    END;
+    """)
+    c.execute("""
+    CREATE TRIGGER trg_actions_search_delete AFTER DELETE ON Actions BEGIN
+        DELETE FROM ActionSearch WHERE rowid = old.id;
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_participants_search_insert AFTER INSERT ON ActionParticipants BEGIN
+        UPDATE ActionSearch SET participants = {participants_sql.format("new.action_id")} WHERE rowid = new.action_id;
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_participants_search_update AFTER UPDATE OF name_text, action_id ON ActionParticipants BEGIN
+        UPDATE ActionSearch SET participants = {participants_sql.format("old.action_id")} WHERE rowid = old.action_id;
+        UPDATE ActionSearch SET participants = {participants_sql.format("new.action_id")} WHERE rowid = new.action_id;
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_participants_search_delete AFTER DELETE ON ActionParticipants BEGIN
+        UPDATE ActionSearch SET participants = {participants_sql.format("old.action_id")} WHERE rowid = old.action_id;
+    END;
+    """)
+
+
+def _migration_filter_indexes(c: sqlite3.Cursor):
+    """v5: indexes behind the ActionFilter player and version semi-joins."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_actions_player ON Actions(player_id);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sessions_version ON Sessions(version);")
+
+
+# Summary tables: (raw aggregation, table) pairs used by rebuild_stats and check_stats.
+# Counts are keyed by session; version is denormalized from Sessions for cheap version filters.
+_STATS_SOURCES = [
+    ("""SELECT a.session_id, s.version, COALESCE(a.type, ''), COUNT(*)
+        FROM Actions a LEFT JOIN Sessions s ON s.id = a.session_id
+        GROUP BY a.session_id, COALESCE(a.type, '')""",
+     "StatsActionTypes"),
+    ("""SELECT a.session_id, s.version, at.tag_id, COUNT(*)
+        FROM ActionTags at JOIN Actions a ON a.id = at.action_id LEFT JOIN Sessions s ON s.id = a.session_id
+        GROUP BY a.session_id, at.tag_id""",
+     "StatsTags"),
+    ("""SELECT a.session_id, s.version, ap.name_text, COUNT(*)
+        FROM ActionParticipants ap JOIN Actions a ON a.id = ap.action_id LEFT JOIN Sessions s ON s.id = a.session_id
+        GROUP BY a.session_id, ap.name_text""",
+     "StatsParticipants"),
+]
+
+
+def _rebuild_stats(c: sqlite3.Cursor):
+    for source_sql, table in _STATS_SOURCES:
+        c.execute(f"DELETE FROM {table};")
+        c.execute(f"INSERT INTO {table} {source_sql};")
+
+
+def _migration_stats_tables(c: sqlite3.Cursor):
+    """
+    v6: StatsActionTypes, StatsTags and StatsParticipants hold per-session counts
+    kept current by triggers, so the stats helpers never re-aggregate Actions.
+
+    Deleting an action (or session) first deletes its children explicitly, so the
+    child triggers see the parent row and decrement the right session whether or
+    not foreign key cascades are enabled on the connection.
+    """
+    c.execute("""
+    CREATE TABLE StatsActionTypes (
+        session_id INTEGER NOT NULL,
+        version TEXT,
+        type TEXT NOT NULL,          -- '' for actions without a type
+        n INTEGER NOT NULL,
+        PRIMARY KEY(session_id, type)
+    );
+    """)
+    c.execute("""
+    CREATE TABLE StatsTags (
+        session_id INTEGER NOT NULL,
+        version TEXT,
+        tag_id INTEGER NOT NULL,
+        n INTEGER NOT NULL,
+        PRIMARY KEY(session_id, tag_id)
+    );
+    """)
+    c.execute("""
+    CREATE TABLE StatsParticipants (
+        session_id INTEGER NOT NULL,
+        version TEXT,
+        name_text TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        PRIMARY KEY(session_id, name_text)
+    );
+    """)
+    c.execute("CREATE INDEX idx_stats_types_version ON StatsActionTypes(version);")
+    c.execute("CREATE INDEX idx_stats_tags_version ON StatsTags(version);")
+    c.execute("CREATE INDEX idx_stats_participants_version ON StatsParticipants(version);")
+    _rebuild_stats(c)
+
+    def bump(table: str, key_col: str, key_expr: str, action_id_expr: str) -> str:
+        return f"""
+        INSERT INTO {table} (session_id, version, {key_col}, n)
+        SELECT a.session_id, s.version, {key_expr}, 1
+        FROM Actions a LEFT JOIN Sessions s ON s.id = a.session_id
+        WHERE a.id = {action_id_expr}
+        ON CONFLICT(session_id, {key_col}) DO UPDATE SET n = n + 1;"""
+
+    def drop(table: str, key_col: str, key_expr: str, action_id_expr: str) -> str:
+        session_expr = f"(SELECT session_id FROM Actions WHERE id = {action_id_expr})"
+        return f"""
+        UPDATE {table} SET n = n - 1 WHERE session_id = {session_expr} AND {key_col} = {key_expr};
+        DELETE FROM {table} WHERE session_id = {session_expr} AND {key_col} = {key_expr} AND n <= 0;"""
+
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_action_insert AFTER INSERT ON Actions BEGIN
+        {bump("StatsActionTypes", "type", "COALESCE(new.type, '')", "new.id")}
+    END;
+    """)
+    c.execute("""
+    CREATE TRIGGER trg_stats_action_before_delete BEFORE DELETE ON Actions BEGIN
+        DELETE FROM ActionTags WHERE action_id = old.id;
+        DELETE FROM ActionParticipants WHERE action_id = old.id;
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_action_before_delete_type BEFORE DELETE ON Actions BEGIN
+        {drop("StatsActionTypes", "type", "COALESCE(old.type, '')", "old.id")}
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_action_type_update AFTER UPDATE OF type ON Actions BEGIN
+        {drop("StatsActionTypes", "type", "COALESCE(old.type, '')", "new.id")}
+        {bump("StatsActionTypes", "type", "COALESCE(new.type, '')", "new.id")}
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_tag_insert AFTER INSERT ON ActionTags BEGIN
+        {bump("StatsTags", "tag_id", "new.tag_id", "new.action_id")}
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_tag_delete AFTER DELETE ON ActionTags BEGIN
+        {drop("StatsTags", "tag_id", "old.tag_id", "old.action_id")}
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_participant_insert AFTER INSERT ON ActionParticipants BEGIN
+        {bump("StatsParticipants", "name_text", "new.name_text", "new.action_id")}
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_participant_delete AFTER DELETE ON ActionParticipants BEGIN
+        {drop("StatsParticipants", "name_text", "old.name_text", "old.action_id")}
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_participant_update AFTER UPDATE OF name_text ON ActionParticipants BEGIN
+        {drop("StatsParticipants", "name_text", "old.name_text", "old.action_id")}
+        {bump("StatsParticipants", "name_text", "new.name_text", "new.action_id")}
+    END;
+    """)
+    c.execute("""
+    CREATE TRIGGER trg_stats_session_before_delete BEFORE DELETE ON Sessions BEGIN
+        DELETE FROM Actions WHERE session_id = old.id;
+    END;
+    """)
+    c.execute("""
+    CREATE TRIGGER trg_stats_session_version AFTER UPDATE OF version ON Sessions BEGIN
+        UPDATE StatsActionTypes SET version = new.version WHERE session_id = new.id;
+        UPDATE StatsTags SET version = new.version WHERE session_id = new.id;
+        UPDATE StatsParticipants SET version = new.version WHERE session_id = new.id;
+    END;
+    """)
+
+
+def _migration_action_imports(c: sqlite3.Cursor):
+    """v7: ActionImports records a content hash per imported CSV row, so re-imports skip duplicates."""
+    c.execute("""
+    CREATE TABLE ActionImports (
+        content_hash TEXT PRIMARY KEY,
+        action_id INTEGER NOT NULL REFERENCES Actions(id) ON DELETE CASCADE
+    );
+    """)
+    c.execute("CREATE INDEX idx_actionimports_action ON ActionImports(action_id);")
+    c.execute("""
+    CREATE TRIGGER trg_imports_action_delete AFTER DELETE ON Actions BEGIN
+        DELETE FROM ActionImports WHERE action_id = old.id;
+    END;
+    """)
+
+
+_TILE_NUMBER_RE = re.compile(r"^tile\s*#?\s*(\d+)$", re.IGNORECASE)
+_TILE_HEX_RE = re.compile(r"^(?:tile\s*)?\(?\s*(-?\d+)\s*,\s*(-?\d+)\s*\)?$", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1)
+def _unit_uuids() -> Dict[str, str]:
+    """Lowercased unit name and uuid -> uuid, from Data/units.csv (empty if the catalog is missing)."""
+    try:
+        with open(UNITS_CSV_PATH, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    except FileNotFoundError:
+        return {}
+    index = {}
+    for row in rows:
+        if row.get("uuid"):
+            index[row["uuid"].lower()] = row["uuid"]
+            if row.get("name"):
+                index[row["name"].strip().lower()] = row["uuid"]
+    return index
+
+
+def classify_participant(name: str) -> Tuple[str, Optional[str], Optional[int], Optional[int], Optional[int]]:
+    """
+    Returns (kind, unit_uuid, tile_no, hex_q, hex_r) for a participant name:
+    a unit from Data/units.csv (by name or uuid, case-insensitive), a numbered
+    tile ("Tile 5"), a hex coordinate ("Tile 3,4" or "(3, 4)"), or 'other'.
+    """
+    key = name.strip()
+    unit_uuid = _unit_uuids().get(key.lower())
+    if unit_uuid:
+        return "unit", unit_uuid, None, None, None
+    m = _TILE_NUMBER_RE.match(key)
+    if m:
+        return "tile", None, int(m.group(1)), None, None
+    m = _TILE_HEX_RE.match(key)
+    if m:
+        return "tile", None, None, int(m.group(1)), int(m.group(2))
+    return "other", None, None, None, None
+
+
+# Participant names as text, per action, for ActionSearch (v8 onwards)
+_SEARCH_PARTICIPANTS_SQL = """COALESCE((SELECT group_concat(p.name, char(10)) FROM ActionParticipants ap
+        JOIN Participants p ON p.id = ap.participant_id WHERE ap.action_id = {0}), '')"""
+
+
+def _migration_participant_entities(c: sqlite3.Cursor):
+    """
+    v8: participants become Participants rows (integer id, kind, unit uuid or
+    tile) and ActionParticipants stores participant_id instead of name_text.
+
+    ActionParticipants is rebuilt without the text column, StatsParticipants is
+    re-keyed by participant id, and the triggers that read names are recreated.
+    """
+    c.execute("""
+    CREATE TABLE Participants (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,    -- e.g. "M24 Grizzly" or "Tile 5"
+        kind TEXT NOT NULL,           -- 'unit', 'tile' or 'other'
+        unit_uuid TEXT,               -- Data/units.csv uuid when kind = 'unit'
+        tile_no INTEGER,              -- "Tile 5"
+        hex_q INTEGER,                -- "Tile 3,4"
+        hex_r INTEGER
+    );
+    """)
+    c.execute("CREATE INDEX idx_participants_unit_uuid ON Participants(unit_uuid);")
+    c.execute("CREATE INDEX idx_participants_tile ON Participants(tile_no);")
+    c.execute("CREATE INDEX idx_participants_hex ON Participants(hex_q, hex_r);")
+    names = [r[0] for r in c.execute("SELECT name_text FROM ActionParticipants GROUP BY name_text ORDER BY MIN(id)").fetchall()]
+    c.executemany(
+        "INSERT INTO Participants (name, kind, unit_uuid, tile_no, hex_q, hex_r) VALUES (?, ?, ?, ?, ?, ?)",
+        [(name, *classify_participant(name)) for name in names]
+    )
+
+    # Rebuild ActionParticipants; the only trigger outside it that names it is recreated below
+    c.execute("DROP TRIGGER trg_stats_action_before_delete;")
+    c.execute("""
+    CREATE TABLE ActionParticipants_v8 (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        action_id INTEGER NOT NULL REFERENCES Actions(id) ON DELETE CASCADE,
+        participant_id INTEGER NOT NULL REFERENCES Participants(id),
+        is_primary BOOLEAN NOT NULL,  -- True for primary participant, False for secondary
+        role TEXT
+    );
+    """)
+    c.execute("""
+    INSERT INTO ActionParticipants_v8 (id, action_id, participant_id, is_primary, role)
+    SELECT ap.id, ap.action_id, p.id, ap.is_primary, ap.role
+    FROM ActionParticipants ap JOIN Participants p ON p.name = ap.name_text;
+    """)
+    c.execute("DROP TABLE ActionParticipants;")
+    c.execute("ALTER TABLE ActionParticipants_v8 RENAME TO ActionParticipants;")
+    c.execute("CREATE INDEX idx_participants_action ON ActionParticipants(action_id);")
+    c.execute("CREATE INDEX idx_actionparticipants_participant ON ActionParticipants(participant_id, action_id);")
+    c.execute("""
+    CREATE TRIGGER trg_stats_action_before_delete BEFORE DELETE ON Actions BEGIN
+        DELETE FROM ActionTags WHERE action_id = old.id;
+        DELETE FROM ActionParticipants WHERE action_id = old.id;
+    END;
+    """)
+
+    # ActionSearch keeps its content; only the triggers change
+    c.execute(f"""
+    CREATE TRIGGER trg_participants_search_insert AFTER INSERT ON ActionParticipants BEGIN
+        UPDATE ActionSearch SET participants = {_SEARCH_PARTICIPANTS_SQL.format("new.action_id")} WHERE rowid = new.action_id;
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_participants_search_update AFTER UPDATE OF participant_id, action_id ON ActionParticipants BEGIN
+        UPDATE ActionSearch SET participants = {_SEARCH_PARTICIPANTS_SQL.format("old.action_id")} WHERE rowid = old.action_id;
+        UPDATE ActionSearch SET participants = {_SEARCH_PARTICIPANTS_SQL.format("new.action_id")} WHERE rowid = new.action_id;
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_participants_search_delete AFTER DELETE ON ActionParticipants BEGIN
+        UPDATE ActionSearch SET participants = {_SEARCH_PARTICIPANTS_SQL.format("old.action_id")} WHERE rowid = old.action_id;
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_participant_rename_search AFTER UPDATE OF name ON Participants BEGIN
+        UPDATE ActionSearch SET participants = {_SEARCH_PARTICIPANTS_SQL.format("ActionSearch.rowid")}
+        WHERE rowid IN (SELECT action_id FROM ActionParticipants WHERE participant_id = new.id);
+    END;
+    """)
+
+    c.execute("DROP TABLE StatsParticipants;")
+    c.execute("""
+    CREATE TABLE StatsParticipants (
+        session_id INTEGER NOT NULL,
+        version TEXT,
+        participant_id INTEGER NOT NULL,
+        n INTEGER NOT NULL,
+        PRIMARY KEY(session_id, participant_id)
+    );
+    """)
+    c.execute("CREATE INDEX idx_stats_participants_version ON StatsParticipants(version);")
+    c.execute("""
+    INSERT INTO StatsParticipants
+    SELECT a.session_id, s.version, ap.participant_id, COUNT(*)
+    FROM ActionParticipants ap JOIN Actions a ON a.id = ap.action_id LEFT JOIN Sessions s ON s.id = a.session_id
+    GROUP BY a.session_id, ap.participant_id;
+    """)
+
+    def bump(key_expr: str, action_id_expr: str) -> str:
+        return f"""
+        INSERT INTO StatsParticipants (session_id, version, participant_id, n)
+        SELECT a.session_id, s.version, {key_expr}, 1
+        FROM Actions a LEFT JOIN Sessions s ON s.id = a.session_id
+        WHERE a.id = {action_id_expr}
+        ON CONFLICT(session_id, participant_id) DO UPDATE SET n = n + 1;"""
+
+    def drop(key_expr: str, action_id_expr: str) -> str:
+        session_expr = f"(SELECT session_id FROM Actions WHERE id = {action_id_expr})"
+        return f"""
+        UPDATE StatsParticipants SET n = n - 1 WHERE session_id = {session_expr} AND participant_id = {key_expr};
+        DELETE FROM StatsParticipants WHERE session_id = {session_expr} AND participant_id = {key_expr} AND n <= 0;"""
+
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_participant_insert AFTER INSERT ON ActionParticipants BEGIN
+        {bump("new.participant_id", "new.action_id")}
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_participant_delete AFTER DELETE ON ActionParticipants BEGIN
+        {drop("old.participant_id", "old.action_id")}
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_participant_update AFTER UPDATE OF participant_id ON ActionParticipants BEGIN
+        {drop("old.participant_id", "old.action_id")}
+        {bump("new.participant_id", "new.action_id")}
+    END;
+    """)
+
+
+def _migration_archives(c: sqlite3.Cursor):
+    """v9: Archives registers rules versions moved out to their own database file."""
+    c.execute("""
+    CREATE TABLE Archives (
+        version TEXT PRIMARY KEY,
+        path TEXT NOT NULL,           -- relative to the directory of the active database
+        sessions INTEGER NOT NULL,
+        actions INTEGER NOT NULL,
+        archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+
+
+def _migration_stats_move_triggers(c: sqlite3.Cursor):
+    """
+    v10: keeps the summary tables current when rows move rather than change
+    their key: an action moved to another session (with its tags and
+    participants), and ActionTags/ActionParticipants rows moved to another
+    action or retagged.
+
+    Moving an action is one trigger per summary table, working from
+    old.session_id and new.session_id, since the Actions row already holds
+    the new session when AFTER triggers run.
+    """
+    def bump(table: str, key_col: str, key_expr: str, action_id_expr: str) -> str:
+        return f"""
+        INSERT INTO {table} (session_id, version, {key_col}, n)
+        SELECT a.session_id, s.version, {key_expr}, 1
+        FROM Actions a LEFT JOIN Sessions s ON s.id = a.session_id
+        WHERE a.id = {action_id_expr}
+        ON CONFLICT(session_id, {key_col}) DO UPDATE SET n = n + 1;"""
+
+    def drop(table: str, key_col: str, key_expr: str, action_id_expr: str) -> str:
+        session_expr = f"(SELECT session_id FROM Actions WHERE id = {action_id_expr})"
+        return f"""
+        UPDATE {table} SET n = n - 1 WHERE session_id = {session_expr} AND {key_col} = {key_expr};
+        DELETE FROM {table} WHERE session_id = {session_expr} AND {key_col} = {key_expr} AND n <= 0;"""
+
+    def move(table: str, key_col: str, child_table: str) -> str:
+        # Every child row of the action leaves old.session_id's counters for new.session_id's
+        return f"""
+        UPDATE {table} SET n = n - (SELECT COUNT(*) FROM {child_table} x
+                                    WHERE x.action_id = new.id AND x.{key_col} = {table}.{key_col})
+        WHERE session_id = old.session_id
+          AND {key_col} IN (SELECT {key_col} FROM {child_table} WHERE action_id = new.id);
+        DELETE FROM {table} WHERE session_id = old.session_id AND n <= 0;
+        INSERT INTO {table} (session_id, version, {key_col}, n)
+        SELECT new.session_id, (SELECT version FROM Sessions WHERE id = new.session_id), x.{key_col}, COUNT(*)
+        FROM {child_table} x
+        WHERE x.action_id = new.id
+        GROUP BY x.{key_col}
+        ON CONFLICT(session_id, {key_col}) DO UPDATE SET n = n + excluded.n;"""
+
+    # One trigger for type and session, so a statement changing both moves the count once
+    c.execute("DROP TRIGGER trg_stats_action_type_update;")
+    c.execute("""
+    CREATE TRIGGER trg_stats_action_type_update AFTER UPDATE OF type, session_id ON Actions BEGIN
+        UPDATE StatsActionTypes SET n = n - 1 WHERE session_id = old.session_id AND type = COALESCE(old.type, '');
+        DELETE FROM StatsActionTypes WHERE session_id = old.session_id AND type = COALESCE(old.type, '') AND n <= 0;
+        INSERT INTO StatsActionTypes (session_id, version, type, n)
+        SELECT new.session_id, (SELECT version FROM Sessions WHERE id = new.session_id), COALESCE(new.type, ''), 1
+        WHERE true
+        ON CONFLICT(session_id, type) DO UPDATE SET n = n + 1;
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_action_session_tags AFTER UPDATE OF session_id ON Actions
+    WHEN old.session_id IS NOT new.session_id BEGIN
+        {move("StatsTags", "tag_id", "ActionTags")}
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_action_session_participants AFTER UPDATE OF session_id ON Actions
+    WHEN old.session_id IS NOT new.session_id BEGIN
+        {move("StatsParticipants", "participant_id", "ActionParticipants")}
+    END;
+    """)
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_tag_update AFTER UPDATE OF action_id, tag_id ON ActionTags BEGIN
+        {drop("StatsTags", "tag_id", "old.tag_id", "old.action_id")}
+        {bump("StatsTags", "tag_id", "new.tag_id", "new.action_id")}
+    END;
+    """)
+    c.execute("DROP TRIGGER trg_stats_participant_update;")
+    c.execute(f"""
+    CREATE TRIGGER trg_stats_participant_update AFTER UPDATE OF participant_id, action_id ON ActionParticipants BEGIN
+        {drop("StatsParticipants", "participant_id", "old.participant_id", "old.action_id")}
+        {bump("StatsParticipants", "participant_id", "new.participant_id", "new.action_id")}
+    END;
+    """)
+
+
+# Summary tables as of the latest migration: (raw aggregation, table) pairs used by
+# rebuild_stats and check_stats. _STATS_SOURCES stays as v6 created them.
+_CURRENT_STATS_SOURCES = _STATS_SOURCES[:2] + [
+    ("""SELECT a.session_id, s.version, ap.participant_id, COUNT(*)
+        FROM ActionParticipants ap JOIN Actions a ON a.id = ap.action_id LEFT JOIN Sessions s ON s.id = a.session_id
+        GROUP BY a.session_id, ap.participant_id""",
+     "StatsParticipants"),
+]
+
+
+# user_version N means MIGRATIONS[:N] have been applied
+MIGRATIONS = [
+    _migration_base_schema,
+    _migration_indexes,
+    _migration_turn_order_and_roles,
+    _migration_action_search,
+    _migration_filter_indexes,
+    _migration_stats_tables,
+    _migration_action_imports,
+    _migration_participant_entities,
+    _migration_archives,
+    _migration_stats_move_triggers,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+@traced
+def migrate(conn: sqlite3.Connection, target: int = SCHEMA_VERSION) -> int:
+    """
+    Applies pending migrations up to target, each in its own transaction.
+    Returns the resulting schema version.
+    """
+    current = get_schema_version(conn)
+    if current > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema v{current} is newer than this playtest_db (v{SCHEMA_VERSION})")
+    if conn.in_transaction:
+        conn.commit()
+    c = conn.cursor()
+    for version in range(current + 1, target + 1):
+        c.execute("BEGIN IMMEDIATE;")
+        try:
+            MIGRATIONS[version - 1](c)
+            c.execute(f"PRAGMA user_version = {version};")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return get_schema_version(conn)
+
+
+@traced
+def init_db(conn: sqlite3.Connection):
+    """Creates the schema, or upgrades an existing database to SCHEMA_VERSION."""
+    # Enable foreign keys
+    conn.execute("PRAGMA foreign_keys = ON;")
+    migrate(conn)
 
 
 # CRUD helpers
 
+@traced
 def add_session(conn: sqlite3.Connection, version: str, player1_name: str, player2_name: str, date: Optional[str] = None, notes: Optional[str] = None) -> int:
     date = date or datetime.date.today().isoformat()
     cur = conn.cursor()
@@ -131,6 +849,7 @@ def add_session(conn: sqlite3.Connection, version: str, player1_name: str, playe
     return session_id
 
 
+@traced
 def add_player(conn: sqlite3.Connection, name: str) -> int:
     cur = conn.cursor()
     try:
@@ -144,6 +863,7 @@ def add_player(conn: sqlite3.Connection, name: str) -> int:
         return r[0]
 
 
+@traced
 def get_session_players(conn: sqlite3.Connection, session_id: int) -> List[Tuple[int, str]]:
     """Returns list of (player_id, player_name) tuples for a session"""
     cur = conn.cursor()
@@ -155,6 +875,7 @@ def get_session_players(conn: sqlite3.Connection, session_id: int) -> List[Tuple
     """, (session_id,))
     return cur.fetchall()
 
+@traced
 def find_player_id(conn: sqlite3.Connection, name: str) -> Optional[int]:
     cur = conn.cursor()
     cur.execute("SELECT id FROM Players WHERE name = ?", (name,))
@@ -162,6 +883,7 @@ def find_player_id(conn: sqlite3.Connection, name: str) -> Optional[int]:
     return r[0] if r else None
 
 
+@traced
 def ensure_tag(conn: sqlite3.Connection, tag_name: str) -> int:
     cur = conn.cursor()
     try:
@@ -173,6 +895,40 @@ def ensure_tag(conn: sqlite3.Connection, tag_name: str) -> int:
         return cur.fetchone()[0]
 
 
+def _participant_cache(conn: sqlite3.Connection) -> Dict[str, int]:
+    """The connection's name -> id cache (PlaytestConnection), or a throwaway one for plain connections."""
+    cache = getattr(conn, "participant_ids", None)
+    return cache if cache is not None else {}
+
+
+def _resolve_participant(cur: sqlite3.Cursor, cache: Dict[str, int], name: str) -> int:
+    participant_id = cache.get(name)
+    if participant_id is None:
+        cur.execute("SELECT id FROM Participants WHERE name = ?", (name,))
+        r = cur.fetchone()
+        if r:
+            participant_id = r[0]
+        else:
+            cur.execute(
+                "INSERT INTO Participants (name, kind, unit_uuid, tile_no, hex_q, hex_r) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, *classify_participant(name))
+            )
+            participant_id = cur.lastrowid
+        cache[name] = participant_id
+    return participant_id
+
+
+@traced
+def resolve_participant(conn: sqlite3.Connection, name: str) -> int:
+    """
+    Returns the Participants id for name, creating (and classifying) it on first use.
+    Ids are cached per PlaytestConnection; the cache is dropped on rollback().
+    Does not commit.
+    """
+    return _resolve_participant(conn.cursor(), _participant_cache(conn), name)
+
+
+@traced
 def add_action(conn: sqlite3.Connection,
                session_id: int,
                player_name: Optional[str],
@@ -202,23 +958,26 @@ def add_action(conn: sqlite3.Connection,
     
     # Create action
     cur.execute(
-        "INSERT INTO Actions (session_id, player_id, type, notes) VALUES (?, ?, ?, ?)",
-        (session_id, player_id, type, notes)
+        """INSERT INTO Actions (session_id, player_id, type, notes, turn_order)
+        VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(turn_order), 0) + 1 FROM Actions WHERE session_id = ?))""",
+        (session_id, player_id, type, notes, session_id)
     )
     action_id = cur.lastrowid
 
+    participant_ids = _participant_cache(conn)
+
     # Add primary participant if provided
     if primary_participant:
         cur.execute(
-            "INSERT INTO ActionParticipants (action_id, is_primary, name_text) VALUES (?, ?, ?)",
-            (action_id, True, primary_participant)
+            "INSERT INTO ActionParticipants (action_id, is_primary, role, participant_id) VALUES (?, ?, 'primary', ?)",
+            (action_id, True, _resolve_participant(cur, participant_ids, primary_participant))
         )
     
     # Add secondary participants if provided
     if secondary_participants:
         cur.executemany(
-            "INSERT INTO ActionParticipants (action_id, is_primary, name_text) VALUES (?, ?, ?)",
-            [(action_id, False, name) for name in secondary_participants]
+            "INSERT INTO ActionParticipants (action_id, is_primary, role, participant_id) VALUES (?, ?, 'secondary', ?)",
+            [(action_id, False, _resolve_participant(cur, participant_ids, name)) for name in secondary_participants]
         )
 
     if tags:
@@ -233,9 +992,276 @@ def add_action(conn: sqlite3.Connection,
     return action_id
 
 
+def _insert_action_batch(cur: sqlite3.Cursor,
+                         session_id: int,
+                         batch: List[Tuple[Optional[int], Dict[str, Any]]],
+                         tag_ids: Dict[str, int],
+                         participant_ids: Dict[str, int]) -> List[int]:
+    """
+    Writes (player_id, entry) pairs for one session with executemany, without committing.
+
+    The caller must hold the write lock (BEGIN IMMEDIATE) so the block of
+    action ids reserved here stays ours. tag_ids and participant_ids are
+    name -> id caches; missing tags and participants are inserted and cached. Entries without a turn_order continue
+    the session's numbering. Returns the new action ids in batch order.
+    """
+    cur.execute("""
+        SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'Actions'), 0),
+                   COALESCE((SELECT MAX(id) FROM Actions), 0))
+    """)
+    first_id = cur.fetchone()[0] + 1
+    ids = list(range(first_id, first_id + len(batch)))
+    cur.execute("SELECT COALESCE(MAX(turn_order), 0) FROM Actions WHERE session_id = ?", (session_id,))
+    last_turn = cur.fetchone()[0]
+
+    def resolve_tag(name: str) -> int:
+        tag_id = tag_ids.get(name)
+        if tag_id is None:
+            cur.execute("INSERT INTO Tags (name) VALUES (?)", (name,))
+            tag_id = tag_ids[name] = cur.lastrowid
+        return tag_id
+
+    action_rows = []
+    participant_rows = []
+    tag_rows = set()
+    for offset, (action_id, (player_id, entry)) in enumerate(zip(ids, batch), start=1):
+        turn_order = entry.get("turn_order") or last_turn + offset
+        action_rows.append((action_id, session_id, player_id, entry.get("type"), entry.get("notes"), turn_order))
+        if entry.get("primary_participant"):
+            participant_rows.append((action_id, True, "primary", _resolve_participant(cur, participant_ids, entry["primary_participant"])))
+        for name in entry.get("secondary_participants") or []:
+            participant_rows.append((action_id, False, "secondary", _resolve_participant(cur, participant_ids, name)))
+        for t in entry.get("tags") or []:
+            tag_rows.add((action_id, resolve_tag(t)))
+
+    cur.executemany(
+        "INSERT INTO Actions (id, session_id, player_id, type, notes, turn_order) VALUES (?, ?, ?, ?, ?, ?)",
+        action_rows
+    )
+    cur.executemany(
+        "INSERT INTO ActionParticipants (action_id, is_primary, role, participant_id) VALUES (?, ?, ?, ?)",
+        participant_rows
+    )
+    cur.executemany(
+        "INSERT OR IGNORE INTO ActionTags (action_id, tag_id) VALUES (?, ?)",
+        sorted(tag_rows)
+    )
+    return ids
+
+
+@traced
+def add_actions_bulk(conn: sqlite3.Connection,
+                     session_id: int,
+                     actions: Iterable[Dict[str, Any]],
+                     batch_size: int = BULK_BATCH_SIZE) -> List[int]:
+    """
+    Add many actions to a session, committing once per batch instead of once per action.
+
+    Each entry is a dict using the add_action keyword names: player_name, type,
+    notes, primary_participant, secondary_participants and tags (all optional).
+    Player and tag names are resolved through in-memory name -> id maps; new
+    tags are created inside the batch transaction.
+
+    Raises ValueError for an unknown player, like add_action. Batches already
+    committed stay in the database; the batch containing the bad entry is not
+    written, and a batch that fails to insert is rolled back before the error
+    is re-raised. If the caller already has a transaction open, each batch is a
+    savepoint inside it and nothing is committed; that is left to the caller.
+    Returns the new action ids in input order.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    cur = conn.cursor()
+    player_ids = dict(cur.execute("SELECT name, id FROM Players").fetchall())
+    tag_ids = dict(cur.execute("SELECT name, id FROM Tags").fetchall())
+
+    owns_transaction = not conn.in_transaction
+
+    def flush(batch: List[Tuple[Optional[int], Dict[str, Any]]]) -> List[int]:
+        cur.execute("BEGIN IMMEDIATE" if owns_transaction else "SAVEPOINT add_actions_bulk")
+        try:
+            ids = _insert_action_batch(cur, session_id, batch, tag_ids, _participant_cache(conn))
+        except Exception:
+            if owns_transaction:
+                conn.rollback()
+            else:
+                cur.execute("ROLLBACK TO add_actions_bulk")
+                cur.execute("RELEASE add_actions_bulk")
+                # conn.rollback() does this for a whole transaction
+                _participant_cache(conn).clear()
+            # Tags created by the failed batch no longer exist
+            tag_ids.clear()
+            raise
+        if owns_transaction:
+            conn.commit()
+        else:
+            cur.execute("RELEASE add_actions_bulk")
+        return ids
+
+    action_ids = []
+    batch = []
+    for entry in actions:
+        player_id = None
+        player_name = entry.get("player_name")
+        if player_name:
+            player_id = player_ids.get(player_name)
+            if player_id is None:
+                raise ValueError(f"Player {player_name} not found in session {session_id}")
+        batch.append((player_id, entry))
+        if len(batch) >= batch_size:
+            action_ids.extend(flush(batch))
+            batch = []
+    if batch:
+        action_ids.extend(flush(batch))
+    return action_ids
+
+
+@traced
+def add_logged_actions(conn: sqlite3.Connection,
+                       entries: Iterable[Dict[str, Any]]) -> Tuple[Dict[str, int], List[Dict[str, Any]]]:
+    """
+    Writes journaled actions (see playtest_journal.py) in one transaction, idempotently.
+
+    Each entry has the add_actions_bulk keys plus session_id and a unique id.
+    The id is recorded in ActionImports next to the action, so entries already
+    written by an earlier flush are skipped and a journal can be replayed after
+    a crash without duplicates. Unknown players are created and linked like
+    import_actions_csv does. Entries whose session doesn't exist (deleted since,
+    or never did) can't be written and are returned as dropped.
+    Returns ({entry id: new action id} for the entries written, [dropped entries]).
+    """
+    cur = conn.cursor()
+    if not conn.in_transaction:
+        cur.execute("BEGIN IMMEDIATE")
+    try:
+        player_ids = dict(cur.execute("SELECT name, id FROM Players").fetchall())
+        tag_ids = dict(cur.execute("SELECT name, id FROM Tags").fetchall())
+        sessions = {}                 # session id -> still exists
+        pending = defaultdict(list)   # session id -> [(player_id, entry, content_hash)]
+        seen = set()
+        dropped = []
+        for entry in entries:
+            h = JOURNAL_HASH_PREFIX + entry["id"]
+            if h in seen or cur.execute("SELECT 1 FROM ActionImports WHERE content_hash = ?", (h,)).fetchone():
+                continue
+            seen.add(h)
+            sid = entry["session_id"]
+            if sid not in sessions:
+                sessions[sid] = cur.execute("SELECT 1 FROM Sessions WHERE id = ?", (sid,)).fetchone() is not None
+            if not sessions[sid]:
+                dropped.append(entry)
+                continue
+            player_id = None
+            name = entry.get("player_name")
+            if name:
+                player_id = player_ids.get(name)
+                if player_id is None:
+                    cur.execute("INSERT INTO Players (name) VALUES (?)", (name,))
+                    player_id = player_ids[name] = cur.lastrowid
+                cur.execute("INSERT OR IGNORE INTO SessionPlayers (session_id, player_id) VALUES (?, ?)", (sid, player_id))
+            pending[sid].append((player_id, entry, h))
+
+        written = {}
+        for sid, batch in pending.items():
+            ids = _insert_action_batch(cur, sid, [(player_id, entry) for player_id, entry, _ in batch], tag_ids,
+                                       _participant_cache(conn))
+            cur.executemany("INSERT INTO ActionImports (content_hash, action_id) VALUES (?, ?)",
+                            [(h, aid) for (_, _, h), aid in zip(batch, ids)])
+            written.update((entry["id"], aid) for (_, entry, _), aid in zip(batch, ids))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return written, dropped
+
+
+@traced
+def delete_action(conn: sqlite3.Connection, action_id: int) -> bool:
+    """Deletes an action (triggers clean up its links and stats). Returns False if it didn't exist."""
+    deleted = conn.execute("DELETE FROM Actions WHERE id = ?", (action_id,)).rowcount
+    conn.commit()
+    return deleted > 0
+
+
+@traced
+def delete_session(conn: sqlite3.Connection, session_id: int) -> bool:
+    """Deletes a session and all its actions. Returns False if it didn't exist."""
+    deleted = conn.execute("DELETE FROM Sessions WHERE id = ?", (session_id,)).rowcount
+    conn.commit()
+    return deleted > 0
+
+
 # Query / filter helpers
 
-def actions_for_session(conn: sqlite3.Connection, session_id: int) -> List[Dict[str, Any]]:
+def _action_details(conn: sqlite3.Connection, action_ids: List[int], schemas: Iterable[str] = ("main",)) -> Tuple[Dict[int, List[Tuple[bool, str, str]]], Dict[int, List[str]]]:
+    """
+    Loads participants and tags for a whole set of action ids in two queries
+    (per schema, when version archives are attached).
+
+    The ids are passed as a single JSON array and expanded with json_each, so
+    the statement count does not grow with the number of actions.
+    Returns ({action_id: [(is_primary, role, name), ...]}, {action_id: [tag, ...]}).
+    """
+    participants = defaultdict(list)
+    tags = defaultdict(list)
+    if not action_ids:
+        return participants, tags
+    ids_json = json.dumps(list(action_ids))
+    cur = conn.cursor()
+    for schema in schemas:
+        cur.execute(_in_schema("""
+            SELECT ap.action_id, ap.is_primary, ap.role, p.name
+            FROM ActionParticipants ap
+            JOIN Participants p ON p.id = ap.participant_id
+            WHERE ap.action_id IN (SELECT value FROM json_each(?))
+            ORDER BY ap.action_id, ap.is_primary DESC, ap.id ASC
+        """, schema), (ids_json,))
+        for aid, is_primary, role, name in cur.fetchall():
+            participants[aid].append((bool(is_primary), role, name))
+
+        cur.execute(_in_schema("""
+            SELECT at.action_id, t.name
+            FROM ActionTags at
+            JOIN Tags t ON t.id = at.tag_id
+            WHERE at.action_id IN (SELECT value FROM json_each(?))
+            ORDER BY at.action_id, at.tag_id
+        """, schema), (ids_json,))
+        for aid, name in cur.fetchall():
+            tags[aid].append(name)
+    return participants, tags
+
+
+def _hydrate_rows(conn: sqlite3.Connection, rows: Iterable[Tuple], batch_size: Optional[int] = HYDRATE_BATCH_SIZE,
+                  schemas: Iterable[str] = ("main",)) -> Iterator[Tuple[Tuple, List[Tuple[bool, str, str]], List[str]]]:
+    """
+    Attaches participants and tags to action rows (action id first), in order.
+
+    Rows are consumed lazily and hydrated batch_size at a time; batch_size=None
+    hydrates everything in a single batch.
+    Yields (row, [(is_primary, role, name), ...], [tag, ...]).
+    """
+    def flush(batch):
+        participants, tags = _action_details(conn, [r[0] for r in batch], schemas)
+        for r in batch:
+            yield r, participants.get(r[0], []), tags.get(r[0], [])
+
+    if batch_size is None:
+        yield from flush(list(rows))
+        return
+
+    batch = []
+    for r in rows:
+        batch.append(r)
+        if len(batch) >= batch_size:
+            yield from flush(batch)
+            batch = []
+    if batch:
+        yield from flush(batch)
+
+
+def iter_actions_for_session(conn: sqlite3.Connection, session_id: int, batch_size: Optional[int] = HYDRATE_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yields the hydrated actions of a session in id order without building the full list."""
     cur = conn.cursor()
     cur.execute("""
     SELECT a.id, p.name as player_name, a.type, a.notes
@@ -244,128 +1270,392 @@ def actions_for_session(conn: sqlite3.Connection, session_id: int) -> List[Dict[
     WHERE a.session_id = ?
     ORDER BY a.id ASC
     """, (session_id,))
-    rows = cur.fetchall()
-    actions = []
-    for r in rows:
-        aid = r[0]
-        # Get participants
-        cur.execute("""
-            SELECT is_primary, name_text 
-            FROM ActionParticipants 
-            WHERE action_id = ?
-            ORDER BY is_primary DESC, id ASC
-        """, (aid,))
-        participants = cur.fetchall()
-        
-        # Split into primary and secondary
-        primary = next((p[1] for p in participants if p[0]), None)
-        secondary = [p[1] for p in participants if not p[0]]
-        
-        # Get tags
-        cur.execute("""
-            SELECT t.name 
-            FROM Tags t 
-            JOIN ActionTags at ON t.id = at.tag_id 
-            WHERE at.action_id = ?
-        """, (aid,))
-        tags = [t[0] for t in cur.fetchall()]
-        
-        actions.append({
-            "id": aid,
+    for r, participants, tags in _hydrate_rows(conn, cur, batch_size):
+        yield {
+            "id": r[0],
             "player": r[1],
             "type": r[2],
             "notes": r[3],
-            "primary_participant": primary,
-            "secondary_participants": secondary,
+            "primary_participant": next((name for is_primary, _, name in participants if is_primary), None),
+            "secondary_participants": [name for is_primary, _, name in participants if not is_primary],
+            "tags": tags
+        }
+
+
+@traced
+def actions_for_session(conn: sqlite3.Connection, session_id: int) -> List[Dict[str, Any]]:
+    return list(iter_actions_for_session(conn, session_id, batch_size=None))
+
+
+class ActionFilter:
+    """
+    Composable predicate over Actions (aliased a), rendered as SQL with params.
+
+    Each criterion is an indexed semi-join or EXISTS instead of a join, so
+    combining them never fans out rows. Combine with & (and), | (or), ~ (not):
+
+        f = ActionFilter.version("v1.0") & ActionFilter.tag("critical") & ~ActionFilter.type("Move")
+        f = ActionFilter.any_tag(["hit", "critical"]) | ActionFilter.participant("Vindicator")
+
+    versions is the set of rules versions the filter is limited to (None when it
+    isn't), which decides the version archives a query attaches.
+    """
+
+    def __init__(self, sql: str = "1", params: Iterable[Any] = (), versions: Optional[Iterable[str]] = None):
+        self.sql = sql
+        self.params = list(params)
+        self.versions = None if versions is None else frozenset(versions)
+
+    def __and__(self, other: "ActionFilter") -> "ActionFilter":
+        if self.versions is None or other.versions is None:
+            versions = self.versions if other.versions is None else other.versions
+        else:
+            versions = self.versions & other.versions
+        return ActionFilter(f"({self.sql} AND {other.sql})", self.params + other.params, versions)
+
+    def __or__(self, other: "ActionFilter") -> "ActionFilter":
+        versions = None
+        if self.versions is not None and other.versions is not None:
+            versions = self.versions | other.versions
+        return ActionFilter(f"({self.sql} OR {other.sql})", self.params + other.params, versions)
+
+    def __invert__(self) -> "ActionFilter":
+        return ActionFilter(f"(NOT {self.sql})", self.params)
+
+    def __repr__(self):
+        return f"ActionFilter({self.sql!r}, {self.params!r})"
+
+    @staticmethod
+    def all() -> "ActionFilter":
+        return ActionFilter()
+
+    @staticmethod
+    def all_of(filters: Iterable["ActionFilter"]) -> "ActionFilter":
+        result = ActionFilter()
+        for f in filters:
+            result = result & f
+        return result
+
+    @staticmethod
+    def any_of(filters: Iterable["ActionFilter"]) -> "ActionFilter":
+        filters = list(filters)
+        if not filters:
+            return ActionFilter("0")
+        result = filters[0]
+        for f in filters[1:]:
+            result = result | f
+        return result
+
+    @staticmethod
+    def session(session_id: int) -> "ActionFilter":
+        return ActionFilter("a.session_id = ?", [session_id])
+
+    @staticmethod
+    def player(name: str) -> "ActionFilter":
+        return ActionFilter("a.player_id IN (SELECT id FROM Players WHERE name = ?)", [name])
+
+    @staticmethod
+    def type(action_type: str) -> "ActionFilter":
+        return ActionFilter("a.type = ?", [action_type])
+
+    @staticmethod
+    def sessions(session_ids: Iterable[int]) -> "ActionFilter":
+        session_ids = list(session_ids)
+        if not session_ids:
+            return ActionFilter("0")
+        return ActionFilter(f"a.session_id IN ({', '.join('?' for _ in session_ids)})", session_ids)
+
+    @staticmethod
+    def version(version: str) -> "ActionFilter":
+        return ActionFilter("a.session_id IN (SELECT id FROM Sessions WHERE version = ?)", [version], [version])
+
+    @staticmethod
+    def versions(versions: Iterable[str]) -> "ActionFilter":
+        versions = list(versions)
+        if not versions:
+            return ActionFilter("0", versions=())
+        placeholders = ", ".join("?" for _ in versions)
+        return ActionFilter(f"a.session_id IN (SELECT id FROM Sessions WHERE version IN ({placeholders}))", versions, versions)
+
+    @staticmethod
+    def date_range(start: Optional[str] = None, end: Optional[str] = None) -> "ActionFilter":
+        """Sessions played between start and end (ISO dates, inclusive; either may be None)."""
+        clauses = []
+        params = []
+        if start is not None:
+            clauses.append("date >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("date <= ?")
+            params.append(end)
+        if not clauses:
+            return ActionFilter()
+        return ActionFilter(f"a.session_id IN (SELECT id FROM Sessions WHERE {' AND '.join(clauses)})", params)
+
+    @staticmethod
+    def tag(name: str) -> "ActionFilter":
+        return ActionFilter("""a.id IN (SELECT at.action_id FROM ActionTags at
+               JOIN Tags t ON t.id = at.tag_id WHERE t.name = ?)""", [name])
+
+    @staticmethod
+    def any_tag(names: Iterable[str]) -> "ActionFilter":
+        names = list(names)
+        if not names:
+            return ActionFilter("0")
+        placeholders = ", ".join("?" for _ in names)
+        return ActionFilter(f"""a.id IN (SELECT at.action_id FROM ActionTags at
+               JOIN Tags t ON t.id = at.tag_id WHERE t.name IN ({placeholders}))""", names)
+
+    @staticmethod
+    def participant(name: str, role: Optional[str] = None, exact: bool = False) -> "ActionFilter":
+        """Substring match on any participant name (via ActionSearch), or exact / role-specific via EXISTS."""
+        if role is None and not exact:
+            return ActionFilter("a.id IN (SELECT rowid FROM ActionSearch WHERE participants LIKE ?)", [f"%{name}%"])
+        clauses = ["p.name = ?" if exact else "p.name LIKE ?"]
+        params = [name if exact else f"%{name}%"]
+        if role is not None:
+            clauses.append("ap.role = ?")
+            params.append(role)
+        return ActionFilter(f"""EXISTS (SELECT 1 FROM ActionParticipants ap JOIN Participants p ON p.id = ap.participant_id
+               WHERE ap.action_id = a.id AND {" AND ".join(clauses)})""", params)
+
+    @staticmethod
+    def unit(unit_uuid: str) -> "ActionFilter":
+        """Actions involving the catalog unit (Data/units.csv uuid), via integer joins."""
+        return ActionFilter("""a.id IN (SELECT ap.action_id FROM ActionParticipants ap
+               JOIN Participants p ON p.id = ap.participant_id WHERE p.unit_uuid = ?)""", [unit_uuid])
+
+    @staticmethod
+    def weapon_keyword(keyword_uuid: str) -> "ActionFilter":
+        """Actions involving a unit carrying a weapon with the keyword; needs attach_catalog first."""
+        return ActionFilter("""a.id IN (SELECT ap.action_id FROM ActionParticipants ap
+               JOIN Participants p ON p.id = ap.participant_id
+               WHERE p.unit_uuid IN (SELECT u.uuid FROM catalog.WeaponKeywords wk
+                   JOIN catalog.Weapons w ON w.position = wk.weapon
+                   JOIN catalog.UnitWeapons uw ON uw.weapon_uuid = w.uuid
+                   JOIN catalog.Units u ON u.position = uw.unit
+                   WHERE wk.keyword_uuid = ?))""", [keyword_uuid])
+
+    @staticmethod
+    def tile(tile_no: int) -> "ActionFilter":
+        return ActionFilter("""a.id IN (SELECT ap.action_id FROM ActionParticipants ap
+               JOIN Participants p ON p.id = ap.participant_id WHERE p.tile_no = ?)""", [tile_no])
+
+
+_FILTER_SELECT = """
+    SELECT a.id, a.turn_order, p.name as player_name, a.type, a.notes, s.version, a.session_id
+    FROM Actions a
+    LEFT JOIN Players p ON p.id = a.player_id
+    LEFT JOIN Sessions s ON s.id = a.session_id
+"""
+
+
+def _filtered_action_dicts(conn: sqlite3.Connection, rows: Iterable[Tuple], batch_size: Optional[int],
+                           schemas: Iterable[str] = ("main",)) -> Iterator[Dict[str, Any]]:
+    for r, participants, tags in _hydrate_rows(conn, rows, batch_size, schemas):
+        yield {
+            "id": r[0],
+            "turn_order": r[1],
+            "player": r[2],
+            "type": r[3],
+            "notes": r[4],
+            "version": r[5],
+            "session_id": r[6],
+            "participants": [{"role": role, "name": name} for _, role, name in participants],
             "tags": tags
-        })
-    return actions
+        }
+
+
+def _filter_from_args(session_id: Optional[int] = None,
+                      player_name: Optional[str] = None,
+                      action_type: Optional[str] = None,
+                      tag: Optional[str] = None,
+                      participant_name: Optional[str] = None,
+                      version: Optional[str] = None,
+                      where: Optional[ActionFilter] = None) -> ActionFilter:
+    filters = []
+    if session_id is not None:
+        filters.append(ActionFilter.session(session_id))
+    if player_name is not None:
+        filters.append(ActionFilter.player(player_name))
+    if action_type is not None:
+        filters.append(ActionFilter.type(action_type))
+    if tag is not None:
+        filters.append(ActionFilter.tag(tag))
+    if participant_name is not None:
+        filters.append(ActionFilter.participant(participant_name))
+    if version is not None:
+        filters.append(ActionFilter.version(version))
+    if where is not None:
+        filters.append(where)
+    return ActionFilter.all_of(filters)
 
 
+@traced
 def actions_filter(conn: sqlite3.Connection,
                    session_id: Optional[int] = None,
                    player_name: Optional[str] = None,
                    action_type: Optional[str] = None,
                    tag: Optional[str] = None,
                    participant_name: Optional[str] = None,
-                   version: Optional[str] = None
+                   version: Optional[str] = None,
+                   where: Optional[ActionFilter] = None
                    ) -> List[Dict[str, Any]]:
     """
     Flexible ad-hoc filter. Any argument can be None (ignored).
-    participant_name matches ActionParticipants.name_text (substring match).
+    participant_name matches participant names (substring match).
+    where is an extra ActionFilter ANDed with the other arguments.
+    For large result sets use actions_page / iter_actions instead.
     """
+    f = _filter_from_args(session_id, player_name, action_type, tag, participant_name, version, where)
+    sql, params, schemas = _union_over_archives(conn, f, f"{_FILTER_SELECT} WHERE {f.sql}", f.params)
     cur = conn.cursor()
-    params = []
-    where_clauses = []
+    cur.execute(f"""
+    SELECT * FROM ({sql})
+    ORDER BY turn_order ASC, id ASC
+    """, params)
+    return list(_filtered_action_dicts(conn, cur.fetchall(), batch_size=None, schemas=schemas))
 
-    if session_id is not None:
-        where_clauses.append("a.session_id = ?")
-        params.append(session_id)
 
-    if player_name is not None:
-        where_clauses.append("p.name = ?")
-        params.append(player_name)
+@traced
+def actions_page(conn: sqlite3.Connection,
+                 where: Optional[ActionFilter] = None,
+                 after: Optional[Tuple[int, int]] = None,
+                 limit: int = 100) -> Tuple[List[Dict[str, Any]], Optional[Tuple[int, int]]]:
+    """
+    One page of hydrated actions ordered by (session_id, id), using keyset pagination.
 
-    if action_type is not None:
-        where_clauses.append("a.type = ?")
-        params.append(action_type)
+    after is the cursor returned by the previous page (None for the first page).
+    Returns (actions, next_cursor); next_cursor is None on the last page.
+    """
+    f = where or ActionFilter.all()
+    params = list(f.params)
+    keyset_sql = ""
+    if after is not None:
+        # Row value comparison, so the planner seeks the (session_id, id) index
+        keyset_sql = "AND (a.session_id, a.id) > (?, ?)"
+        params.extend([after[0], after[1]])
+    sql, params, schemas = _union_over_archives(conn, f, f"{_FILTER_SELECT} WHERE {f.sql} {keyset_sql}", params)
+    cur = conn.cursor()
+    cur.execute(f"""
+    SELECT * FROM ({sql})
+    ORDER BY session_id ASC, id ASC
+    LIMIT ?
+    """, params + [limit])
+    actions = list(_filtered_action_dicts(conn, cur.fetchall(), batch_size=None, schemas=schemas))
+    next_cursor = None
+    if len(actions) == limit:
+        next_cursor = (actions[-1]["session_id"], actions[-1]["id"])
+    return actions, next_cursor
 
-    if tag is not None:
-        where_clauses.append("t.name = ?")
-        params.append(tag)
 
-    if participant_name is not None:
-        where_clauses.append("ap.name_text LIKE ?")
-        params.append(f"%{participant_name}%")
+# actions_cursor_at result for an offset beyond the row count: no page starts there
+PAST_END = object()
 
-    if version is not None:
-        where_clauses.append("s.version = ?")
-        params.append(version)
 
-    where_sql = ("WHERE " + " AND ".join(where_clauses)) if where_clauses else ""
-    query = f"""
-    SELECT a.id, a.turn_order, p.name as player_name, a.type, a.notes, s.version
-    FROM Actions a
-    LEFT JOIN Players p ON p.id = a.player_id
-    LEFT JOIN Sessions s ON s.id = a.session_id
-    LEFT JOIN ActionTags at ON at.action_id = a.id
-    LEFT JOIN Tags t ON t.id = at.tag_id
-    LEFT JOIN ActionParticipants ap ON ap.action_id = a.id
-    {where_sql}
-    GROUP BY a.id
-    ORDER BY a.turn_order ASC, a.id ASC
-    """
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    # reuse actions_for_session-like population
-    results = []
-    for r in rows:
-        aid = r[0]
-        participants = cur.execute("SELECT role, name_text FROM ActionParticipants WHERE action_id = ?", (aid,)).fetchall()
-        tags = cur.execute("SELECT t.name FROM Tags t JOIN ActionTags at ON t.id = at.tag_id WHERE at.action_id = ?", (aid,)).fetchall()
-        results.append({
-            "id": aid,
-            "turn_order": r[1],
-            "player": r[2],
-            "type": r[3],
-            "notes": r[4],
-            "version": r[5],
-            "participants": [{"role": pr[0], "name": pr[1]} for pr in participants],
-            "tags": [t[0] for t in tags]
-        })
-    return results
+@traced
+def actions_cursor_at(conn: sqlite3.Connection, offset: int, where: Optional[ActionFilter] = None) -> Union[None, Tuple[int, int], object]:
+    """
+    The actions_page cursor that starts a page at row offset, for jumping into
+    the middle of a result. None for offset 0, PAST_END if offset is beyond the
+    row count. The OFFSET walks the (session_id, id) index only, so no
+    actions are hydrated.
+    """
+    if offset <= 0:
+        return None
+    f = where or ActionFilter.all()
+    sql, params, _ = _union_over_archives(conn, f, f"SELECT a.session_id, a.id FROM Actions a WHERE {f.sql}", f.params)
+    row = conn.execute(f"SELECT * FROM ({sql}) ORDER BY session_id ASC, id ASC LIMIT 1 OFFSET ?",
+                       params + [offset - 1]).fetchone()
+    return tuple(row) if row else PAST_END
+
+
+def iter_actions(conn: sqlite3.Connection, where: Optional[ActionFilter] = None, page_size: int = HYDRATE_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """Streams every matching action page by page, ordered by (session_id, id)."""
+    cursor = None
+    while True:
+        actions, cursor = actions_page(conn, where, after=cursor, limit=page_size)
+        yield from actions
+        if cursor is None:
+            return
+
+
+@traced
+def get_action(conn: sqlite3.Connection, action_id: int) -> Optional[Dict[str, Any]]:
+    """One hydrated action in the actions_page format, or None. Archived actions aren't searched."""
+    cur = conn.cursor()
+    cur.execute(f"{_FILTER_SELECT} WHERE a.id = ?", (action_id,))
+    return next(_filtered_action_dicts(conn, cur.fetchall(), batch_size=None), None)
+
+
+# Shortest term the trigram index can MATCH; shorter terms fall back to LIKE
+_TRIGRAM_MIN_TERM = 3
+
+
+def _action_search_is_fts(conn: sqlite3.Connection) -> bool:
+    cur = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'ActionSearch'")
+    r = cur.fetchone()
+    return bool(r) and "fts5" in r[0].lower()
+
+
+@traced
+def search_actions(conn: sqlite3.Connection,
+                   text: str,
+                   session_id: Optional[int] = None,
+                   in_participants: bool = True,
+                   in_notes: bool = True,
+                   limit: Optional[int] = None) -> List[int]:
+    """
+    Returns ids of actions whose participant names and/or notes contain every
+    word of text (case-insensitive substrings), best match first.
+    e.g. search_actions(conn, "Vindicator") -> every action mentioning the Vindicator.
+    """
+    columns = [name for name, wanted in (("participants", in_participants), ("notes", in_notes)) if wanted]
+    terms = text.split()
+    if not columns or not terms:
+        return []
+
+    fts = _action_search_is_fts(conn)
+    match_terms = [t for t in terms if fts and len(t) >= _TRIGRAM_MIN_TERM]
+    like_terms = [t for t in terms if t not in match_terms]
+
+    where_clauses = []
+    params = []
+    if match_terms:
+        phrases = " ".join('"' + t.replace('"', '""') + '"' for t in match_terms)
+        where_clauses.append("ActionSearch MATCH ?")
+        params.append("{" + " ".join(columns) + "} : (" + phrases + ")")
+    for t in like_terms:
+        where_clauses.append("(" + " OR ".join(f"{col} LIKE ?" for col in columns) + ")")
+        params.extend([f"%{t}%"] * len(columns))
+    if session_id is not None:
+        where_clauses.append("rowid IN (SELECT id FROM Actions WHERE session_id = ?)")
+        params.append(session_id)
+
+    order_sql = "ORDER BY rank" if match_terms else "ORDER BY rowid DESC"
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT ?"
+        params.append(limit)
+    cur = conn.execute(f"""
+    SELECT rowid FROM ActionSearch
+    WHERE {" AND ".join(where_clauses)}
+    {order_sql}
+    {limit_sql}
+    """, params)
+    return [r[0] for r in cur.fetchall()]
 
 
 # Stats / aggregations
 
+@traced
 def count_actions_by_participant(conn: sqlite3.Connection, participant_name: str, filter_type: Optional[str] = None) -> int:
     cur = conn.cursor()
     params = [f"%{participant_name}%"]
     sql = """
-    SELECT COUNT(DISTINCT a.id)
+    SELECT COUNT(*)
     FROM Actions a
-    JOIN ActionParticipants ap ON ap.action_id = a.id
-    WHERE ap.name_text LIKE ?
+    WHERE a.id IN (SELECT rowid FROM ActionSearch WHERE participants LIKE ?)
     """
     if filter_type:
         sql += " AND a.type = ?"
@@ -374,57 +1664,757 @@ def count_actions_by_participant(conn: sqlite3.Connection, participant_name: str
     return cur.fetchone()[0]
 
 
-def count_actions_by_type(conn: sqlite3.Connection, session_id: Optional[int] = None) -> Dict[str, int]:
-    cur = conn.cursor()
+def _stats_where(session_id: Optional[int], version: Optional[str], alias: str = "st") -> Tuple[str, List[Any]]:
+    clauses = []
     params = []
-    where = ""
     if session_id:
-        where = "WHERE a.session_id = ?"
+        clauses.append(f"{alias}.session_id = ?")
         params.append(session_id)
-    cur.execute(f"""
-    SELECT a.type, COUNT(*) FROM Actions a
-    {where}
-    GROUP BY a.type
-    """, params)
-    return {row[0] if row[0] else "(none)": row[1] for row in cur.fetchall()}
+    if version is not None:
+        clauses.append(f"{alias}.version = ?")
+        params.append(version)
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+@traced
+def count_actions_by_type(conn: sqlite3.Connection, session_id: Optional[int] = None, version: Optional[str] = None) -> Dict[str, int]:
+    where, params = _stats_where(session_id, version)
+    counts = Counter()
+    for schema in _version_schemas(conn, version):
+        cur = conn.execute(_in_schema(f"""
+        SELECT st.type, SUM(st.n) FROM StatsActionTypes st
+        {where}
+        GROUP BY st.type
+        """, schema), params)
+        counts.update({row[0] if row[0] else "(none)": row[1] for row in cur.fetchall()})
+    return dict(counts)
+
+
+@traced
+def tag_frequency(conn: sqlite3.Connection, session_id: Optional[int] = None, version: Optional[str] = None) -> Counter:
+    where, params = _stats_where(session_id, version)
+    counts = Counter()
+    for schema in _version_schemas(conn, version):
+        cur = conn.execute(_in_schema(f"""
+        SELECT t.name, SUM(st.n) FROM StatsTags st
+        JOIN Tags t ON t.id = st.tag_id
+        {where}
+        GROUP BY t.name
+        """, schema), params)
+        counts.update({row[0]: row[1] for row in cur.fetchall()})
+    return counts
+
+
+@traced
+def participant_frequency(conn: sqlite3.Connection, session_id: Optional[int] = None, version: Optional[str] = None) -> Counter:
+    """How many times each participant name appears in actions."""
+    where, params = _stats_where(session_id, version)
+    counts = Counter()
+    for schema in _version_schemas(conn, version):
+        cur = conn.execute(_in_schema(f"""
+        SELECT p.name, SUM(st.n) FROM StatsParticipants st
+        JOIN Participants p ON p.id = st.participant_id
+        {where}
+        GROUP BY p.name
+        """, schema), params)
+        counts.update({row[0]: row[1] for row in cur.fetchall()})
+    return counts
+
+
+@traced
+def unit_frequency(conn: sqlite3.Connection, session_id: Optional[int] = None, version: Optional[str] = None) -> Counter:
+    """How many times each catalog unit (by uuid) appears in actions."""
+    where, params = _stats_where(session_id, version)
+    where = (where + " AND" if where else "WHERE") + " p.unit_uuid IS NOT NULL"
+    counts = Counter()
+    for schema in _version_schemas(conn, version):
+        cur = conn.execute(_in_schema(f"""
+        SELECT p.unit_uuid, SUM(st.n) FROM StatsParticipants st
+        JOIN Participants p ON p.id = st.participant_id
+        {where}
+        GROUP BY p.unit_uuid
+        """, schema), params)
+        counts.update({row[0]: row[1] for row in cur.fetchall()})
+    return counts
+
+
+@traced
+def session_breakdown(conn: sqlite3.Connection, session_id: int) -> Dict[str, Counter]:
+    """
+    One session's action counts broken down for a live display:
+    {"players": {(player, type): n}, "units": {(primary participant, type): n}, "tags": {tag: n}}.
+    Actions without a player or a primary participant count under None.
+    """
+    players = Counter()
+    for name, action_type, n in conn.execute("""
+    SELECT p.name, a.type, COUNT(*) FROM Actions a
+    LEFT JOIN Players p ON p.id = a.player_id
+    WHERE a.session_id = ?
+    GROUP BY p.name, a.type
+    """, (session_id,)):
+        players[(name, action_type)] = n
+    units = Counter()
+    for name, action_type, n in conn.execute("""
+    SELECT pt.name, a.type, COUNT(*) FROM Actions a
+    LEFT JOIN ActionParticipants ap ON ap.action_id = a.id AND ap.is_primary
+    LEFT JOIN Participants pt ON pt.id = ap.participant_id
+    WHERE a.session_id = ?
+    GROUP BY pt.name, a.type
+    """, (session_id,)):
+        units[(name, action_type)] = n
+    return {"players": players, "units": units, "tags": tag_frequency(conn, session_id=session_id)}
 
 
-def tag_frequency(conn: sqlite3.Connection, session_id: Optional[int] = None) -> Counter:
-    cur = conn.cursor()
-    params = []
-    where = ""
-    if session_id:
-        where = "WHERE a.session_id = ?"
-        params.append(session_id)
-    cur.execute(f"""
-    SELECT t.name, COUNT(*) FROM Tags t
-    JOIN ActionTags at ON at.tag_id = t.id
-    JOIN Actions a ON a.id = at.action_id
-    {where}
-    GROUP BY t.name
-    """, params)
-    return Counter({row[0]: row[1] for row in cur.fetchall()})
+@traced
+def rebuild_stats(conn: sqlite3.Connection):
+    """Recomputes every summary table from the raw Actions/ActionTags/ActionParticipants rows."""
+    c = conn.cursor()
+    if not conn.in_transaction:
+        c.execute("BEGIN IMMEDIATE;")
+    for source_sql, table in _CURRENT_STATS_SOURCES:
+        c.execute(f"DELETE FROM {table};")
+        c.execute(f"INSERT INTO {table} {source_sql};")
+    conn.commit()
+
+
+@traced
+def check_stats(conn: sqlite3.Connection) -> Dict[str, int]:
+    """
+    Compares each summary table with a fresh aggregation of the raw data.
+    Returns {table: number of differing rows}; all zeros means the triggers kept up.
+    """
+    mismatches = {}
+    for source_sql, table in _CURRENT_STATS_SOURCES:
+        cur = conn.execute(f"""
+        SELECT (SELECT COUNT(*) FROM ({source_sql} EXCEPT SELECT * FROM {table}))
+             + (SELECT COUNT(*) FROM (SELECT * FROM {table} EXCEPT {source_sql}))
+        """)
+        mismatches[table] = cur.fetchone()[0]
+    return mismatches
+
+
+# Version archives
+#
+# archive_version() moves every session of a closed rules version into its own
+# database file (same schema, same ids) and registers it in Archives. Queries
+# whose ActionFilter (or version argument) names an archived version ATTACH the
+# file read-only and run the same SQL against it, so the active file stays
+# small while cross-version reports still see everything.
+
+# Tables copied to an archive, in foreign key order; the first three are shared lookups
+ARCHIVE_TABLES = ["Players", "Tags", "Participants", "Sessions", "SessionPlayers",
+                  "Actions", "ActionParticipants", "ActionTags", "ActionImports"]
+
+# Tables the query helpers read, schema-qualified by _in_schema
+_SCHEMA_TABLES = ARCHIVE_TABLES + ["ActionSearch", "StatsActionTypes", "StatsTags", "StatsParticipants"]
+_TABLE_REF_RE = re.compile(r"\b(FROM|JOIN)(\s+)(" + "|".join(_SCHEMA_TABLES) + r")\b")
+
+
+def _in_schema(sql: str, schema: str) -> str:
+    """Qualifies the table names after FROM/JOIN in one of our queries with schema."""
+    if schema == "main":
+        return sql
+    return _TABLE_REF_RE.sub(rf"\1\2{schema}.\3", sql)
+
+
+def _main_db_file(conn: sqlite3.Connection) -> str:
+    """Path of the connection's main database file ('' for in-memory databases)."""
+    for _, name, path in conn.execute("PRAGMA database_list;").fetchall():
+        if name == "main":
+            return path
+    return ""
+
+
+def archive_path(db_path: str, version: str) -> str:
+    """Default archive file for version, next to db_path: playtest_history.v0.9.sqlite3."""
+    stem, ext = os.path.splitext(db_path)
+    return f"{stem}.{re.sub(r'[^A-Za-z0-9._-]+', '_', version)}{ext or '.sqlite3'}"
+
+
+def _archive_schema_name(version: str) -> str:
+    return "archive_" + re.sub(r"\W", "_", version)
+
+
+def list_archives(conn: sqlite3.Connection) -> Dict[str, Dict[str, Any]]:
+    """{version: {"path", "sessions", "actions", "archived_at"}} for every archived version, paths resolved."""
+    try:
+        rows = conn.execute("SELECT version, path, sessions, actions, archived_at FROM main.Archives").fetchall()
+    except sqlite3.OperationalError:
+        # Not migrated to v9 yet
+        return {}
+    base = os.path.dirname(_main_db_file(conn))
+    return {
+        version: {"path": os.path.join(base, path), "sessions": sessions, "actions": actions, "archived_at": at}
+        for version, path, sessions, actions, at in rows
+    }
+
+
+def attach_archive(conn: sqlite3.Connection, version: str, archives: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """Attaches the archive of version read-only (once per connection) and returns its schema name."""
+    schema = _archive_schema_name(version)
+    if any(name == schema for _, name, _ in conn.execute("PRAGMA database_list;").fetchall()):
+        return schema
+    archive = (archives if archives is not None else list_archives(conn)).get(version)
+    if archive is None:
+        raise KeyError(f"Version {version!r} is not archived")
+    if not os.path.exists(archive["path"]):
+        raise FileNotFoundError(f"Archive of {version!r} is missing: {archive['path']}")
+    uri = pathlib.Path(archive["path"]).resolve().as_uri() + "?mode=ro"
+    conn.execute("ATTACH DATABASE ? AS " + schema, (uri,))
+    return schema
+
+
+def attach_catalog(conn: sqlite3.Connection, path: str = CATALOG_DB_PATH) -> str:
+    """
+    Attaches the unit catalog store (see Data/catalog_db.py) read-only as schema
+    'catalog', once per connection, so Participants.unit_uuid can be joined to
+    catalog.Units, UnitWeapons, Weapons and WeaponKeywords.
+    """
+    if any(name == "catalog" for _, name, _ in conn.execute("PRAGMA database_list;").fetchall()):
+        return "catalog"
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Catalog store is missing: {path} (run Data/catalog_db.py import)")
+    uri = pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+    conn.execute("ATTACH DATABASE ? AS catalog", (uri,))
+    return "catalog"
+
+
+def detach_archives(conn: sqlite3.Connection):
+    """Detaches every attached version archive."""
+    for _, name, _ in conn.execute("PRAGMA database_list;").fetchall():
+        if name.startswith("archive_"):
+            conn.execute(f"DETACH DATABASE {name}")
+
+
+def _version_schemas(conn: sqlite3.Connection, versions: Optional[Iterable[str]]) -> List[str]:
+    """
+    'main' plus the schema of each archived version in versions, attached on
+    demand. main always takes part: sessions of an archived version can be
+    logged again later.
+    """
+    if versions is None:
+        return ["main"]
+    if isinstance(versions, str):
+        versions = [versions]
+    archives = list_archives(conn)
+    return ["main"] + [attach_archive(conn, v, archives) for v in sorted(set(versions) & archives.keys())]
+
+
+def _filter_schemas(conn: sqlite3.Connection, f: ActionFilter) -> List[str]:
+    return _version_schemas(conn, f.versions)
+
+
+def _union_over_archives(conn: sqlite3.Connection, f: ActionFilter, sql: str, params: List[Any]) -> Tuple[str, List[Any], List[str]]:
+    """sql (a SELECT over unqualified tables) as a UNION ALL over main and the archives f asks for."""
+    schemas = _filter_schemas(conn, f)
+    union = " UNION ALL ".join(_in_schema(sql, schema) for schema in schemas)
+    return union, list(params) * len(schemas), schemas
+
+
+@traced
+def _is_leftover_archive(version: str, path: str) -> bool:
+    """
+    True if path holds what an interrupted archive_version run of version
+    leaves behind: a playtest database whose sessions (if any) are all of version.
+    """
+    if not os.path.exists(path):
+        # Only a -wal/-shm/-journal next to it: nothing shows it was ours
+        return False
+    try:
+        leftover = connect(path, read_only=True)
+        try:
+            versions = {r[0] for r in leftover.execute("SELECT DISTINCT version FROM Sessions").fetchall()}
+        finally:
+            leftover.close()
+    except sqlite3.DatabaseError:
+        return False
+    return versions <= {version}
+
+
+def archive_version(conn: sqlite3.Connection, version: str, path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Moves every session of version (with its actions, tags, participants and
+    import hashes) into a separate database file, then deletes it from conn.
+    Archiving a version again appends its newer sessions to the same file.
+
+    The archive is written and committed before anything is deleted, so an
+    interrupted run leaves the active file intact; an unregistered leftover
+    archive is rebuilt on the next run. Archived rows keep their ids, which
+    stay unique because the active tables use AUTOINCREMENT. CSV re-imports
+    only deduplicate against the active file.
+
+    Raises ValueError if path differs from the file version is already
+    archived to, or if something other than the default archive path or a
+    leftover archive of version (see _is_leftover_archive) exists at path.
+    Returns {"version", "path", "sessions", "actions"} for this run.
+    """
+    main_file = _main_db_file(conn)
+    registered = list_archives(conn).get(version)
+    default_path = archive_path(main_file, version) if main_file else None
+    if registered is not None:
+        if path is not None and os.path.abspath(path) != os.path.abspath(registered["path"]):
+            raise ValueError(f"{version} is already archived to {registered['path']}, not {path}")
+        path = registered["path"]
+    elif path is None:
+        if not main_file:
+            raise ValueError("An archive path is required for in-memory databases")
+        path = default_path
+    summary = {"version": version, "path": path, "sessions": 0, "actions": 0}
+    if conn.in_transaction:
+        conn.commit()
+    session_ids = [r[0] for r in conn.execute("SELECT id FROM Sessions WHERE version = ?", (version,)).fetchall()]
+    if not session_ids:
+        return summary
+
+    schema = _archive_schema_name(version)
+    if registered is not None:
+        if schema in {name for _, name, _ in conn.execute("PRAGMA database_list;").fetchall()}:
+            conn.execute(f"DETACH DATABASE {schema}")
+        os.chmod(path, 0o644)
+    else:
+        leftovers = [path + suffix for suffix in ("", "-wal", "-shm", "-journal") if os.path.exists(path + suffix)]
+        target = os.path.abspath(path)
+        if target in {os.path.abspath(a["path"]) for a in list_archives(conn).values()}:
+            raise ValueError(f"{path} is already the archive of another version")
+        ours = (default_path is not None and target == os.path.abspath(default_path)) \
+            or _is_leftover_archive(version, path)
+        if leftovers and not ours:
+            raise ValueError(f"{path} already exists and is not a leftover archive of {version}; "
+                             f"not overwriting it")
+        # Left over from an interrupted run: never registered, so nothing refers to it
+        for leftover in leftovers:
+            os.remove(leftover)
+    archive = connect(path)
+    init_db(archive)
+    # A rollback journal, so the finished file can be opened read-only without -wal/-shm files
+    archive.execute("PRAGMA journal_mode = DELETE;")
+    archive.close()
+
+    ids_json = json.dumps(session_ids)
+    sessions_sql = "SELECT value FROM json_each(?)"
+    actions_sql = f"SELECT id FROM main.Actions WHERE session_id IN ({sessions_sql})"
+    copies = [
+        ("Players", f"""id IN (SELECT player_id FROM main.SessionPlayers WHERE session_id IN ({sessions_sql})
+                        UNION SELECT player_id FROM main.Actions WHERE session_id IN ({sessions_sql}))""", 2),
+        ("Tags", f"id IN (SELECT tag_id FROM main.ActionTags WHERE action_id IN ({actions_sql}))", 1),
+        ("Participants", f"id IN (SELECT participant_id FROM main.ActionParticipants WHERE action_id IN ({actions_sql}))", 1),
+        ("Sessions", f"id IN ({sessions_sql})", 1),
+        ("SessionPlayers", f"session_id IN ({sessions_sql})", 1),
+        ("Actions", f"session_id IN ({sessions_sql})", 1),
+        ("ActionParticipants", f"action_id IN ({actions_sql})", 1),
+        ("ActionTags", f"action_id IN ({actions_sql})", 1),
+        ("ActionImports", f"action_id IN ({actions_sql})", 1),
+    ]
+    conn.execute("ATTACH DATABASE ? AS archive_write", (path,))
+    try:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE;")
+        try:
+            for table, where, n_params in copies:
+                columns = ", ".join(r[1] for r in c.execute(f"PRAGMA main.table_info({table});").fetchall())
+                # Lookup rows may already be there from an earlier run of the same version
+                verb = "INSERT OR IGNORE" if table in ARCHIVE_TABLES[:3] else "INSERT"
+                c.execute(f"{verb} INTO archive_write.{table} ({columns}) SELECT {columns} FROM main.{table} WHERE {where}",
+                          [ids_json] * n_params)
+                if table == "Actions":
+                    summary["actions"] = c.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute("DETACH DATABASE archive_write")
+    summary["sessions"] = len(session_ids)
+
+    c.execute("BEGIN IMMEDIATE;")
+    try:
+        # The Sessions delete trigger removes actions, links, search rows and stats
+        c.execute(f"DELETE FROM Sessions WHERE id IN ({sessions_sql})", (ids_json,))
+        rel_path = os.path.relpath(path, os.path.dirname(main_file)) if main_file else os.path.abspath(path)
+        c.execute("""
+        INSERT INTO Archives (version, path, sessions, actions) VALUES (?, ?, ?, ?)
+        ON CONFLICT(version) DO UPDATE SET sessions = sessions + excluded.sessions,
+            actions = actions + excluded.actions, archived_at = CURRENT_TIMESTAMP
+        """, (version, rel_path, summary["sessions"], summary["actions"]))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    os.chmod(path, 0o444)
+    return summary
+
+
+# Backups
+#
+# Snapshots use SQLite's online backup API, copying BACKUP_PAGES_PER_STEP
+# pages per step and pausing in between, so they are safe (and cheap for the
+# GUI) while actions are being logged. Archives are read-only and not included.
+
+def backup_to(conn: sqlite3.Connection, dest_path: str,
+              pages: int = BACKUP_PAGES_PER_STEP,
+              sleep: float = BACKUP_STEP_SLEEP_SECONDS,
+              progress: Optional[Any] = None):
+    """
+    Copies conn's main database to dest_path with the online backup API,
+    pages at a time. progress(copied, total) is called after each step.
+    The copy uses a rollback journal, so it is a single self-contained file.
+    """
+    callback = None
+    if progress is not None:
+        callback = lambda status, remaining, total: progress(total - remaining, total)
+    dest = sqlite3.connect(dest_path)
+    try:
+        conn.backup(dest, pages=pages, progress=callback, sleep=sleep)
+        dest.execute("PRAGMA journal_mode = DELETE;")
+    finally:
+        dest.close()
+
+
+# -<date>-<time>[-<n>].sqlite3 after the database stem; n counts snapshots taken within the same second
+_SNAPSHOT_NAME_RE = re.compile(r"-(\d{8}-\d{6})(?:-(\d+))?\.sqlite3")
+
+
+def list_snapshots(backup_dir: str, stem: str = "playtest_history") -> List[str]:
+    """Snapshot files of stem in backup_dir, newest first."""
+    if not os.path.isdir(backup_dir):
+        return []
+    found = []
+    for name in os.listdir(backup_dir):
+        m = _SNAPSHOT_NAME_RE.fullmatch(name[len(stem):]) if name.startswith(stem) else None
+        if m:
+            found.append(((m.group(1), int(m.group(2) or 0)), name))
+    return [os.path.join(backup_dir, name) for _, name in sorted(found, reverse=True)]
+
+
+def verify_db(path: str) -> List[str]:
+    """
+    Checks a database file without modifying it: integrity_check,
+    foreign_key_check and schema version. Returns the problems found (empty if sound).
+    """
+    if not os.path.exists(path):
+        return [f"{path} does not exist"]
+    uri = pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+    try:
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_SECONDS)
+        try:
+            problems = [r[0] for r in conn.execute("PRAGMA integrity_check;").fetchall() if r[0] != "ok"]
+            problems += [f"foreign key: {table} row {rowid} references missing {parent}"
+                         for table, rowid, parent, _ in conn.execute("PRAGMA foreign_key_check;").fetchall()]
+            version = conn.execute("PRAGMA user_version;").fetchone()[0]
+            if version > SCHEMA_VERSION:
+                problems.append(f"schema v{version} is newer than this playtest_db (v{SCHEMA_VERSION})")
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        return [f"{path}: {e}"]
+    return problems
+
+
+@traced
+def snapshot(conn: sqlite3.Connection,
+             backup_dir: Optional[str] = None,
+             keep: int = BACKUP_KEEP,
+             pages: int = BACKUP_PAGES_PER_STEP,
+             progress: Optional[Any] = None) -> str:
+    """
+    Writes a verified, timestamped snapshot of conn's database to backup_dir
+    (default: BACKUP_DIR next to the database) and deletes all but the newest
+    keep snapshots. Returns the snapshot path.
+    """
+    main_file = _main_db_file(conn)
+    stem = os.path.splitext(os.path.basename(main_file))[0] if main_file else "playtest_history"
+    if backup_dir is None:
+        backup_dir = os.path.join(os.path.dirname(main_file) or ".", BACKUP_DIR)
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(backup_dir, f"{stem}-{stamp}.sqlite3")
+    n = 1
+    while os.path.exists(path):
+        path = os.path.join(backup_dir, f"{stem}-{stamp}-{n}.sqlite3")
+        n += 1
+
+    # Written under a temporary name, so a half-written or bad copy never looks like a snapshot
+    partial = path + ".partial"
+    try:
+        backup_to(conn, partial, pages=pages, progress=progress)
+        problems = verify_db(partial)
+        if problems:
+            raise sqlite3.DatabaseError("Snapshot failed verification: " + "; ".join(problems[:5]))
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    for old in list_snapshots(backup_dir, stem)[max(keep, 1):]:
+        os.remove(old)
+    return path
+
+
+def restore_db(snapshot_path: str, db_path: str = DB_PATH) -> Optional[str]:
+    """
+    Replaces db_path with a verified snapshot. The current file (and its -wal/-shm)
+    is kept as <db_path>.damaged-<timestamp>, whose path is returned (None if
+    there was no file). Close every connection to db_path first.
+    """
+    problems = verify_db(snapshot_path)
+    if problems:
+        raise sqlite3.DatabaseError(f"Snapshot {snapshot_path} failed verification: " + "; ".join(problems[:5]))
+    aside = None
+    if os.path.exists(db_path):
+        aside = f"{db_path}.damaged-{datetime.datetime.now():%Y%m%d-%H%M%S}"
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.replace(db_path + suffix, aside + suffix)
+    src = sqlite3.connect(pathlib.Path(snapshot_path).resolve().as_uri() + "?mode=ro", uri=True)
+    dest = sqlite3.connect(db_path)
+    try:
+        src.backup(dest)
+    finally:
+        dest.close()
+        src.close()
+    # Back to the tuned WAL setup
+    connect(db_path).close()
+    return aside
+
+
+def latest_good_snapshot(backup_dir: str, stem: str = "playtest_history") -> Optional[str]:
+    """Newest snapshot in backup_dir that passes verify_db, or None."""
+    for path in list_snapshots(backup_dir, stem):
+        if not verify_db(path):
+            return path
+    return None
 
 
 # Export helpers
 
-def export_session_actions_csv(conn: sqlite3.Connection, session_id: int, out_path: str):
-    actions = actions_for_session(conn, session_id)
-    with open(out_path, "w", newline="", encoding="utf-8") as f:
+EXPORT_FORMATS = ("csv", "ndjson")
+CSV_EXPORT_HEADER = ["action_id", "player", "type", "notes", "primary", "secondary", "tags"]
+
+
+@traced
+def count_actions(conn: sqlite3.Connection, where: Optional[ActionFilter] = None) -> int:
+    f = where or ActionFilter.all()
+    sql = f"SELECT COUNT(*) FROM Actions a WHERE {f.sql}"
+    return sum(conn.execute(_in_schema(sql, schema), f.params).fetchone()[0] for schema in _filter_schemas(conn, f))
+
+
+def _csv_export_row(a: Dict[str, Any]) -> List[Any]:
+    primary = next((p["name"] for p in a["participants"] if p["role"] == "primary"), "")
+    secondary = [p["name"] for p in a["participants"] if p["role"] != "primary"]
+    return [a["id"], a["player"], a["type"], a["notes"], primary, ";".join(secondary), ";".join(a["tags"])]
+
+
+@traced
+def export_actions(conn: sqlite3.Connection,
+                   out_path: str,
+                   where: Optional[ActionFilter] = None,
+                   fmt: str = "csv",
+                   progress=None,
+                   page_size: int = HYDRATE_BATCH_SIZE) -> int:
+    """
+    Streams every action matching where to out_path, ordered by (session_id, id).
+
+    fmt "csv" writes the export_session_actions_csv layout; "ndjson" writes
+    gzip-compressed JSON lines with session, version, nested participants and tags.
+    Rows are written page by page, so memory stays bounded by page_size.
+    progress, if given, is called as progress(done, total) after each page.
+    Returns the number of actions written.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {EXPORT_FORMATS}")
+    total = count_actions(conn, where) if progress else None
+    done = 0
+
+    if fmt == "csv":
+        f = open(out_path, "w", newline="", encoding="utf-8")
         writer = csv.writer(f)
-        writer.writerow(["action_id", "player", "type", "notes", "primary", "secondary", "tags"])
-        for a in actions:
-            secondary_str = ";".join(a["secondary_participants"])
-            tags_str = ";".join(a["tags"])
-            writer.writerow([
-                a["id"], 
-                a["player"], 
-                a["type"], 
-                a["notes"],
-                a["primary_participant"] or "",
-                secondary_str,
-                tags_str
-            ])
+        writer.writerow(CSV_EXPORT_HEADER)
+        write = lambda a: writer.writerow(_csv_export_row(a))
+    else:
+        f = gzip.open(out_path, "wt", encoding="utf-8")
+        write = lambda a: f.write(json.dumps(a, ensure_ascii=False) + "\n")
+
+    with f:
+        for a in iter_actions(conn, where, page_size=page_size):
+            write(a)
+            done += 1
+            if progress and done % page_size == 0:
+                progress(done, total)
+    if progress:
+        progress(done, total)
+    return done
+
+
+@traced
+def export_session_actions_csv(conn: sqlite3.Connection, session_id: int, out_path: str):
+    export_actions(conn, out_path, ActionFilter.session(session_id))
+
+
+# Import helpers
+
+# Row fields that identify an imported action, in hashing order
+_IMPORT_HASH_FIELDS = ("action_id", "turn_order", "player", "type", "notes", "participants", "primary", "secondary", "tags")
+
+
+def _split_field(value: Optional[str]) -> List[str]:
+    return [v.strip() for v in (value or "").split(";") if v.strip()]
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _import_row_hash(file_digest: str, ordinal: int, row: Dict[str, str]) -> str:
+    """
+    Identity of an imported row, independent of the session it lands in: its
+    action_id (with its content) when it has one, else its position in this exact file.
+    """
+    if (row.get("action_id") or "").strip():
+        payload = ["action"] + [row.get(k) or "" for k in _IMPORT_HASH_FIELDS]
+    else:
+        payload = ["row", file_digest, ordinal]
+    return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+
+@traced
+def import_actions_csv(conn: sqlite3.Connection,
+                       path: str,
+                       version: Optional[str] = None,
+                       date: Optional[str] = None,
+                       session_notes: Optional[str] = None,
+                       session_id: Optional[int] = None,
+                       batch_size: int = IMPORT_BATCH_SIZE,
+                       progress=None) -> Dict[str, Any]:
+    """
+    Streams an action log CSV into the database inside one transaction.
+
+    Reads the session log layout (action_id,turn_order,player,type,notes,participants,tags;
+    participants are ';'-separated with the primary first) as well as the export
+    layout (primary and secondary columns). Tags are ';'-separated.
+
+    Rows go to session_id when given. Otherwise each row's session is matched on
+    (date, version, notes), taken from optional date/version/session columns or
+    from the arguments, and created when missing; without a date, the latest
+    session with that version and notes matches (a new one is dated today).
+    Unknown players are created and linked to their session.
+
+    Every row is fingerprinted by its action_id, or by the file's content and
+    its row number, so importing the same file again (on any day, into any
+    session) skips the rows already imported, while repeated identical rows
+    are all kept. Imported actions are numbered after the session's existing
+    turns, in file order; the file's turn_order values are not reused.
+    progress, if given, is called as progress(rows_read) after each batch.
+    Returns {"read": n, "imported": n, "skipped": n, "sessions": [session ids]}.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    cur = conn.cursor()
+    if session_id is not None:
+        if not cur.execute("SELECT 1 FROM Sessions WHERE id = ?", (session_id,)).fetchone():
+            raise ValueError(f"Session {session_id} not found")
+
+    player_ids = dict(cur.execute("SELECT name, id FROM Players").fetchall())
+    tag_ids = dict(cur.execute("SELECT name, id FROM Tags").fetchall())
+    session_ids = {}          # (date, version, notes) -> session id
+    session_players = set()   # (session id, player id) known to be linked
+    pending = defaultdict(list)   # session id -> [(player_id, entry, content_hash)]
+    pending_hashes = set()
+    summary = {"read": 0, "imported": 0, "skipped": 0, "sessions": []}
+
+    def resolve_session(row: Dict[str, str]) -> int:
+        if session_id is not None:
+            return session_id
+        key = (row.get("date") or date,
+               row.get("version") or version,
+               row.get("session") or session_notes)
+        if key not in session_ids:
+            if not key[1]:
+                raise ValueError(f"{path}: no version given for row {summary['read']} (pass version or add a version column)")
+            if key[0]:
+                cur.execute("SELECT id FROM Sessions WHERE date = ? AND version = ? AND notes IS ? ORDER BY id LIMIT 1", key)
+            else:
+                cur.execute("SELECT id FROM Sessions WHERE version = ? AND notes IS ? ORDER BY id DESC LIMIT 1", key[1:])
+            r = cur.fetchone()
+            if r:
+                session_ids[key] = r[0]
+            else:
+                cur.execute("INSERT INTO Sessions (date, version, notes) VALUES (?, ?, ?)",
+                            (key[0] or datetime.date.today().isoformat(),) + key[1:])
+                session_ids[key] = cur.lastrowid
+        return session_ids[key]
+
+    def resolve_player(sid: int, name: str) -> Optional[int]:
+        if not name:
+            return None
+        player_id = player_ids.get(name)
+        if player_id is None:
+            cur.execute("INSERT INTO Players (name) VALUES (?)", (name,))
+            player_id = player_ids[name] = cur.lastrowid
+        if (sid, player_id) not in session_players:
+            cur.execute("INSERT OR IGNORE INTO SessionPlayers (session_id, player_id) VALUES (?, ?)", (sid, player_id))
+            session_players.add((sid, player_id))
+        return player_id
+
+    def flush(sid: int):
+        batch = pending.pop(sid, [])
+        if not batch:
+            return
+        ids = _insert_action_batch(cur, sid, [(player_id, entry) for player_id, entry, _ in batch], tag_ids,
+                                   _participant_cache(conn))
+        cur.executemany("INSERT INTO ActionImports (content_hash, action_id) VALUES (?, ?)",
+                        [(h, aid) for (_, _, h), aid in zip(batch, ids)])
+        pending_hashes.difference_update(h for _, _, h in batch)
+        summary["imported"] += len(ids)
+        if progress:
+            progress(summary["read"])
+
+    file_digest = _file_digest(path)
+    if not conn.in_transaction:
+        cur.execute("BEGIN IMMEDIATE")
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            if not reader.fieldnames or "type" not in reader.fieldnames:
+                raise ValueError(f"{path}: not an action log (missing 'type' column)")
+            for row in reader:
+                summary["read"] += 1
+                h = _import_row_hash(file_digest, summary["read"], row)
+                if h in pending_hashes or cur.execute("SELECT 1 FROM ActionImports WHERE content_hash = ?", (h,)).fetchone():
+                    summary["skipped"] += 1
+                    continue
+                sid = resolve_session(row)
+
+                if "primary" in row:
+                    primary = (row.get("primary") or "").strip() or None
+                    secondary = _split_field(row.get("secondary"))
+                else:
+                    participants = _split_field(row.get("participants"))
+                    primary = participants[0] if participants else None
+                    secondary = participants[1:]
+                entry = {
+                    "type": row.get("type") or None,
+                    "notes": row.get("notes") or None,
+                    "turn_order": None,  # continue the session's numbering
+                    "primary_participant": primary,
+                    "secondary_participants": secondary,
+                    "tags": _split_field(row.get("tags")),
+                }
+                pending[sid].append((resolve_player(sid, (row.get("player") or "").strip()), entry, h))
+                pending_hashes.add(h)
+                if len(pending[sid]) >= batch_size:
+                    flush(sid)
+        for sid in list(pending):
+            flush(sid)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    summary["sessions"] = sorted(set(session_ids.values()) | ({session_id} if session_id is not None else set()))
+    return summary
 
 
 # Convenience demo / REPL-like functions
@@ -480,22 +2470,146 @@ def demo_queries(conn: sqlite3.Connection):
     print(tag_frequency(conn))
 
 
-if __name__ == "__main__":
-    conn = connect()
-    clear_db(conn)
-    init_db(conn)
-    # Demo seed only if DB empty (simple heuristic)
-    """     cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM Actions")
-    if cur.fetchone()[0] == 0:
-        s1, s2 = demo_seed(conn)
-        print("Demo data created. Sessions:", s1, s2)
+def main(argv: Optional[List[str]] = None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Playtest history database tools. Without a command, resets the database.")
+    parser.add_argument("--db", default=DB_PATH, help="database file (default: %(default)s)")
+    parser.add_argument("--trace", metavar="JSON", help="trace queries and write the metrics to this file")
+    parser.add_argument("--slow-ms", type=float, default=playtest_trace.DEFAULT_SLOW_MS,
+                        help="log statements slower than this with their query plan (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("migrate", help="upgrade the schema to the current version")
+    sub.add_parser("rebuild-stats", help="recompute the summary tables from the raw actions")
+    sub.add_parser("check-stats", help="compare the summary tables against the raw actions")
+    export = sub.add_parser("export", help="stream actions to CSV or gzip-compressed NDJSON")
+    export.add_argument("out_path")
+    export.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    export.add_argument("--session", type=int, action="append", dest="sessions", help="repeatable")
+    export.add_argument("--version", action="append", dest="versions", help="repeatable")
+    export.add_argument("--since", help="first session date (YYYY-MM-DD)")
+    export.add_argument("--until", help="last session date (YYYY-MM-DD)")
+    importer = sub.add_parser("import", help="import action log CSV files (re-imports skip duplicate rows)")
+    importer.add_argument("paths", nargs="+")
+    importer.add_argument("--version", help="rules version for new sessions, unless the file has a version column")
+    importer.add_argument("--date", help="session date for new sessions (default: today)")
+    importer.add_argument("--notes", help="session notes used to match or create the session")
+    importer.add_argument("--session-id", type=int, help="import into this existing session")
+    importer.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    archiver = sub.add_parser("archive", help="move closed rules versions into read-only archive files")
+    archiver.add_argument("versions", nargs="+")
+    archiver.add_argument("--path", help="archive file (only with a single version; default: next to the database)")
+    archiver.add_argument("--vacuum", action="store_true", help="shrink the active file afterwards")
+    sub.add_parser("archives", help="list archived versions")
+    backup = sub.add_parser("backup", help="write a verified online snapshot, keeping the newest --keep")
+    backup.add_argument("--dir", help=f"snapshot directory (default: {BACKUP_DIR}/ next to the database)")
+    backup.add_argument("--keep", type=int, default=BACKUP_KEEP)
+    backup.add_argument("--pages", type=int, default=BACKUP_PAGES_PER_STEP, help="pages copied per step")
+    verify = sub.add_parser("verify", help="check database files or snapshots for corruption")
+    verify.add_argument("paths", nargs="*", help="files to check (default: --db)")
+    restore = sub.add_parser("restore", help="replace the database with a verified snapshot")
+    restore.add_argument("snapshot", nargs="?", help="snapshot file (default: the newest good one)")
+    restore.add_argument("--dir", help=f"snapshot directory (default: {BACKUP_DIR}/ next to the database)")
+    args = parser.parse_args(argv)
+
+    # These work on files directly: the database may be too damaged to connect() to
+    if args.command == "verify":
+        failed = False
+        for path in args.paths or [args.db]:
+            problems = verify_db(path)
+            failed = failed or bool(problems)
+            print(f"{path}: " + ("ok" if not problems else "\n  ".join(["FAILED"] + problems)))
+        raise SystemExit(1 if failed else 0)
+    if args.command == "restore":
+        backup_dir = args.dir or os.path.join(os.path.dirname(os.path.abspath(args.db)), BACKUP_DIR)
+        stem = os.path.splitext(os.path.basename(args.db))[0]
+        snapshot_path = args.snapshot or latest_good_snapshot(backup_dir, stem)
+        if snapshot_path is None:
+            raise SystemExit(f"No good snapshot in {backup_dir}")
+        aside = restore_db(snapshot_path, args.db)
+        print(f"Restored {args.db} from {snapshot_path}" + (f" (previous file kept as {aside})" if aside else ""))
+        return
+
+    tracer = None
+    if args.trace:
+        import logging
+        logging.basicConfig(format="%(asctime)s %(name)s %(message)s")
+        tracer = playtest_trace.QueryTracer(slow_ms=args.slow_ms)
+    conn = connect(args.db, tracer=tracer)
+    try:
+        _run_command(conn, args)
+    finally:
+        conn.close()
+        if tracer is not None:
+            tracer.dump(args.trace)
+            print("\n".join(playtest_trace.summarize(tracer.to_dict())), file=sys.stderr)
+
+
+def _run_command(conn: sqlite3.Connection, args):
+    if args.command == "migrate":
+        print("Schema version:", migrate(conn))
+    elif args.command == "rebuild-stats":
+        init_db(conn)
+        rebuild_stats(conn)
+        print("Stats rebuilt")
+    elif args.command == "check-stats":
+        init_db(conn)
+        mismatches = check_stats(conn)
+        for table, n in mismatches.items():
+            print(f"{table}: {n} differing rows")
+        raise SystemExit(1 if any(mismatches.values()) else 0)
+    elif args.command == "export":
+        filters = [ActionFilter.date_range(args.since, args.until)]
+        if args.sessions:
+            filters.append(ActionFilter.sessions(args.sessions))
+        if args.versions:
+            filters.append(ActionFilter.versions(args.versions))
+        report = lambda done, total: print(f"\rExported {done}/{total} actions", end="", file=sys.stderr)
+        export_actions(conn, args.out_path, ActionFilter.all_of(filters), fmt=args.format, progress=report)
+        print(file=sys.stderr)
+    elif args.command == "import":
+        init_db(conn)
+        for path in args.paths:
+            summary = import_actions_csv(conn, path, version=args.version, date=args.date,
+                                         session_notes=args.notes, session_id=args.session_id,
+                                         batch_size=args.batch_size)
+            print(f"{path}: {summary['imported']} imported, {summary['skipped']} skipped, sessions {summary['sessions']}")
+    elif args.command == "archive":
+        if args.path and len(args.versions) > 1:
+            raise SystemExit("--path needs a single version")
+        init_db(conn)
+        for version in args.versions:
+            try:
+                summary = archive_version(conn, version, path=args.path)
+            except ValueError as e:
+                raise SystemExit(str(e))
+            print(f"{version}: {summary['sessions']} sessions, {summary['actions']} actions -> {summary['path']}")
+        if args.vacuum:
+            conn.execute("VACUUM;")
+    elif args.command == "backup":
+        report = lambda done, total: print(f"\rCopied {done}/{total} pages", end="", file=sys.stderr)
+        path = snapshot(conn, args.dir, keep=args.keep, pages=args.pages, progress=report)
+        print(file=sys.stderr)
+        print("Snapshot written to", path)
+    elif args.command == "archives":
+        for version, info in list_archives(conn).items():
+            print(f"{version}: {info['sessions']} sessions, {info['actions']} actions, {info['archived_at']}, {info['path']}")
+    else:
+        clear_db(conn)
+        init_db(conn)
+        # Demo seed only if DB empty (simple heuristic)
+        """     cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM Actions")
+        if cur.fetchone()[0] == 0:
+            s1, s2 = demo_seed(conn)
+            print("Demo data created. Sessions:", s1, s2)
 """
-    # Run demo queries
-    #demo_queries(conn)
+        # Run demo queries
+        #demo_queries(conn)
+
+        # Example export
+        #export_session_actions_csv(conn, 1, "session_1_actions.csv")
+        #print("Exported session 1 actions to session_1_actions.csv")
 
-    # Example export
-    #export_session_actions_csv(conn, 1, "session_1_actions.csv")
-    #print("Exported session 1 actions to session_1_actions.csv")
 
-    conn.close()
+if __name__ == "__main__":
+    main()
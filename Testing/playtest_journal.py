@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+playtest_journal.py
+
+Write-behind journal for logging actions faster than the database commits them.
+
+Features:
+- ActionJournal: append() writes one NDJSON line and fsyncs it before
+  returning, so an acknowledged action survives a crash or power cut
+- flush() commits the pending entries in one transaction
+  (playtest_db.add_logged_actions) and then compacts the journal
+- should_flush() says when to flush: every FLUSH_EVERY entries, or once
+  logging has been idle for FLUSH_IDLE_SECONDS
+- Entries left over by a crash are loaded again on open and replayed by the
+  next flush. Each entry's id is recorded with its action, so entries that
+  were committed just before the crash are not written twice
+- Entries whose session doesn't exist are not lost: flush() logs them and
+  moves them to a dropped file next to the journal (dropped_path)
+
+The journal lives next to the database (journal_path). A torn last line from
+a crash mid-append is ignored; that append never returned.
+
+Example:
+    python playtest_journal.py --db playtest_history.sqlite3
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import playtest_db
+
+JOURNAL_SUFFIX = ".journal.ndjson"
+# Entries that couldn't be written (no such session), kept for recovery by hand
+DROPPED_SUFFIX = ".dropped.ndjson"
+
+# Flush once this many entries are pending, or after this long without an append
+FLUSH_EVERY = 20
+FLUSH_IDLE_SECONDS = 2.0
+
+logger = logging.getLogger("playtest_db.journal")
+
+
+def journal_path(db_path: str) -> str:
+    return db_path + JOURNAL_SUFFIX
+
+
+def dropped_path(path: str) -> str:
+    """Where a journal keeps the entries it couldn't write"""
+    return path + DROPPED_SUFFIX
+
+
+class ActionJournal:
+    """
+    Pending actions, mirrored in an append-only file until committed.
+
+    Safe to append from one thread while another flushes.
+    """
+
+    def __init__(self, path: str, flush_every: int = FLUSH_EVERY, idle_seconds: float = FLUSH_IDLE_SECONDS):
+        self.path = path
+        self.flush_every = flush_every
+        self.idle_seconds = idle_seconds
+        self.lock = threading.Lock()
+        self.dropped_path = dropped_path(path)
+        self.dropped = 0  # entries moved to dropped_path by this instance
+        self.entries, torn = self._load()
+        self.last_append = time.monotonic()
+        if torn:
+            # Rewrite without the torn tail, or the next append would be glued onto it
+            self._write(self.entries)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        """Returns (entries, whether any line was torn)"""
+        entries = []
+        torn = False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for number, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        logger.warning("%s:%d: skipping torn journal line", self.path, number)
+                        torn = True
+        except FileNotFoundError:
+            pass
+        if entries:
+            logger.info("%s: %d actions left from the last run", self.path, len(entries))
+        return entries, torn
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def append(self, session_id: int, player_name: Optional[str], type: Optional[str], notes: Optional[str],
+               primary_participant: Optional[str] = None,
+               secondary_participants: Optional[List[str]] = None,
+               tags: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Records an action durably; it reaches the database on a later flush. Returns the entry."""
+        entry = {
+            "id": uuid.uuid4().hex,
+            "session_id": session_id,
+            "player_name": player_name,
+            "type": type,
+            "notes": notes,
+            "primary_participant": primary_participant,
+            "secondary_participants": secondary_participants,
+            "tags": tags,
+            "logged_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        line = json.dumps(entry) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.entries.append(entry)
+            self.last_append = time.monotonic()
+        return entry
+
+    def pending(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return list(self.entries)
+
+    def should_flush(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        return len(self.entries) >= self.flush_every or (bool(self.entries) and now - self.last_append >= self.idle_seconds)
+
+    def flush(self, conn) -> Tuple[Dict[str, int], List[Dict[str, Any]]]:
+        """
+        Commits everything pending, then drops it from the journal. Entries the
+        database refused (their session doesn't exist) are logged and appended
+        to dropped_path first. Returns (written, dropped) as add_logged_actions does.
+        """
+        batch = self.pending()
+        if not batch:
+            return {}, []
+        written, dropped = playtest_db.add_logged_actions(conn, batch)
+        if dropped:
+            self._keep_dropped(dropped)
+        self._discard({entry["id"] for entry in batch})
+        return written, dropped
+
+    def _keep_dropped(self, entries: List[Dict[str, Any]]) -> None:
+        for entry in entries:
+            logger.warning("%s: session %s not found, moved %s action %r to %s", self.path, entry["session_id"],
+                           entry.get("type"), entry.get("notes"), self.dropped_path)
+        with open(self.dropped_path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        with self.lock:
+            self.dropped += len(entries)
+
+    def _discard(self, ids) -> None:
+        """Rewrites the journal without the committed entries"""
+        with self.lock:
+            remaining = [entry for entry in self.entries if entry["id"] not in ids]
+            self.file.close()
+            self._write(remaining)
+            self.file = open(self.path, "a", encoding="utf-8")
+            self.entries = remaining
+
+    def _write(self, entries: List[Dict[str, Any]]) -> None:
+        """Replaces the journal file atomically, via a synced temp file"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Commit the actions left in a rapid-entry journal")
+    parser.add_argument("--db", default=playtest_db.DB_PATH)
+    parser.add_argument("--journal", help="journal file (default: next to the database)")
+    args = parser.parse_args(argv)
+
+    journal = ActionJournal(args.journal or journal_path(args.db))
+    pending = len(journal)
+    conn = playtest_db.connect(args.db)
+    written, dropped = journal.flush(conn)
+    print(f"{pending} journaled actions, {len(written)} written, {len(dropped)} dropped, "
+          f"{pending - len(written) - len(dropped)} already committed")
+    if dropped:
+        print(f"Dropped actions (no such session) were moved to {journal.dropped_path}")
+    journal.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
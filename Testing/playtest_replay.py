@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+playtest_replay.py
+
+Rebuilds the board of a playtest session from its recorded actions.
+
+Features:
+- GameState: unit positions, health, embarked units and building pips
+- Replay: folds a session's actions in turn order and keeps a checkpoint every
+  CHECKPOINT_EVERY actions, so seeking anywhere replays at most that many;
+  build_checkpoints() makes them all up front (the GUI does so off the Tk thread)
+- append() / remove() keep a Replay in step with live logging
+- Analytics over replayed states (damage dealt, losses, buildings held)
+
+The log records what was done rather than rules outcomes, so replay applies
+these conventions:
+- Advance, Move, Consolidate: the primary unit moves to the last secondary
+  tile, or to the tile of a secondary unit
+- Embark: the primary unit boards the secondary unit. Disembark: it leaves,
+  onto the secondary tile if one is given, else onto its transport's tile
+- Shot, Salvo: each secondary unit is an enemy target. "hit" deals 1 damage,
+  "critical" 2, "destroyed" removes the target and "miss" does nothing; a shot
+  without any of those tags deals 1. Passengers die with their transport
+- Capture: the acting player adds a pip to the building on the secondary
+  tile, removing an opponent's pip first (at most BUILDING_MAX_PIPS)
+- Control: the acting player holds the building outright (all pips)
+
+Units are keyed by (owner, name): the acting player owns the primary unit,
+targets of Shot/Salvo belong to the other player, and any other secondary
+units belong to the acting player.
+
+Example:
+    python playtest_replay.py 12 --at 137
+"""
+
+import argparse
+import csv
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import playtest_db
+
+# Actions replayed between stored checkpoints
+CHECKPOINT_EVERY = 50
+
+BUILDING_MAX_PIPS = 3
+
+# Health of units missing from Data/units.csv
+DEFAULT_HEALTH = 1
+
+MOVE_TYPES = ("Advance", "Move", "Consolidate")
+ATTACK_TYPES = ("Shot", "Salvo")
+
+# Damage per tag on Shot/Salvo; None destroys the target
+DAMAGE_TAGS = {"miss": 0, "hit": 1, "critical": 2, "destroyed": None}
+
+UnitKey = Tuple[Optional[str], str]
+
+
+class Unit(NamedTuple):
+    """One unit on the board. tile is None while embarked (see embarked_in) or unknown."""
+    owner: Optional[str]
+    name: str
+    tile: Optional[str]
+    health: int
+    max_health: int
+    embarked_in: Optional[UnitKey] = None
+
+    @property
+    def key(self) -> UnitKey:
+        return self.owner, self.name
+
+    @property
+    def alive(self) -> bool:
+        return self.health > 0
+
+
+class Building(NamedTuple):
+    """Capture state of the building on a tile: holder and their pips."""
+    holder: Optional[str]
+    pips: int
+
+
+def load_unit_health(path: str = playtest_db.UNITS_CSV_PATH) -> Dict[str, int]:
+    """Lowercased unit name and uuid -> H from Data/units.csv (empty if the catalog is missing)."""
+    health = {}
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    h = int(row.get("H") or "")
+                except ValueError:
+                    continue
+                for key in (row.get("uuid"), row.get("name")):
+                    if key:
+                        health[key.strip().lower()] = h
+    except FileNotFoundError:
+        pass
+    return health
+
+
+def tile_key(name: str) -> Optional[str]:
+    """Canonical tile name ("Tile 5", "Tile 3,4") if the participant is a tile, else None."""
+    kind, _, tile_no, hex_q, hex_r = playtest_db.classify_participant(name)
+    if kind != "tile":
+        return None
+    return f"Tile {tile_no}" if tile_no is not None else f"Tile {hex_q},{hex_r}"
+
+
+def action_participants(action: Dict[str, Any]) -> Tuple[Optional[str], List[str]]:
+    """(primary, [secondary, ...]) from either actions_filter or actions_for_session dicts."""
+    if "participants" in action:
+        primary = next((p["name"] for p in action["participants"] if p["role"] == "primary"), None)
+        return primary, [p["name"] for p in action["participants"] if p["role"] != "primary"]
+    return action.get("primary_participant"), list(action.get("secondary_participants") or [])
+
+
+class GameState:
+    """Board after some number of actions; copy() is cheap (units and buildings are immutable tuples)."""
+
+    __slots__ = ("units", "buildings", "applied", "action_id")
+
+    def __init__(self, units: Optional[Dict[UnitKey, Unit]] = None,
+                 buildings: Optional[Dict[str, Building]] = None,
+                 applied: int = 0, action_id: Optional[int] = None):
+        self.units = units if units is not None else {}
+        self.buildings = buildings if buildings is not None else {}
+        self.applied = applied
+        self.action_id = action_id
+
+    def copy(self) -> "GameState":
+        return GameState(dict(self.units), dict(self.buildings), self.applied, self.action_id)
+
+    def position(self, key: UnitKey) -> Optional[str]:
+        """Tile of a unit, following its transports while embarked."""
+        seen = set()
+        unit = self.units.get(key)
+        while unit is not None and unit.embarked_in is not None and unit.key not in seen:
+            seen.add(unit.key)
+            unit = self.units.get(unit.embarked_in)
+        return unit.tile if unit is not None else None
+
+    def passengers(self, key: UnitKey) -> List[Unit]:
+        return [u for u in self.units.values() if u.embarked_in == key]
+
+    def pips(self) -> Counter:
+        """Building pips held per player."""
+        totals = Counter()
+        for b in self.buildings.values():
+            if b.holder is not None:
+                totals[b.holder] += b.pips
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "applied": self.applied,
+            "action_id": self.action_id,
+            "units": [dict(u._asdict(), position=self.position(u.key)) for u in self.units.values()],
+            "buildings": {tile: b._asdict() for tile, b in sorted(self.buildings.items())},
+        }
+
+
+class Replay:
+    """
+    A session's action log with checkpoints, built lazily unless
+    build_checkpoints() made them already.
+
+    state_at(n) is the board after the first n actions: it copies the nearest
+    checkpoint at or before n and replays fewer than checkpoint_every actions.
+    """
+
+    def __init__(self, actions: Iterable[Dict[str, Any]], players: Iterable[str] = (),
+                 checkpoint_every: int = CHECKPOINT_EVERY, unit_health: Optional[Dict[str, int]] = None):
+        self.actions = list(actions)
+        self.players = list(players)
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.unit_health = unit_health if unit_health is not None else load_unit_health()
+        # _checkpoints[i] is the state after i * checkpoint_every actions
+        self._checkpoints = [GameState()]
+
+    @classmethod
+    def for_session(cls, conn, session_id: int, checkpoint_every: int = CHECKPOINT_EVERY) -> "Replay":
+        actions = playtest_db.actions_filter(conn, session_id=session_id)
+        players = [name for _, name in playtest_db.get_session_players(conn, session_id)]
+        return cls(actions, players, checkpoint_every)
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    def state_at(self, n: int) -> GameState:
+        """The board after the first n actions (clamped to 0..len); the caller owns the returned state."""
+        n = max(0, min(n, len(self.actions)))
+        k = n // self.checkpoint_every
+        self._build_checkpoints(k)
+        state = self._checkpoints[k].copy()
+        for action in self.actions[state.applied:n]:
+            self.apply(state, action)
+        return state
+
+    def build_checkpoints(self) -> "Replay":
+        """Builds every checkpoint up to the end of the log now rather than on first seek. Returns self."""
+        self._build_checkpoints(len(self.actions) // self.checkpoint_every)
+        return self
+
+    def _build_checkpoints(self, k: int):
+        while len(self._checkpoints) <= k:
+            state = self._checkpoints[-1].copy()
+            start = state.applied
+            for action in self.actions[start:start + self.checkpoint_every]:
+                self.apply(state, action)
+            self._checkpoints.append(state)
+
+    def final_state(self) -> GameState:
+        return self.state_at(len(self.actions))
+
+    def states(self) -> Iterator[Tuple[Dict[str, Any], GameState]]:
+        """
+        (action, state after it) for every action in one pass, for analytics.
+        The same state object is updated in place; copy() it to keep one.
+        """
+        state = GameState()
+        for action in self.actions:
+            self.apply(state, action)
+            yield action, state
+
+    def append(self, action: Dict[str, Any]):
+        """Adds a newly logged action; existing checkpoints stay valid."""
+        self.actions.append(action)
+
+    def remove(self, action_id: int) -> bool:
+        """Drops an action and the checkpoints after it. Returns False if it isn't in the log."""
+        index = next((i for i, a in enumerate(self.actions) if a["id"] == action_id), None)
+        if index is None:
+            return False
+        del self.actions[index]
+        del self._checkpoints[index // self.checkpoint_every + 1:]
+        return True
+
+    # Folding one action
+
+    def _opponent(self, player: Optional[str]) -> Optional[str]:
+        others = [p for p in self.players if p != player]
+        return others[0] if len(others) == 1 else None
+
+    def _unit(self, state: GameState, owner: Optional[str], name: str) -> Unit:
+        key = (owner, name)
+        unit = state.units.get(key)
+        if unit is None:
+            h = self.unit_health.get(name.strip().lower(), DEFAULT_HEALTH)
+            unit = state.units[key] = Unit(owner, name, None, h, h)
+        return unit
+
+    def _damage(self, state: GameState, target: Unit, damage: Optional[int]):
+        health = 0 if damage is None else max(0, target.health - damage)
+        state.units[target.key] = target._replace(health=health)
+        if health == 0:
+            for passenger in self.passengers_of(state, target.key):
+                state.units[passenger.key] = passenger._replace(health=0)
+
+    @staticmethod
+    def passengers_of(state: GameState, key: UnitKey) -> List[Unit]:
+        """Passengers of key, including those aboard transports it carries."""
+        found = []
+        todo = [key]
+        while todo:
+            carrier = todo.pop()
+            for u in state.passengers(carrier):
+                if u not in found:
+                    found.append(u)
+                    todo.append(u.key)
+        return found
+
+    def apply(self, state: GameState, action: Dict[str, Any]):
+        """Folds one action into state, in place."""
+        state.applied += 1
+        state.action_id = action.get("id")
+        primary, secondaries = action_participants(action)
+        player = action.get("player")
+        action_type = action.get("type")
+        tiles = [t for t in (tile_key(s) for s in secondaries) if t is not None]
+        other_names = [s for s in secondaries if tile_key(s) is None]
+        actor = None
+        if primary and tile_key(primary) is None:
+            actor = self._unit(state, player, primary)
+
+        if action_type in ATTACK_TYPES:
+            damage: Optional[int] = 1
+            tags = {t.lower() for t in action.get("tags") or ()}
+            for tag, value in DAMAGE_TAGS.items():
+                if tag in tags:
+                    damage = value
+            enemy = self._opponent(player)
+            for name in other_names:
+                target = self._unit(state, enemy, name)
+                if target.alive:
+                    self._damage(state, target, damage)
+            return
+
+        if actor is None or not actor.alive:
+            if action_type in ("Capture", "Control") and player and tiles:
+                self._capture(state, tiles[-1], player, action_type == "Control")
+            return
+
+        if action_type in MOVE_TYPES:
+            if tiles:
+                state.units[actor.key] = actor._replace(tile=tiles[-1], embarked_in=None)
+            elif other_names:
+                anchor = self._unit(state, player, other_names[-1])
+                state.units[actor.key] = actor._replace(tile=state.position(anchor.key), embarked_in=None)
+        elif action_type == "Embark" and other_names:
+            transport = self._unit(state, player, other_names[-1])
+            if transport.key != actor.key:
+                state.units[actor.key] = actor._replace(tile=None, embarked_in=transport.key)
+        elif action_type == "Disembark":
+            tile = tiles[-1] if tiles else state.position(actor.key)
+            state.units[actor.key] = actor._replace(tile=tile, embarked_in=None)
+        elif action_type in ("Capture", "Control"):
+            tile = tiles[-1] if tiles else state.position(actor.key)
+            if tile is not None and player:
+                self._capture(state, tile, player, action_type == "Control")
+
+    @staticmethod
+    def _capture(state: GameState, tile: str, player: str, outright: bool):
+        b = state.buildings.get(tile, Building(None, 0))
+        if outright:
+            b = Building(player, BUILDING_MAX_PIPS)
+        elif b.holder in (None, player):
+            b = Building(player, min(BUILDING_MAX_PIPS, b.pips + 1))
+        elif b.pips > 1:
+            b = Building(b.holder, b.pips - 1)
+        else:
+            b = Building(None, 0)
+        state.buildings[tile] = b
+
+
+# Analytics
+
+def damage_by_unit(replay: Replay) -> Counter:
+    """Health removed per attacking (owner, name), over the whole session."""
+    dealt = Counter()
+    before: Dict[UnitKey, int] = {}
+    for action, state in replay.states():
+        if action.get("type") in ATTACK_TYPES:
+            primary, _ = action_participants(action)
+            lost = sum(before.get(k, u.max_health) - u.health for k, u in state.units.items())
+            if primary and lost:
+                dealt[(action.get("player"), primary)] += lost
+        before = {k: u.health for k, u in state.units.items()}
+    return dealt
+
+
+def player_summary(state: GameState) -> Dict[Optional[str], Dict[str, int]]:
+    """Per player: units seen, alive and lost, health left, buildings held and pips."""
+    summary: Dict[Optional[str], Dict[str, int]] = {}
+    for u in state.units.values():
+        s = summary.setdefault(u.owner, Counter())
+        s["units"] += 1
+        s["alive" if u.alive else "lost"] += 1
+        s["health"] += u.health
+    for b in state.buildings.values():
+        if b.holder is not None:
+            s = summary.setdefault(b.holder, Counter())
+            s["buildings"] += 1
+            s["pips"] += b.pips
+    return {player: dict(s) for player, s in summary.items()}
+
+
+def describe(state: GameState) -> List[str]:
+    """Text lines for a state, used by the CLI and the GUI replay panel."""
+    lines = []
+    for player, s in sorted(player_summary(state).items(), key=lambda kv: str(kv[0])):
+        lines.append(f"{player or '?'}: {s.get('alive', 0)}/{s.get('units', 0)} units alive, "
+                     f"{s.get('buildings', 0)} buildings, {s.get('pips', 0)} pips")
+    for u in sorted(state.units.values(), key=lambda u: (str(u.owner), u.name)):
+        where = f"aboard {u.embarked_in[1]}" if u.embarked_in else (u.tile or "?")
+        status = f"{u.health}/{u.max_health}" if u.alive else "destroyed"
+        lines.append(f"  {u.owner or '?'} {u.name}: {where}, {status}")
+    for tile, b in sorted(state.buildings.items()):
+        if b.holder is not None:
+            lines.append(f"  {tile}: {b.holder} {'*' * b.pips}")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay a playtest session to a given action")
+    parser.add_argument("session_id", type=int)
+    parser.add_argument("--at", type=int, help="number of actions to replay (default: all)")
+    parser.add_argument("--db", default=playtest_db.DB_PATH)
+    args = parser.parse_args(argv)
+
+    conn = playtest_db.connect(args.db, read_only=True)
+    replay = Replay.for_session(conn, args.session_id)
+    state = replay.state_at(len(replay) if args.at is None else args.at)
+    print(f"Session {args.session_id} after {state.applied}/{len(replay)} actions")
+    print("\n".join(describe(state)))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+playtest_trace.py
+
+Opt-in query tracing and slow-query log for playtest_db.
+
+Features:
+- Traced connections recording each statement's text, duration, rows returned
+  (or affected), SQLite VM steps (progress handler) and statement programs
+  started (trace callback; counts trigger bodies, so trigger cost shows up)
+- Slow statements logged with their EXPLAIN QUERY PLAN via the logging module
+- Per-function timing histograms for the public playtest_db API (@traced)
+- Metrics dumped as JSON, so runs can be compared
+
+Tracing costs nothing unless enabled:
+    tracer = QueryTracer(slow_ms=20)
+    conn = playtest_db.connect("playtest_history.sqlite3", tracer=tracer)
+    ...
+    tracer.dump("trace_metrics.json")
+
+or, without code changes (e.g. for the GUI), set PLAYTEST_TRACE=trace_metrics.json
+(and optionally PLAYTEST_TRACE_SLOW_MS) so every connection is traced and the
+metrics are written at exit.
+"""
+
+import atexit
+import datetime
+import functools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+
+logger = logging.getLogger("playtest_db.trace")
+
+# Upper bounds (ms) of the histogram buckets; anything slower lands in the overflow bucket
+HISTOGRAM_BOUNDS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+DEFAULT_SLOW_MS = 50.0
+
+# VM instructions between progress-handler callbacks
+PROGRESS_STEPS = 1000
+
+# Slow statements kept in memory for the metrics dump
+MAX_SLOW_RECORDS = 200
+
+# Only these statements can be run through EXPLAIN QUERY PLAN
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+class Histogram:
+    """Count, total, max and log-spaced buckets of durations in milliseconds."""
+
+    __slots__ = ("count", "total_ms", "max_ms", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def add(self, ms: float):
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+        for i, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={b}ms" for b in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {label: n for label, n in zip(labels, self.buckets) if n},
+        }
+
+
+class _StatementStats:
+    __slots__ = ("timing", "rows", "vm_steps", "programs", "errors")
+
+    def __init__(self):
+        self.timing = Histogram()
+        self.rows = 0
+        self.vm_steps = 0
+        self.programs = 0
+        self.errors = 0
+
+
+def _short(value: Any, limit: int = 200) -> Any:
+    if isinstance(value, (str, bytes)) and len(value) > limit:
+        return value[:limit] + ("..." if isinstance(value, str) else b"...")
+    return value
+
+
+class QueryTracer:
+    """
+    Collects statement and function metrics from traced connections.
+    One tracer can be shared by several connections (and threads).
+    """
+
+    def __init__(self, slow_ms: float = DEFAULT_SLOW_MS, explain: bool = True,
+                 progress_steps: int = PROGRESS_STEPS, max_slow: int = MAX_SLOW_RECORDS):
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self.progress_steps = progress_steps
+        self.statements: Dict[str, _StatementStats] = {}
+        self.functions: Dict[str, Histogram] = {}
+        self.slow: Deque[Dict[str, Any]] = deque(maxlen=max_slow)
+        self.started_at = datetime.datetime.now()
+        self._lock = threading.Lock()
+
+    def attach(self, conn: sqlite3.Connection):
+        """Installs the trace callback and progress handler on a TracingMixin connection."""
+        if not isinstance(conn, TracingMixin):
+            raise TypeError("tracing needs a connection opened with playtest_db.connect(..., tracer=...)")
+        conn.tracer = self
+
+        def on_statement(_sql: str):
+            conn.programs += 1
+
+        def on_progress() -> int:
+            conn.vm_steps += self.progress_steps
+            return 0
+
+        conn.set_trace_callback(on_statement)
+        conn.set_progress_handler(on_progress, self.progress_steps)
+
+    def record_statement(self, conn: sqlite3.Connection, sql: str, params: Any, ms: float, rows: int,
+                         vm_steps: int, programs: int, error: bool = False):
+        key = " ".join(sql.split())
+        with self._lock:
+            stats = self.statements.get(key)
+            if stats is None:
+                stats = self.statements[key] = _StatementStats()
+            stats.timing.add(ms)
+            stats.rows += max(rows, 0)
+            stats.vm_steps += vm_steps
+            stats.programs += programs
+            stats.errors += error
+        if ms < self.slow_ms:
+            return
+        plan = self._explain(conn, key, params) if self.explain else []
+        entry = {
+            "at": datetime.datetime.now().isoformat(timespec="milliseconds"),
+            "sql": key,
+            "params": [_short(p) for p in params] if isinstance(params, (list, tuple)) else params,
+            "ms": round(ms, 3),
+            "rows": rows,
+            "vm_steps": vm_steps,
+            "programs": programs,
+            "plan": plan,
+        }
+        with self._lock:
+            self.slow.append(entry)
+        logger.warning("slow statement (%.1f ms, %d rows, ~%d VM steps): %s%s", ms, rows, vm_steps, key,
+                       "".join(f"\n    {line}" for line in plan))
+
+    def _explain(self, conn: sqlite3.Connection, sql: str, params: Any) -> List[str]:
+        if not sql.lstrip("( ").upper().startswith(_EXPLAINABLE):
+            return []
+        try:
+            # The base class execute() bypasses tracing, so the plan isn't recorded as a statement
+            rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params or ()).fetchall()
+        except (sqlite3.Error, ValueError) as e:
+            return [f"(no plan: {e})"]
+        depth = {0: 0}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, 0) + 1
+            lines.append("  " * (depth[node_id] - 1) + detail)
+        return lines
+
+    def record_call(self, name: str, ms: float):
+        with self._lock:
+            hist = self.functions.get(name)
+            if hist is None:
+                hist = self.functions[name] = Histogram()
+            hist.add(ms)
+
+    def reset(self):
+        with self._lock:
+            self.statements.clear()
+            self.functions.clear()
+            self.slow.clear()
+            self.started_at = datetime.datetime.now()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            statements = [
+                dict(sql=sql, rows=s.rows, vm_steps=s.vm_steps, programs=s.programs, errors=s.errors,
+                     **s.timing.to_dict())
+                for sql, s in self.statements.items()
+            ]
+            functions = {name: h.to_dict() for name, h in sorted(self.functions.items())}
+            slow = list(self.slow)
+        statements.sort(key=lambda s: s["total_ms"], reverse=True)
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "dumped_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "slow_ms": self.slow_ms,
+            "statements": statements,
+            "functions": functions,
+            "slow": slow,
+        }
+
+    def dump(self, path: str):
+        """Writes the collected metrics to path as JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+
+
+class TracingCursor(sqlite3.Cursor):
+    """
+    Cursor of a traced connection. A statement's duration is the time spent in
+    execute() plus fetching, so caller work between fetches isn't counted; it is
+    recorded once its rows are exhausted, the cursor is reused or closed.
+    """
+
+    # [sql, params, elapsed_s, rows, vm_steps at start, programs at start]
+    _trace: Optional[list] = None
+
+    def _start(self, sql: str, params: Any):
+        self._finish()
+        conn = self.connection
+        self._trace = [sql, params, 0.0, 0, conn.vm_steps, conn.programs]
+
+    def _finish(self, rows: Optional[int] = None, error: bool = False):
+        t = self._trace
+        if t is None:
+            return
+        self._trace = None
+        conn = self.connection
+        conn.tracer.record_statement(conn, t[0], t[1], t[2] * 1000, t[3] if rows is None else rows,
+                                     conn.vm_steps - t[4], conn.programs - t[5], error)
+
+    def _run(self, method: Callable, sql: str, params: Any, *args):
+        self._start(sql, params)
+        t0 = time.perf_counter()
+        try:
+            method(self, *args)
+        except Exception:
+            self._trace[2] += time.perf_counter() - t0
+            self._finish(error=True)
+            raise
+        self._trace[2] += time.perf_counter() - t0
+        if self.description is None:
+            # No result rows: record now, counting the rows changed
+            self._finish(rows=self.rowcount)
+        return self
+
+    def execute(self, sql: str, parameters: Any = ()):
+        return self._run(sqlite3.Cursor.execute, sql, parameters, sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any):
+        seq_of_parameters = iter(seq_of_parameters)
+        first = next(seq_of_parameters, None)
+        rows = [] if first is None else [first]
+
+        def chained():
+            yield from rows
+            yield from seq_of_parameters
+
+        # Only the first parameter set is kept, for EXPLAIN QUERY PLAN
+        return self._run(sqlite3.Cursor.executemany, sql, first, sql, chained())
+
+    def executescript(self, sql_script: str):
+        return self._run(sqlite3.Cursor.executescript, sql_script, None, sql_script)
+
+    def _fetch(self, method: Callable, *args):
+        t = self._trace
+        t0 = time.perf_counter()
+        result = method(self, *args)
+        if t is not None:
+            t[2] += time.perf_counter() - t0
+        return result
+
+    def fetchone(self):
+        row = self._fetch(sqlite3.Cursor.fetchone)
+        if row is None:
+            self._finish()
+        elif self._trace is not None:
+            self._trace[3] += 1
+        return row
+
+    def fetchmany(self, size: Optional[int] = None):
+        rows = self._fetch(sqlite3.Cursor.fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self._finish()
+        elif self._trace is not None:
+            self._trace[3] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(sqlite3.Cursor.fetchall)
+        if self._trace is not None:
+            self._trace[3] += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._fetch(sqlite3.Cursor.__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        if self._trace is not None:
+            self._trace[3] += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class TracingMixin:
+    """
+    Mixed into a sqlite3.Connection subclass: routes execute()/executemany()/
+    executescript() through TracingCursor. The C shortcuts on sqlite3.Connection
+    don't go through cursor(), hence the overrides.
+    """
+
+    tracer: Optional[QueryTracer] = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.vm_steps = 0
+        self.programs = 0
+
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters: Any = ()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script: str):
+        return self.cursor().executescript(sql_script)
+
+
+def traced(fn: Callable) -> Callable:
+    """
+    Records fn's wall time in the function histograms of the tracer attached
+    to its connection argument (the first one). A plain attribute check when
+    tracing is off.
+    """
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(conn, *args, **kwargs):
+        tracer = getattr(conn, "tracer", None)
+        if tracer is None:
+            return fn(conn, *args, **kwargs)
+        t0 = time.perf_counter()
+        try:
+            return fn(conn, *args, **kwargs)
+        finally:
+            tracer.record_call(name, (time.perf_counter() - t0) * 1000)
+
+    return wrapper
+
+
+_env_tracer: Optional[QueryTracer] = None
+_env_lock = threading.Lock()
+
+
+def tracer_from_env() -> Optional[QueryTracer]:
+    """
+    The process-wide tracer enabled by PLAYTEST_TRACE=<metrics.json>, or None.
+    Its metrics are written to that path at exit.
+    """
+    global _env_tracer
+    path = os.environ.get("PLAYTEST_TRACE")
+    if not path:
+        return None
+    with _env_lock:
+        if _env_tracer is None:
+            slow_ms = float(os.environ.get("PLAYTEST_TRACE_SLOW_MS", DEFAULT_SLOW_MS))
+            _env_tracer = QueryTracer(slow_ms=slow_ms)
+            atexit.register(_env_tracer.dump, path)
+            if not logging.getLogger().handlers:
+                logging.basicConfig(format="%(asctime)s %(name)s %(message)s")
+    return _env_tracer
+
+
+def summarize(metrics: Dict[str, Any], top: int = 10) -> Sequence[str]:
+    """Human-readable lines for the slowest statements and functions in a metrics dict."""
+    lines = [f"Top {top} statements by total time:"]
+    for s in metrics["statements"][:top]:
+        lines.append(f"  {s['total_ms']:10.1f} ms  x{s['count']:<6d} max {s['max_ms']:8.1f} ms  {s['sql'][:100]}")
+    lines.append("Functions:")
+    by_total = sorted(metrics["functions"].items(), key=lambda kv: kv[1]["total_ms"], reverse=True)
+    for name, h in by_total[:top]:
+        lines.append(f"  {h['total_ms']:10.1f} ms  x{h['count']:<6d} mean {h['mean_ms']:8.2f} ms  {name}")
+    return lines